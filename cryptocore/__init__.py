@@ -0,0 +1,54 @@
+"""
+# cryptocore: the curve, field and random oracle code, as an installable package
+
+secp256k1.py and zkp-assignment.py are handouts: importing them runs their
+experiments and tests, makes random points, and tries to plot with
+matplotlib. That is seconds of startup in every process that imports them.
+This package holds the same definitions with no work at import time:
+
+- `cryptocore.curve`: the fields, the curve, serialization, scalar
+  multiplication (fixed-base tables are built on first use), plotting
+  (matplotlib is imported by `plot_point` only)
+- `cryptocore.oracles`: the random oracles of zkp-assignment.py (`sha2` and
+  the rest), and its second Pedersen generator `H`
+- `cryptocore.backends`: the registry of field arithmetic backends, see
+  `field` and `use_backend`
+- `cryptocore.ecff`: Jeremy Kun's elliptic curve and finite field library
+
+It is the one copy of this code in the repository: the handouts, the rest
+of mp1, mp2 (through its link to mp1/secp256k1.py) and mp3 import it. Install it with `pip install -e .`
+from the top of the repository.
+
+The submodules are themselves imported on first use, so
+`import cryptocore` is nearly free, and `cryptocore.G` or
+`from cryptocore import sha2` loads only what it needs.
+
+`python -m cryptocore.bench_import` measures the import time.
+"""
+import importlib
+
+_exports = {
+    'backends': ['field', 'use_backend', 'active_backend', 'register_backend', 'backend_names'],
+    'curve': ['Fq', 'Fp', 'Point', 'Ideal', 'curve', 'G', 'q', 'p', 'order', 'identity',
+              'uint256_from_str', 'uint256_to_str', 'sqrt', 'solve', 'ser', 'deser',
+              'ser_bytes', 'deser_bytes', 'make_random_point', 'mult', 'precompute_table',
+              'mult_precompute', 'fixed_base_table', 'multi_mult', 'plot_point'],
+    'oracles': ['H', 'sha2', 'sha2_to_long', 'make_random_oracle', 'random_point',
+                'make_pedersen_commitment'],
+}
+_where = dict((name, module) for module, names in _exports.items() for name in names)
+
+__all__ = list(_exports) + ['ecff'] + list(_where)
+
+
+def __getattr__(name):
+    if name in _exports or name == 'ecff':
+        return importlib.import_module('.' + name, __name__)
+    if name in _where:
+        value = getattr(importlib.import_module('.' + _where[name], __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
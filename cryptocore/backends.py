@@ -0,0 +1,156 @@
+"""
+# Field arithmetic backends
+
+Every field in the package is made by `field(modulus)`, which asks the
+active backend for a class of integers mod a prime. Two backends come with
+the package:
+
+- `generic`: `FiniteField(modulus, 1)` from Jeremy Kun's library, the
+  classes the handouts are written against. Every operation goes through
+  the library's type checks and casts.
+- `int`: a thin wrapper around a python int, with `__slots__`, the same
+  interface (`.n`, `.p`, `.field`, `inverse()`, `+ - * / **` with elements
+  and ints, `==`), and none of the generic machinery.
+
+The backend is chosen with the environment variable `CRYPTOCORE_BACKEND`,
+or with `use_backend(name)`, before the first field is made (in practice,
+before `cryptocore.curve` is imported): points and scalars of different
+backends do not mix. `register_backend` adds a backend; a new one must pass
+the conformance tests (`python -m cryptocore.conformance`).
+"""
+import functools
+import os
+
+ENV = 'CRYPTOCORE_BACKEND'
+DEFAULT = 'generic'
+
+_backends = {}
+_active = None
+_locked = False
+
+
+def register_backend(name, factory):
+    # factory(modulus) returns the class of integers mod the prime `modulus`
+    _backends[name] = functools.lru_cache(maxsize=None)(factory)
+
+def backend_names():
+    return sorted(_backends)
+
+def get_backend(name):
+    if name not in _backends:
+        raise ValueError("Unknown field backend %r (known: %s)" % (name, ', '.join(backend_names())))
+    return _backends[name]
+
+def use_backend(name):
+    global _active
+    get_backend(name)
+    if _locked and name != _active:
+        raise ValueError("Field backend %r is already in use" % _active)
+    _active = name
+
+def active_backend():
+    global _active
+    if _active is None: use_backend(os.environ.get(ENV, DEFAULT))
+    return _active
+
+def field(modulus):
+    global _locked
+    F = get_backend(active_backend())(modulus)
+    _locked = True
+    return F
+
+
+"""
+## The generic backend
+"""
+def generic_field(modulus):
+    from .ecff.finitefield.finitefield import FiniteField
+    return FiniteField(modulus, 1)
+
+
+"""
+## The int backend
+"""
+def int_field(modulus):
+    class IntegerModP(object):
+        __slots__ = ('n',)
+        p = modulus
+        operatorPrecedence = 1
+
+        def __init__(self, n):
+            if type(n) is not int:
+                try: n = int(n)
+                except (TypeError, ValueError):
+                    raise TypeError("Can't cast type %s to %s" % (type(n).__name__, F.__name__))
+            self.n = n % modulus
+
+        @property
+        def field(self): return F
+
+        def __add__(self, other):
+            if type(other) is F: return F(self.n + other.n)
+            if type(other) is int: return F(self.n + other)
+            return NotImplemented
+
+        def __sub__(self, other):
+            if type(other) is F: return F(self.n - other.n)
+            if type(other) is int: return F(self.n - other)
+            return NotImplemented
+
+        def __mul__(self, other):
+            if type(other) is F: return F(self.n * other.n)
+            if type(other) is int: return F(self.n * other)
+            return NotImplemented
+
+        def __truediv__(self, other):
+            if type(other) is int: other = F(other)
+            elif type(other) is not F: return NotImplemented
+            return F(self.n * pow(other.n, -1, modulus))
+
+        def __radd__(self, other):
+            if type(other) is int: return F(other + self.n)
+            return NotImplemented
+
+        def __rsub__(self, other):
+            if type(other) is int: return F(other - self.n)
+            return NotImplemented
+
+        def __rmul__(self, other):
+            if type(other) is int: return F(other * self.n)
+            return NotImplemented
+
+        def __rtruediv__(self, other):
+            if type(other) is int: return F(other * pow(self.n, -1, modulus))
+            return NotImplemented
+
+        def __neg__(self): return F(-self.n)
+
+        def __pow__(self, e):
+            if type(e) is not int: raise TypeError
+            return F(pow(self.n, e, modulus))
+
+        def inverse(self): return F(pow(self.n, -1, modulus))
+
+        def __eq__(self, other):
+            if type(other) is F: return self.n == other.n
+            if type(other) is int: return self.n == other % modulus
+            return NotImplemented
+
+        def __ne__(self, other):
+            eq = self.__eq__(other)
+            return eq if eq is NotImplemented else not eq
+
+        def __hash__(self): return hash((modulus, self.n))
+        def __abs__(self): return abs(self.n)
+        def __int__(self): return self.n
+        def __str__(self): return str(self.n)
+        def __repr__(self): return '%d (mod %d)' % (self.n, modulus)
+
+    F = IntegerModP
+    F.__name__ = 'Z/%d' % modulus
+    F.englishName = 'IntegersMod%d' % modulus
+    return F
+
+
+register_backend('generic', generic_field)
+register_backend('int', int_field)
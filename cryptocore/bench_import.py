@@ -0,0 +1,68 @@
+"""
+# Benchmark: import time of cryptocore
+
+Starts a fresh interpreter for each import statement, `--runs` times, and
+reports the median time on top of starting a bare interpreter. For
+comparison it also times importing mp1/secp256k1.py. Fails if importing the
+whole package takes longer than `--budget-ms`, or if an import has side
+effects: output, matplotlib, or a fixed-base table built ahead of time.
+
+usage: python -m cryptocore.bench_import [--runs 10] [--budget-ms 100]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATEMENTS = [
+    ('import cryptocore', root),
+    ('import cryptocore.curve', root),
+    ('from cryptocore import G, sha2', root),
+    ('import cryptocore.curve, cryptocore.oracles', root),
+    ('import secp256k1', os.path.join(root, 'mp1')),
+]
+BUDGETED = 'import cryptocore.curve, cryptocore.oracles'
+
+SIDE_EFFECTS = '''
+import sys
+import cryptocore.curve, cryptocore.oracles
+assert 'matplotlib' not in sys.modules, 'matplotlib imported'
+assert cryptocore.curve._fixed_base_table.cache_info().currsize == 0, 'table built at import'
+'''
+
+def time_statement(stmt, cwd, runs):
+    times = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        out = subprocess.run([sys.executable, '-c', stmt], cwd=cwd, capture_output=True)
+        times.append(time.perf_counter() - t0)
+        assert out.returncode == 0, out.stderr.decode()
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--budget-ms', type=float, default=100.0)
+    args = parser.parse_args()
+
+    out = subprocess.run([sys.executable, '-c', SIDE_EFFECTS], cwd=root, capture_output=True)
+    assert out.returncode == 0, out.stderr.decode()
+    assert out.stdout == b'', "import printed %r" % out.stdout
+
+    bare = time_statement('pass', root, args.runs)
+    print('bare interpreter: %.1f ms' % (bare * 1e3))
+    budgeted = None
+    for stmt, cwd in STATEMENTS:
+        t = time_statement(stmt, cwd, args.runs) - bare
+        print('%-45s %8.1f ms' % (stmt, t * 1e3), flush=True)
+        if stmt == BUDGETED: budgeted = t
+    assert budgeted * 1e3 <= args.budget_ms, \
+        "import took %.1f ms, over the budget of %.1f ms" % (budgeted * 1e3, args.budget_ms)
+    print('within the budget of %.1f ms' % args.budget_ms)
+
+if __name__ == '__main__':
+    main()
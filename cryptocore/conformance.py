@@ -0,0 +1,115 @@
+"""
+# Conformance tests for field backends
+
+Every backend registered in backends.py must pass these tests before it is
+used. They check a backend's fields against python integer arithmetic, on
+a small prime and on the two secp256k1 primes, and then run the curve and
+proof tests of the package with the backend active.
+
+    python -m cryptocore.conformance [backend ...]
+
+tests every registered backend (or the ones named), each in a fresh
+interpreter with `CRYPTOCORE_BACKEND` set, since the curve binds its fields
+to the backend that is active when it is imported.
+"""
+import os
+import pickle
+import random
+import subprocess
+import sys
+
+from . import backends
+
+PRIMES = [
+    7,
+    2**256 - 2**32 - 2**9 - 2**8 - 2**7 - 2**6 - 2**4 - 1,
+    0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141,
+]
+
+
+"""
+## Field tests, on a backend's field classes directly
+"""
+def field_interface_test(name, p):
+    F = backends.get_backend(name)(p)
+    assert backends.get_backend(name)(p) is F, "fields must be memoized"
+    assert F.p == p
+
+    a = F(3)
+    assert type(a) is F and isinstance(a, F)
+    assert a.n == 3 and type(a.n) is int and int(a) == 3
+    assert a.field is F
+    assert F(-1).n == p - 1 and F(p + 3).n == 3 % p
+    assert F(F(5)).n == 5 % p
+    assert str(F(5)) == str(5 % p) and repr(F(5)) == '%d (mod %d)' % (5 % p, p)
+
+    for v in (a + a, a - a, a * a, -a, a / a, a ** 2, a.inverse()):
+        assert type(v) is F
+    # Mixed with ints, on either side
+    for v in (a + 1, 1 + a, a - 1, 1 - a, a * 2, 2 * a, 2 / a):
+        assert type(v) is F
+    assert (1 - a).n == (1 - 3) % p and (2 / a) * a == 2
+
+    assert a == F(3) and a == 3 and a == 3 + p and a != F(4) and a != 4
+    assert not (a != F(3)) and not (a == F(4))
+    assert F(0) == 0 and F(1) * a == a
+    assert a ** 0 == 1 and a ** 1 == a
+    try: F('x')
+    except TypeError: pass
+    else: assert False, "casting a string must raise TypeError"
+
+def field_arithmetic_test(name, p, rounds=200, seed=1):
+    # Random operations, checked against python ints mod p
+    F = backends.get_backend(name)(p)
+    rnd = random.Random(seed)
+    for _ in range(rounds):
+        x, y = rnd.randrange(p), rnd.randrange(1, p)
+        e = rnd.randrange(0, 2 * p)
+        X, Y = F(x), F(y)
+        assert (X + Y).n == (x + y) % p
+        assert (X - Y).n == (x - y) % p
+        assert (X * Y).n == (x * y) % p
+        assert (-X).n == -x % p
+        assert (X / Y).n == x * pow(y, -1, p) % p
+        assert Y.inverse().n == pow(y, -1, p)
+        assert (X ** e).n == pow(x, e, p)
+        assert (X * y).n == (y * X).n == (x * y) % p
+
+def field_pickle_test(name):
+    # The curve registers picklers for its own fields; check they round trip
+    from . import curve
+    for F in (curve.Fq, curve.Fp):
+        v = F(12345)
+        w = pickle.loads(pickle.dumps(v))
+        assert type(w) is F and w == v
+    P = 12345 * curve.G
+    assert pickle.loads(pickle.dumps(P)) == P
+
+
+"""
+## Running the suite
+"""
+def run():
+    # Runs every test with the active backend
+    name = backends.active_backend()
+    for p in PRIMES:
+        field_interface_test(name, p)
+        field_arithmetic_test(name, p)
+    field_pickle_test(name)
+
+    from . import curve, oracles
+    assert type(curve.Fq(1)) is backends.get_backend(name)(curve.q)
+    curve.curve_test()
+    oracles.oracle_test()
+    print("Backend %r passes the conformance tests" % name)
+
+def main(names=None):
+    failed = []
+    for name in names or backends.backend_names():
+        env = dict(os.environ, **{backends.ENV: name})
+        out = subprocess.run([sys.executable, '-c', 'import cryptocore.conformance as c; c.run()'], env=env)
+        if out.returncode != 0: failed.append(name)
+    assert not failed, "Backends failing conformance: %s" % ', '.join(failed)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,248 @@
+"""
+# The secp256k1 curve
+
+The fields Fq and Fp, the curve, G, point serialization and scalar
+multiplication. mp1/secp256k1.py is the handout that walks through these
+definitions and experiments with them; importing this module builds no
+random points, runs no assertions and does not touch matplotlib. Fixed-base tables are built on first use, see
+`fixed_base_table`. The classes Fq and Fp come from the active field
+backend, see backends.py.
+"""
+import copyreg
+import functools
+import os
+import struct
+
+from .backends import field
+from .ecff.elliptic_generalized import GeneralizedEllipticCurve, Point, Ideal
+
+
+"""
+## The definition of secp256k1, Bitcoin's elliptic curve
+"""
+q = 2**256 - 2**32 - 2**9 - 2**8 - 2**7 - 2**6 - 2**4 - 1
+Fq = field(q) # elliptic curve over F_q
+
+curve = GeneralizedEllipticCurve(a6=Fq(7)) # E: y ** 2 = x ** 3 + 7
+
+Gx = Fq(0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798)
+Gy = Fq(0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
+G = Point(curve, Gx, Gy)
+
+p = order = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
+Fp = field(p)
+
+identity = Ideal(curve)
+
+
+"""
+## 32-byte numbers, square roots, and point serialization
+"""
+def uint256_from_str(s):
+    """Convert bytes to uint256"""
+    r = 0
+    t = struct.unpack(b"<IIIIIIII", s[:32])
+    for i in range(8):
+        r += t[i] << (i * 32)
+    return r
+
+def uint256_to_str(s):
+    """Convert bytes to uint256"""
+    assert 0 <= s < 2**256
+    t = []
+    for i in range(8):
+        t.append((s >> (i * 32) & 0xffffffff))
+    s = struct.pack(b"<IIIIIIII", *t)
+    return s
+
+def sqrt(a):
+    # q: modulus of the underlying finitefield
+    assert type(a) is Fq
+
+    assert (q - 1) % 2 == 0 and (q+1)%4 == 0
+    legendre = a ** ((q-1)//2)
+    if legendre == Fq(-1): raise ValueError # no solution
+    else: return a ** ((q+1)//4)
+
+def solve(x):
+    # Solve for y, given x
+    # There are two possible points that satisfy the curve,
+    # an even and an odd. We choose the odd one.
+    assert type(x) is Fq
+    y = sqrt(x**3 + 7)
+    assert y*y == x**3 + 7
+    if y.n % 2 == 0: y = -y
+    if not curve.testPoint(x, y): raise ValueError
+    return Point(curve, x, y)
+
+def ser(point):
+    # Returns a 33-byte string
+    assert curve.testPoint(point.x, point.y)
+    s = '0'
+    sign = int(point.y.n % 2 == 0)
+    s += str(sign)
+    s += uint256_to_str(point.x.n).hex()
+    assert len(s) == 66 and type(s) == str
+    return s
+
+def deser(s):
+    s = bytes.fromhex(s)
+    assert len(s) == 33
+    sign = int(s[0])
+    assert sign in (0,1)
+    x = uint256_from_str(s[1:])
+    assert 0 <= x < q
+    # Note: this checks that X is the coordinate of a valid point
+    point = solve(Fq(x))
+    if sign: point.y = -point.y
+    return point
+
+def ser_bytes(point):
+    # Returns 33 bytes
+    return bytes([point.y.n % 2 == 0]) + uint256_to_str(point.x.n)
+
+def deser_bytes(s):
+    assert len(s) == 33
+    sign = s[0]
+    assert sign in (0,1)
+    x = uint256_from_str(bytes(s[1:]))
+    assert 0 <= x < q
+    point = solve(Fq(x))
+    if sign: point.y = -point.y
+    return point
+
+# Points and scalars can be pickled, e.g. to pass them between processes
+def _make_fp(n): return Fp(n)
+def _make_fq(n): return Fq(n)
+def _make_point(x, y): return Point(curve, Fq(x), Fq(y))
+def _make_identity(): return Ideal(curve)
+copyreg.pickle(Fp, lambda a: (_make_fp, (a.n,)))
+copyreg.pickle(Fq, lambda a: (_make_fq, (a.n,)))
+copyreg.pickle(Point, lambda P: (_make_point, (P.x.n, P.y.n)))
+copyreg.pickle(Ideal, lambda P: (_make_identity, ()))
+
+def make_random_point(rnd_bytes=os.urandom):
+    # 32-byte string for x coordinate
+    while True:
+        # Not all x values are valid, find out by rejection sampling
+        x = uint256_from_str(rnd_bytes(32))
+        try: point = solve(Fq(x))
+        except ValueError: continue
+        break
+
+    # Generate a random bit whether to flip the Y coordinate
+    if ord(rnd_bytes(1)) % 2 == 0:
+        point.y = -point.y
+    return point
+
+
+"""
+## Scalar multiplication
+"""
+def mult(m, A):
+    assert type(m) in (int, int)
+    assert type(A) is Point
+    X = {}
+    X[0] = A
+    y = identity
+    i = 0
+    while m > 0:
+        if m % 2 == 1:
+            y += X[i] # Group operation (point addition)
+        X[i+1] = X[i] + X[i]
+        i += 1
+        m = m//2 # Divide (dropping the least significant bit)
+        if m == 0: return y
+
+def precompute_table(m, A):
+    assert type(A) is Point
+    table = [A]
+    for _ in range(1, m.bit_length()):
+        table.append(table[-1] + table[-1])
+    return table
+
+def mult_precompute(m, A, pow2table=None):
+    assert type(m) is int
+    if pow2table is None: pow2table = precompute_table(m, A)
+    assert m.bit_length() <= len(pow2table)
+    y = identity
+    i = 0
+    while m > 0:
+        if m & 1: y += pow2table[i]
+        m >>= 1
+        i += 1
+    return y
+
+@functools.lru_cache(maxsize=None)
+def _fixed_base_table(x, y):
+    return precompute_table(order, Point(curve, Fq(x), Fq(y)))
+
+def fixed_base_table(A):
+    # The table of A for any exponent, built the first time it is asked for
+    return _fixed_base_table(A.x.n, A.y.n)
+
+def multi_mult(scalars, points, window=None):
+    pairs = []
+    for m, P in zip(scalars, points):
+        assert type(m) is int
+        m %= order
+        if m == 0 or isinstance(P, Ideal): continue
+        pairs.append((m, P))
+    if not pairs: return identity
+
+    if window is None:
+        # Balance the additions into buckets against the bucket sums
+        window = max(2, min(16, len(pairs).bit_length() - 2))
+    mask = (1 << window) - 1
+    nbits = max(m.bit_length() for m, _ in pairs)
+
+    y = identity
+    for shift in reversed(range(0, nbits, window)):
+        for _ in range(window):
+            y = y + y
+        buckets = [identity] * (mask + 1)
+        for m, P in pairs:
+            d = (m >> shift) & mask
+            if d: buckets[d] = buckets[d] + P
+        # sum_d d*bucket[d], using running sums
+        running = total = identity
+        for d in range(mask, 0, -1):
+            running = running + buckets[d]
+            total = total + running
+        y = y + total
+    return y
+
+
+"""
+## Plotting
+"""
+def plot_point(p, *args, **kwargs):
+    import matplotlib.pyplot as plt
+    assert type(p) is Point
+    assert p != identity
+    plt.plot(float(p.x.n), float(p.y.n), *args, **kwargs)
+
+
+"""
+## Tests
+
+The experiments of secp256k1.py, run on request rather than at import.
+"""
+def curve_test():
+    A = make_random_point()
+    B = make_random_point()
+    C = make_random_point()
+    for X in (A, B, C):
+        assert identity + X == X == X + identity
+        assert (-X) + X == identity
+    assert A + (B + C) == (A + B) + C
+    assert A * order == identity
+    assert 5 * G == mult(5, G)
+    assert mult_precompute(12345, G) == 12345 * G
+    assert mult_precompute(12345, G, fixed_base_table(G)) == 12345 * G
+    assert multi_mult([3, 5, order - 2], [G, A, G]) == 1*G + 5*A
+    assert deser(ser(A)) == A and deser_bytes(ser_bytes(A)) == A
+    print("Curve test complete!")
+
+if __name__ == '__main__':
+    curve_test()
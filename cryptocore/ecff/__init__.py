@@ -0,0 +1,5 @@
+"""
+Jeremy Kun's library for elliptic curves and finite fields (see README.md),
+vendored once for all the machine problems. `finitefield` is the generic
+field backend of `cryptocore.backends`.
+"""
@@ -0,0 +1,169 @@
+"""
+# Batch verification of discrete log proofs
+
+`dlog_verifier` and `pedersen_verifier` check one proof at a time, paying
+for separate scalar multiplications `s*G` and `K + c*A` in each. Many proofs
+can instead be checked at once by folding all of their verification
+equations into a single random linear combination:
+
+    sum_i w_i * (s_i*G - K_i - c_i*A_i) == identity
+
+where each w_i is a fresh random 128-bit weight. If any single proof is
+invalid, the sum is the identity with probability at most 2^-128. The
+combination is evaluated as one multi-exponentiation, in which G (and H)
+appear only once, with their scalars summed across all the proofs.
+
+Proofs are consumed from any iterable in chunks of `batch_size`, so an audit
+job can stream millions of stored proofs through in bounded memory.
+"""
+
+import secp256k1
+from transcript import transcript_challenge
+from secp256k1 import Point, Fp, G, order, identity, ser, uint256_from_str, multi_mult
+from cryptocore.oracles import sha2
+from itertools import islice
+import os
+
+def random_weight(rnd_bytes=os.urandom):
+    # A random non-zero 128-bit weight
+    while True:
+        w = int.from_bytes(rnd_bytes(16), 'little')
+        if w: return w
+
+def chunks(iterable, batch_size):
+    # Yields lists of at most batch_size consecutive items
+    it = iter(iterable)
+    while True:
+        chunk = list(islice(it, batch_size))
+        if not chunk: return
+        yield chunk
+
+
+"""
+## Batch verifier for ZKP{ (a): A = a*G }
+
+Each item of `proofs` is a pair `(A, prf)`, with `prf = (K, s)` as produced
+by `dlog_prover`.
+"""
+def dlog_batch_verifier(proofs, RO=sha2, rnd_bytes=os.urandom, batch_size=64, transcript=None):
+    start = 0
+    for chunk in chunks(proofs, batch_size):
+        sG = 0
+        scalars, points = [], []
+        for A, (K, s) in chunk:
+            assert type(A) is type(K) is Point
+            assert type(s) is Fp
+
+            # Recompute c w/ the information given
+            if transcript is None: c = uint256_from_str(RO(ser(K)))
+            else: c = transcript_challenge(transcript, b'dlog', {'G': G}, [A], [K])
+
+            # w * (s*G - K - c*A)
+            w = random_weight(rnd_bytes)
+            sG += w * s.n
+            scalars += [-w, -w * c]
+            points += [K, A]
+
+        scalars.append(sG)
+        points.append(G)
+        assert multi_mult(scalars, points) == identity, \
+            "invalid proof among proofs %d..%d" % (start, start + len(chunk) - 1)
+        start += len(chunk)
+    return True
+
+
+"""
+## Batch verifier for Zk{ (x,r): X = x*G, C = x*G + r*H }
+
+Each item of `proofs` is a triple `(C, X, prf)`, with `prf = (KX,KC,sx,sr)`
+as produced by `pedersen_prover`. `H` is the second Pedersen generator.
+"""
+def pedersen_batch_verifier(proofs, H, RO=sha2, rnd_bytes=os.urandom, batch_size=64, transcript=None):
+    assert type(H) is Point
+    start = 0
+    for chunk in chunks(proofs, batch_size):
+        sG, sH = 0, 0
+        scalars, points = [], []
+        for C, X, (KX, KC, sx, sr) in chunk:
+            assert type(C) is type(X) is Point
+            assert type(KX) is type(KC) is Point
+            assert type(sx) is type(sr) is Fp
+
+            # Recompute c w/ the information given
+            if transcript is None: c = uint256_from_str(RO(ser(KX) + ser(KC)))
+            else: c = transcript_challenge(transcript, b'pedersen', {'G': G, 'H': H}, [C, X], [KX, KC])
+
+            # u * (sx*G - KX - c*X)  +  v * (sx*G + sr*H - KC - c*C)
+            u = random_weight(rnd_bytes)
+            v = random_weight(rnd_bytes)
+            sG += (u + v) * sx.n
+            sH += v * sr.n
+            scalars += [-u, -u * c, -v, -v * c]
+            points += [KX, X, KC, C]
+
+        scalars += [sG, sH]
+        points += [G, H]
+        assert multi_mult(scalars, points) == identity, \
+            "invalid proof among proofs %d..%d" % (start, start + len(chunk) - 1)
+        start += len(chunk)
+    return True
+
+
+"""
+## Tests
+"""
+def make_dlog_proof(a, A, RO=sha2, rnd_bytes=os.urandom):
+    # Honest prover, as in dlog_prover
+    k = uint256_from_str(rnd_bytes(32)) % order
+    K = k*G
+    c = uint256_from_str(RO(ser(K)))
+    return (K, Fp(k + c*a))
+
+def make_pedersen_proof(x, r, H, RO=sha2, rnd_bytes=os.urandom):
+    # Honest prover for Zk{ (x,r): X = x*G, C = x*G + r*H }
+    kx = uint256_from_str(rnd_bytes(32)) % order
+    kr = uint256_from_str(rnd_bytes(32)) % order
+    KX = kx*G
+    KC = kx*G + kr*H
+    c = uint256_from_str(RO(ser(KX) + ser(KC)))
+    return (KX, KC, Fp(kx + c*x), Fp(kr + c*r))
+
+def dlog_batch_test(n=20):
+    def proofs():
+        # Generated lazily, as if read from storage
+        for _ in range(n):
+            a = uint256_from_str(os.urandom(32))
+            A = a*G
+            yield A, make_dlog_proof(a, A)
+    assert dlog_batch_verifier(proofs(), batch_size=8)
+
+    # A single bad proof makes the whole batch fail
+    items = list(proofs())
+    A, (K, s) = items[3]
+    items[3] = (A, (K, s + Fp(1)))
+    try: dlog_batch_verifier(items)
+    except AssertionError: pass
+    else: assert False, "bad proof accepted"
+    print('Dlog batch verification test complete!')
+
+def pedersen_batch_test(n=10):
+    H = secp256k1.make_random_point()
+    items = []
+    for _ in range(n):
+        x = uint256_from_str(os.urandom(32))
+        r = uint256_from_str(os.urandom(32))
+        X, C = x*G, x*G + r*H
+        items.append((C, X, make_pedersen_proof(x, r, H)))
+    assert pedersen_batch_verifier(iter(items), H, batch_size=4)
+
+    # Swapping the statements of two proofs must fail
+    (C0, X0, prf0), (C1, X1, prf1) = items[:2]
+    items[0], items[1] = (C0, X0, prf1), (C1, X1, prf0)
+    try: pedersen_batch_verifier(items, H)
+    except AssertionError: pass
+    else: assert False, "bad proof accepted"
+    print('Pedersen batch verification test complete!')
+
+if __name__ == '__main__':
+    dlog_batch_test()
+    pedersen_batch_test()
@@ -0,0 +1,78 @@
+"""
+# Benchmark: proving latency with and without a nonce pool, under bursty load
+
+Proves `ZK{(x, r): X = x*G, C = x*G + r*H}` (without re-checking the
+witness, which costs as much as the commitments themselves) in bursts of `--burst` proofs,
+separated by `--gap` seconds of idle time (during which a pool can refill).
+For each mode (no pool, pool refilled by a thread, pool refilled by a worker
+process) it prints latency percentiles, the pool's hits and misses, and a
+histogram of per-proof latencies.
+
+usage: python bench_noncepool.py [--bursts 5] [--burst 16] [--gap 2]
+                                 [--depth 64] [--low-watermark 16]
+"""
+import argparse
+import os
+import time
+
+import secp256k1
+from secp256k1 import G, order, uint256_from_str
+from noncepool import NoncePool
+import sigma
+
+BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500]
+
+
+def histogram(latencies):
+    lines = []
+    lo = 0
+    for hi in BUCKETS_MS + [float('inf')]:
+        n = sum(1 for t in latencies if lo <= t * 1e3 < hi)
+        label = '%g-%g' % (lo, hi) if hi != float('inf') else '%g+' % lo
+        lines.append('    %9s ms %5d %s' % (label, n, '#' * int(60 * n / max(1, len(latencies)))))
+        lo = hi
+    return '\n'.join(lines)
+
+def run(protocol, publics, witness, args, pool):
+    latencies = []
+    for _ in range(args.bursts):
+        time.sleep(args.gap)
+        for _ in range(args.burst):
+            t0 = time.perf_counter()
+            protocol.prover(publics, witness, nonces=pool, check_witness=False)
+            latencies.append(time.perf_counter() - t0)
+    return latencies
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--bursts', type=int, default=5)
+    parser.add_argument('--burst', type=int, default=16, help='proofs per burst')
+    parser.add_argument('--gap', type=float, default=2.0, help='idle seconds before each burst')
+    parser.add_argument('--depth', type=int, default=64)
+    parser.add_argument('--low-watermark', type=int, default=16)
+    args = parser.parse_args()
+
+    H = secp256k1.make_random_point()
+    protocol = sigma.compile_statement('ZK{(x, r): X = x*G, C = x*G + r*H}', G=G, H=H)
+    protocol.table('G'), protocol.table('H')  # built once, not timed
+    x = uint256_from_str(os.urandom(32)) % order
+    r = uint256_from_str(os.urandom(32)) % order
+    publics, witness = {'X': x*G, 'C': x*G + r*H}, {'x': x, 'r': r}
+
+    modes = [('no pool', None), ('thread pool', 0), ('process pool', 1)]
+    for name, processes in modes:
+        pool = None
+        if processes is not None:
+            pool = NoncePool({'G': G, 'H': H}, depth=args.depth, low_watermark=args.low_watermark,
+                             processes=processes)
+        try: latencies = sorted(run(protocol, publics, witness, args, pool))
+        finally:
+            if pool is not None: pool.close()
+        def pct(q): return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e3
+        print('%s: p50 %.1f ms, p90 %.1f ms, p99 %.1f ms, max %.1f ms%s' % (
+            name, pct(0.5), pct(0.9), pct(0.99), latencies[-1] * 1e3,
+            '' if pool is None else ', %d hits, %d misses' % (pool.hits, pool.misses)))
+        print(histogram(latencies))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""
+# Benchmark: one-out-of-many proofs
+
+Reports prove and verify times, and proof sizes, for rings of N = 2^k
+commitments. For comparison, it also reports the size of an N-way CDS OR
+proof (Part 3 of zkp-assignment.py, chained), which has a commitment, a
+response and a challenge for every branch.
+
+The ring is `C_i = d_i*H` for consecutive d_i, so building it costs one
+addition per member. Above `--prove-max-log`, the proof is made with the
+ring's discrete logs (`ring_logs`), skipping the prover's
+multi-exponentiations over the ring; verification is always measured in
+full.
+
+usage: python bench_oneofmany.py [--logs 1 2 ... 16] [--prove-max-log 10]
+
+Larger rings take a long time with the pure python curve arithmetic; rows
+are printed as soon as they are measured.
+"""
+import argparse
+import time
+
+import secp256k1
+from secp256k1 import G
+import oneofmany
+from oneofmany import random_scalar
+
+
+def cds_proof_size(N):
+    # N commitments, N responses, N-1 free challenges
+    return 33 * N + 32 * N + 32 * (N - 1)
+
+def make_ring(N, H):
+    d0, delta = random_scalar(), random_scalar()
+    dH = delta * H
+    ring, logs = [d0 * H], [d0]
+    for _ in range(N - 1):
+        ring.append(ring[-1] + dH)
+        logs.append((logs[-1] + delta) % oneofmany.p)
+    return ring, logs
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--logs', type=int, nargs='+', default=list(range(1, 17)))
+    parser.add_argument('--prove-max-log', type=int, default=10,
+                        help='above this, prove with the ring discrete logs')
+    args = parser.parse_args()
+
+    H = secp256k1.make_random_point()
+    print('%7s %10s %10s %10s %12s' % ('N', 'prove[s]', 'verify[s]', 'size[B]', 'CDS size[B]'))
+    for k in args.logs:
+        N = 2**k
+        ring, logs = make_ring(N, H)
+        l = random_scalar() % N
+        full = k <= args.prove_max_log
+        t0 = time.time()
+        prf = oneofmany.oneofmany_prover(ring, l, logs[l], H, ring_logs=None if full else logs)
+        t1 = time.time()
+        assert oneofmany.oneofmany_verifier(ring, prf, H)
+        t2 = time.time()
+        prove = '%10.2f' % (t1 - t0) if full else '%10s' % '-'
+        print('%7d %s %10.2f %10d %12d' % (N, prove, t2 - t1, oneofmany.proof_size(N), cds_proof_size(N)), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+"""
+# Benchmark: the random oracle's share of proving and verifying
+
+Compares the string-based `sha2` oracle of zkp-assignment.py with the binary
+`Transcript` of transcript.py, for the dlog proof `ZK{(a): A = a*G}`.
+For each, it reports the time per challenge on its own, the full prove and
+verify times, and the share of those spent computing the challenge.
+
+usage: python bench_oracle.py [-n 20] [--oracle-calls 20000]
+"""
+import argparse
+import os
+import time
+
+from secp256k1 import G, ser, uint256_from_str
+from cryptocore.oracles import sha2
+from transcript import Transcript, transcript_challenge
+import sigma
+
+
+def per_call(f, n):
+    t0 = time.perf_counter()
+    for _ in range(n): f()
+    return (time.perf_counter() - t0) / n
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('-n', type=int, default=20, help='proofs to time')
+    parser.add_argument('--oracle-calls', type=int, default=20000)
+    args = parser.parse_args()
+
+    dlog = sigma.compile_statement('ZK{(a): A = a*G}', G=G)
+    a = uint256_from_str(os.urandom(32))
+    A = a*G
+    K = uint256_from_str(os.urandom(32)) * G
+    session = Transcript(b'bench_oracle')
+    dlog.table('G')  # built once, not timed
+
+    oracles = [
+        ('sha2 string', lambda: uint256_from_str(sha2(ser(K))), None),
+        ('transcript', lambda: transcript_challenge(session, b'dlog', {'G': G}, [A], [K]), session),
+    ]
+    print('%-12s %12s %12s %12s %8s %8s' % ('oracle', 'oracle[us]', 'prove[ms]', 'verify[ms]', 'prove%', 'verify%'))
+    for name, oracle, transcript in oracles:
+        t_oracle = per_call(oracle, args.oracle_calls)
+        prfs = []
+        t_prove = per_call(lambda: prfs.append(dlog.prover({'A': A}, {'a': a}, transcript=transcript)), args.n)
+        it = iter(prfs)
+        t_verify = per_call(lambda: dlog.verifier({'A': A}, next(it), transcript=transcript), args.n)
+        print('%-12s %12.1f %12.2f %12.2f %7.3f%% %7.3f%%' % (
+            name, t_oracle * 1e6, t_prove * 1e3, t_verify * 1e3,
+            100 * t_oracle / t_prove, 100 * t_oracle / t_verify))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+# Benchmark: Bulletproofs range proofs
+
+Reports prove and verify times, and proof sizes, for n-bit ranges and m
+aggregated values. For comparison, it also reports the size of the
+bit-by-bit design from Part 5 of zkp-assignment.py, which needs a bit
+commitment and an OR proof (2 points, 4 scalars) for every bit of every value.
+
+usage: python bench_rangeproof.py [--bits 8 32 64] [--m 1 2 4 8 16 32 64]
+
+Larger parameters take a long time with the pure python curve arithmetic;
+rows are printed as soon as they are measured.
+"""
+import argparse
+import os
+import time
+
+import secp256k1
+from secp256k1 import G, uint256_from_str
+import bulletproofs
+
+
+def bitwise_proof_size(n, m):
+    # n bit commitments plus n OR proofs per value
+    return m * n * (33 + 2 * 33 + 4 * 32)
+
+def bench(n, m, H):
+    v_arr = [uint256_from_str(os.urandom(32)) % 2**n for _ in range(m)]
+    gamma_arr = [bulletproofs.random_scalar() for _ in range(m)]
+    V_arr = [v*G + gamma*H for v, gamma in zip(v_arr, gamma_arr)]
+    bulletproofs.generators(n * bulletproofs.padded_size(m))  # not timed
+
+    t0 = time.time()
+    prf = bulletproofs.range_prover(V_arr, v_arr, gamma_arr, H, n)
+    t1 = time.time()
+    assert bulletproofs.range_verifier(V_arr, prf, H, n)
+    t2 = time.time()
+    return t1 - t0, t2 - t1, bulletproofs.proof_size(n, m)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--bits', type=int, nargs='+', default=[8, 32, 64])
+    parser.add_argument('--m', type=int, nargs='+', default=[1, 2, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    H = secp256k1.make_random_point()
+    print('%5s %4s %10s %10s %10s %14s' % ('bits', 'm', 'prove[s]', 'verify[s]', 'size[B]', 'bitwise[B]'))
+    for n in args.bits:
+        for m in args.m:
+            tp, tv, size = bench(n, m, H)
+            print('%5d %4d %10.2f %10.2f %10d %14d' % (n, m, tp, tv, size, bitwise_proof_size(n, m)), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+# Benchmark: rewinding by replay vs. by fork
+
+Runs the rewinding experiment of rewind.py `--trials` times in each mode,
+against the picky adversary of `dlog_test_extractor_harder` that first does
+`--setup` scalar multiplications worth of work, and prints the average
+rewinds, oracle queries answered, and wall time of the first run and of
+the rewinds.
+
+usage: python bench_rewind.py [--trials 5] [--setup 0 20]
+"""
+import argparse
+import os
+
+from secp256k1 import G, uint256_from_str
+import rewind
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--trials', type=int, default=5)
+    parser.add_argument('--setup', type=int, nargs='+', default=[0, 20])
+    args = parser.parse_args()
+
+    print('%6s %7s %8s %8s %10s %13s %11s' % ('setup', 'mode', 'rewinds', 'queries', 'first[s]', 'rewinding[s]', 'total[s]'))
+    for setup in args.setup:
+        for mode in ('replay', 'fork'):
+            totals = [0.0] * 5
+            for _ in range(args.trials):
+                a = uint256_from_str(os.urandom(32))
+                _, _, stats = rewind.rewind(rewind.picky_adversary(a, setup), (a*G,), mode=mode)
+                for j, v in enumerate((stats.rewinds, stats.queries, stats.first_time,
+                                       stats.rewind_time, stats.total_time)):
+                    totals[j] += v
+            avg = [t / args.trials for t in totals]
+            print('%6d %7s %8.1f %8.1f %10.3f %13.3f %11.3f' % ((setup, mode) + tuple(avg)), flush=True)
+
+if __name__ == '__main__':
+    main()
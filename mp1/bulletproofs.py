@@ -0,0 +1,344 @@
+"""
+# Bulletproofs: logarithmic-size aggregated range proofs
+
+The range proof sketched in Part 5 of zkp-assignment.py commits to each bit
+of the value separately, and attaches an OR proof to every bit commitment.
+Its size and verification time grow linearly in the bit width n, and again
+linearly in the number m of values proven.
+
+This file implements the range proof of Bunz et al. [1], for the Pedersen
+commitments `V = v*G + gamma*H` used throughout the assignment:
+
+    Zk{ (v_1..v_m, gamma_1..gamma_m): V_j = v_j*G + gamma_j*H and 0 <= v_j < 2^n }
+
+A single proof covers all m values. It contains 2*log2(n*m) + 4 points and
+5 scalars, and is checked with one multi-exponentiation.
+
+The notation follows the paper (Section 4.3, "Aggregating Logarithmic
+Proofs"), written additively. Scalars are plain python ints mod p on the
+inside, and Fp in the proof tuples, like the other proofs in this directory.
+
+[1] "Bulletproofs: Short Proofs for Confidential Transactions and More"
+Bunz, Bootle, Boneh, Poelstra, Wuille, Maxwell.
+https://eprint.iacr.org/2017/1066.pdf
+"""
+
+import secp256k1
+from secp256k1 import Point, Fq, Fp, G, order, identity, ser, uint256_from_str, uint256_to_str, multi_mult
+from cryptocore.oracles import sha2
+import os
+
+p = order
+
+
+"""
+## Generators
+
+The vectors of generators `gs`, `hs` and the inner-product generator `U`
+must have unknown discrete logarithms with respect to G and H. They are
+derived deterministically by hashing a label onto the curve, and cached.
+"""
+def hash_to_point(label, RO=sha2):
+    # Try-and-increment: hash to an x coordinate, until it is on the curve
+    i = 0
+    while True:
+        x = uint256_from_str(RO('%s:%d' % (label, i))) % secp256k1.q
+        try: return secp256k1.solve(Fq(x))
+        except ValueError: i += 1
+
+_generators = {"g": [], "h": []}
+
+def generators(N):
+    # Returns the first N of each of the vector generators gs, hs
+    for name in ("g", "h"):
+        gens = _generators[name]
+        while len(gens) < N:
+            gens.append(hash_to_point('bulletproofs:%s:%d' % (name, len(gens))))
+    return _generators["g"][:N], _generators["h"][:N]
+
+def inner_product_generator():
+    if "U" not in _generators:
+        _generators["U"] = hash_to_point('bulletproofs:U')
+    return _generators["U"]
+
+
+"""
+## Fiat-Shamir challenges
+
+Each challenge hashes the previous challenge together with the new prover
+messages, so every challenge depends on the whole transcript so far.
+"""
+def challenge(prev, points=(), scalars=(), RO=sha2):
+    s = uint256_to_str(prev).hex()
+    s += ''.join(ser(P) for P in points)
+    s += ''.join(uint256_to_str(x).hex() for x in scalars)
+    c = uint256_from_str(RO(s)) % p
+    assert c != 0
+    return c
+
+def initial_challenge(V_arr, n, RO=sha2):
+    # Binds the statement: the range, the number of values, and the commitments
+    s = 'bulletproofs:%d:%d:' % (n, len(V_arr)) + ''.join(ser(V) for V in V_arr)
+    return uint256_from_str(RO(s)) % p
+
+
+"""
+## Helpers for vectors of scalars mod p
+"""
+def inner(a, b):
+    return sum(x * y for x, y in zip(a, b)) % p
+
+def powers(x, n):
+    # [1, x, x^2, ..., x^(n-1)]
+    out, acc = [], 1
+    for _ in range(n):
+        out.append(acc)
+        acc = acc * x % p
+    return out
+
+def random_scalar(rnd_bytes=os.urandom):
+    return uint256_from_str(rnd_bytes(32)) % p
+
+def padded_size(m):
+    # The number of aggregated values is padded up to a power of two
+    mm = 1
+    while mm < m: mm *= 2
+    return mm
+
+def log2(N):
+    assert N > 0 and N & (N - 1) == 0, "must be a power of two"
+    return N.bit_length() - 1
+
+
+"""
+## Prover
+
+    Params:
+       V_arr are Points, the commitments V_j = v_j*G + gamma_j*H
+       v_arr are ints in [0, 2^n), gamma_arr are ints
+       H is the second Pedersen generator
+       n, the bit width of the range, must be a power of two
+    Returns:
+       prf, of the form (A,S,T1,T2,taux,mu,t,Ls,Rs,a,b)
+
+The number of values m is padded to a power of two with zero values, whose
+commitments are the identity (they are left out of the Fiat-Shamir hash).
+"""
+def range_prover(V_arr, v_arr, gamma_arr, H, n=64, rnd_bytes=os.urandom, RO=sha2):
+    assert len(V_arr) == len(v_arr) == len(gamma_arr) > 0
+    for V, v, gamma in zip(V_arr, v_arr, gamma_arr):
+        assert 0 <= v < 2**n
+        assert V == v*G + gamma*H
+
+    log2(n)
+    m = padded_size(len(v_arr))
+    N = n * m
+    v_arr = list(v_arr) + [0] * (m - len(v_arr))
+    gamma_arr = list(gamma_arr) + [0] * (m - len(gamma_arr))
+    gs, hs = generators(N)
+    U = inner_product_generator()
+
+    # Bit decomposition: aL is the bits of all the values, aR = aL - 1
+    aL = [(v >> i) & 1 for v in v_arr for i in range(n)]
+    aR = [(b - 1) % p for b in aL]
+
+    # Commit to the bits, A = alpha*H + <aL,gs> + <aR,hs>
+    # (every entry of aL, aR is 0, 1 or -1, so this is just additions)
+    alpha = random_scalar(rnd_bytes)
+    A = alpha * H
+    for b, g, h in zip(aL, gs, hs):
+        A = A + g if b else A - h
+
+    # Commit to the blinding vectors
+    sL = [random_scalar(rnd_bytes) for _ in range(N)]
+    sR = [random_scalar(rnd_bytes) for _ in range(N)]
+    rho = random_scalar(rnd_bytes)
+    S = multi_mult([rho] + sL + sR, [H] + gs + hs)
+
+    c0 = initial_challenge(V_arr, n, RO)
+    y = challenge(c0, [A, S], RO=RO)
+    z = challenge(y, RO=RO)
+
+    # l(X) = (aL - z) + sL*X
+    # r(X) = y^N o (aR + z + sR*X) + sum_j z^(2+j) * (0..0 || 2^n || 0..0)
+    yN = powers(y, N)
+    zeta = [pow(z, 2 + j, p) * 2**i % p for j in range(m) for i in range(n)]
+    l0 = [(b - z) % p for b in aL]
+    l1 = sL
+    r0 = [(yi * (b + z) + zt) % p for yi, b, zt in zip(yN, aR, zeta)]
+    r1 = [yi * s % p for yi, s in zip(yN, sR)]
+
+    # t(X) = <l(X), r(X)> = t0 + t1*X + t2*X^2
+    t1 = (inner(l0, r1) + inner(l1, r0)) % p
+    t2 = inner(l1, r1)
+    tau1 = random_scalar(rnd_bytes)
+    tau2 = random_scalar(rnd_bytes)
+    T1 = t1*G + tau1*H
+    T2 = t2*G + tau2*H
+
+    x = challenge(z, [T1, T2], RO=RO)
+
+    l = [(a + b * x) % p for a, b in zip(l0, l1)]
+    r = [(a + b * x) % p for a, b in zip(r0, r1)]
+    t = inner(l, r)
+    taux = (tau2 * x * x + tau1 * x + sum(pow(z, 2 + j, p) * gamma for j, gamma in enumerate(gamma_arr))) % p
+    mu = (alpha + rho * x) % p
+
+    # Inner product argument for P = <l,gs> + <r,hs'> + t*w*U, where
+    # hs'_i = y^-i * hs_i. The folded generators are never computed as
+    # points: each original generator's coefficient is tracked instead, so
+    # that every L and R is a single multi-exponentiation.
+    w = challenge(x, scalars=[taux, mu, t], RO=RO)
+    yinv = pow(y, -1, p)
+    gcoef = [1] * N
+    hcoef = powers(yinv, N)
+    Ls, Rs = [], []
+    c = w
+    a, b = l, r
+    while len(a) > 1:
+        half = len(a) // 2
+        cur = len(a)
+        cL = inner(a[:half], b[half:])
+        cR = inner(a[half:], b[:half])
+        Lsc, Rsc = [], []
+        for i in range(N):
+            j = i % cur
+            if j < half:
+                Lsc.append(b[j + half] * hcoef[i])   # h_lo gets b_hi
+                Rsc.append(a[j + half] * gcoef[i])   # g_lo gets a_hi
+            else:
+                Lsc.append(a[j - half] * gcoef[i])   # g_hi gets a_lo
+                Rsc.append(b[j - half] * hcoef[i])   # h_hi gets b_lo
+        Lpts = [hs[i] if i % cur < half else gs[i] for i in range(N)]
+        Rpts = [gs[i] if i % cur < half else hs[i] for i in range(N)]
+        L = multi_mult(Lsc + [cL * w], Lpts + [U])
+        R = multi_mult(Rsc + [cR * w], Rpts + [U])
+        Ls.append(L)
+        Rs.append(R)
+
+        c = challenge(c, [L, R], RO=RO)
+        cinv = pow(c, -1, p)
+        a = [(a[j] * c + a[j + half] * cinv) % p for j in range(half)]
+        b = [(b[j] * cinv + b[j + half] * c) % p for j in range(half)]
+        for i in range(N):
+            lo = i % cur < half
+            gcoef[i] = gcoef[i] * (cinv if lo else c) % p
+            hcoef[i] = hcoef[i] * (c if lo else cinv) % p
+
+    return (A, S, T1, T2, Fp(taux), Fp(mu), Fp(t), Ls, Rs, Fp(a[0]), Fp(b[0]))
+
+
+"""
+## Verifier
+
+Both verification equations, the one for t(x) and the unrolled inner-product
+argument, are combined with a random weight into one multi-exponentiation
+over G, H, U, gs, hs, the commitments, and the proof's points.
+"""
+def range_verifier(V_arr, prf, H, n=64, rnd_bytes=os.urandom, RO=sha2):
+    (A, S, T1, T2, taux, mu, t, Ls, Rs, a, b) = prf
+    assert len(V_arr) > 0
+    assert all(type(P) is Point for P in [A, S, T1, T2] + list(V_arr) + list(Ls) + list(Rs))
+    assert type(taux) is type(mu) is type(t) is type(a) is type(b) is Fp
+
+    log2(n)
+    m = padded_size(len(V_arr))
+    N = n * m
+    rounds = log2(N)
+    assert len(Ls) == len(Rs) == rounds
+    gs, hs = generators(N)
+    U = inner_product_generator()
+    taux, mu, t, a, b = taux.n, mu.n, t.n, a.n, b.n
+
+    # Recompute the challenges
+    c0 = initial_challenge(V_arr, n, RO)
+    y = challenge(c0, [A, S], RO=RO)
+    z = challenge(y, RO=RO)
+    x = challenge(z, [T1, T2], RO=RO)
+    w = challenge(x, scalars=[taux, mu, t], RO=RO)
+    xs = []
+    c = w
+    for L, R in zip(Ls, Rs):
+        c = challenge(c, [L, R], RO=RO)
+        xs.append(c)
+    xinvs = [pow(c, -1, p) for c in xs]
+
+    # s_i = prod_k x_k^(+1 or -1), by bit (rounds-1-k) of i
+    s = [1] * N
+    for xinv in xinvs: s[0] = s[0] * xinv % p
+    for i in range(1, N):
+        top = i.bit_length() - 1
+        k = rounds - 1 - top
+        s[i] = s[i - (1 << top)] * xs[k] * xs[k] % p
+    # Flipping every bit of i inverts s_i
+    sinv = s[::-1]
+
+    yN = powers(y, N)
+    yinvN = powers(pow(y, -1, p), N)
+    zs = powers(z, m + 3)
+    delta = ((z - zs[2]) * sum(yN) - sum(zs[j + 3] for j in range(m)) * (2**n - 1)) % p
+
+    # Random weight for the first verification equation
+    e = int.from_bytes(rnd_bytes(16), 'little') or 1
+
+    scalars, points = [], []
+    for i in range(N):
+        j, bit = divmod(i, n)
+        zeta = zs[2 + j] * 2**bit
+        scalars.append(a * s[i] + z)
+        points.append(gs[i])
+        scalars.append(yinvN[i] * (b * sinv[i] - zeta) - z)
+        points.append(hs[i])
+    scalars += [w * (a * b - t), e * (t - delta), e * taux + mu, -1, -x, -e * x, -e * x * x]
+    points += [U, G, H, A, S, T1, T2]
+    for j, V in enumerate(V_arr):
+        scalars.append(-e * zs[2 + j])
+        points.append(V)
+    for c, cinv, L, R in zip(xs, xinvs, Ls, Rs):
+        scalars += [-c * c, -cinv * cinv]
+        points += [L, R]
+
+    assert multi_mult(scalars, points) == identity
+    return True
+
+
+def proof_size(n, m):
+    # Size in bytes of a serialized proof, with 33-byte points and 32-byte scalars
+    rounds = log2(n * padded_size(m))
+    return 33 * (4 + 2 * rounds) + 32 * 5
+
+
+"""
+## Tests
+"""
+def range_test(n=8, m=2):
+    H = secp256k1.make_random_point()
+    v_arr = [uint256_from_str(os.urandom(32)) % 2**n for _ in range(m)]
+    gamma_arr = [random_scalar() for _ in range(m)]
+    V_arr = [v*G + gamma*H for v, gamma in zip(v_arr, gamma_arr)]
+
+    prf = range_prover(V_arr, v_arr, gamma_arr, H, n)
+    assert range_verifier(V_arr, prf, H, n)
+
+    # The proof is bound to the commitments
+    try: range_verifier([V_arr[0] + G] + V_arr[1:], prf, H, n)
+    except AssertionError: pass
+    else: assert False, "proof accepted for the wrong commitments"
+    print("Bulletproofs range test (n=%d, m=%d) complete!" % (n, m))
+
+def range_test_out_of_range(n=8):
+    # A value of 2^n can not be proven to be in range [0, 2^n), but a
+    # cheating prover can run the protocol with the bits of v mod 2^n
+    H = secp256k1.make_random_point()
+    v, gamma = 2**n, random_scalar()
+    V = v*G + gamma*H
+    prf = range_prover([V - v*G], [0], [gamma], H, n)
+    try: range_verifier([V], prf, H, n)
+    except AssertionError: pass
+    else: assert False, "out of range value accepted"
+    print("Bulletproofs out of range test complete!")
+
+if __name__ == '__main__':
+    range_test(8, 1)
+    range_test(8, 3)
+    range_test_out_of_range()
@@ -0,0 +1,125 @@
+"""
+# Load generator for verifyd.py
+
+Starts a local verification daemon with 1, 2, ... N worker processes, and
+for each runs a fixed number of client connections that keep `depth`
+requests in flight for `seconds`. Reports throughput, client-side latency
+percentiles, and the daemon's average batch size, to show how verification
+scales with worker processes.
+
+The proofs are generated once, before the runs, and sent over and over.
+
+usage: python loadgen.py [--workers 1 2 4] [--connections 8] [--depth 16]
+                         [--seconds 10] [--proofs 32] [--kind dlog|pedersen]
+"""
+import argparse
+import asyncio
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from secp256k1 import G, Point, Fq, curve, order, uint256_from_str
+import batchverify
+import proofio
+import verifyd
+
+_u32 = struct.Struct('<I')
+
+
+def make_records(kind, n):
+    H = Point(curve, Fq(verifyd.Hx), Fq(verifyd.Hy))
+    records = []
+    for _ in range(n):
+        x = uint256_from_str(os.urandom(32)) % order
+        if kind == "dlog":
+            records.append(proofio.encode_record("dlog", (x*G,), batchverify.make_dlog_proof(x, x*G)))
+        else:
+            r = uint256_from_str(os.urandom(32)) % order
+            prf = batchverify.make_pedersen_proof(x, r, H)
+            records.append(proofio.encode_record("pedersen", (x*G + r*H, x*G), prf))
+    return records
+
+async def client(path, records, depth, deadline, latencies):
+    reader, writer = await asyncio.open_unix_connection(path)
+    writer.write(proofio.MAGIC)
+    window = asyncio.Semaphore(depth)
+    sent = asyncio.Queue()
+
+    async def receive():
+        while True:
+            t0 = await sent.get()
+            if t0 is None: break
+            (n,) = _u32.unpack(await reader.readexactly(4))
+            reply = await reader.readexactly(n)
+            assert reply[0] == 1, reply[1:].decode()
+            latencies.append(time.time() - t0)
+            window.release()
+
+    receiver = asyncio.ensure_future(receive())
+    i = 0
+    while time.time() < deadline:
+        await window.acquire()
+        writer.write(records[i % len(records)])
+        await sent.put(time.time())
+        await writer.drain()
+        i += 1
+    await sent.put(None)
+    await receiver
+    writer.close()
+
+async def run_clients(path, records, connections, depth, seconds):
+    latencies = []
+    deadline = time.time() + seconds
+    t0 = time.time()
+    await asyncio.gather(*[client(path, records, depth, deadline, latencies) for _ in range(connections)])
+    return latencies, time.time() - t0
+
+def wait_for_socket(path, proc, timeout=60):
+    t0 = time.time()
+    while not os.path.exists(path):
+        assert proc.poll() is None, "verifyd exited"
+        assert time.time() - t0 < timeout, "verifyd did not start"
+        time.sleep(0.05)
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for verifyd.py")
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--connections', type=int, default=8)
+    parser.add_argument('--depth', type=int, default=16, help='requests in flight per connection')
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--proofs', type=int, default=32, help='distinct proofs to send')
+    parser.add_argument('--kind', choices=['dlog', 'pedersen'], default='dlog')
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=20.0)
+    args = parser.parse_args()
+
+    print('generating %d %s proofs...' % (args.proofs, args.kind), file=sys.stderr)
+    records = make_records(args.kind, args.proofs)
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    print('%8s %10s %12s %10s %10s %10s' % ('workers', 'requests', 'proofs/s', 'p50[ms]', 'p99[ms]', 'avg_batch'))
+    for workers in args.workers:
+        path = os.path.join(tempfile.mkdtemp(), 'verifyd.sock')
+        proc = subprocess.Popen([sys.executable, os.path.join(here, 'verifyd.py'), '--unix', path,
+                                 '--workers', str(workers), '--max-batch', str(args.max_batch),
+                                 '--max-delay-ms', str(args.max_delay_ms)],
+                                cwd=here, stderr=subprocess.DEVNULL)
+        try:
+            wait_for_socket(path, proc)
+            latencies, elapsed = asyncio.run(run_clients(path, records, args.connections, args.depth, args.seconds))
+            c = verifyd.VerifyClient(path)
+            stats = c.stats()
+            c.close()
+        finally:
+            proc.terminate()
+            proc.wait()
+        latencies.sort()
+        def pct(q): return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1e3 if latencies else 0.0
+        print('%8d %10d %12.1f %10.1f %10.1f %10.1f' % (
+            workers, len(latencies), len(latencies) / elapsed, pct(0.5), pct(0.99), stats["avg_batch"]), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+# Offline/online proving with a pool of precomputed nonces
+
+Every proof starts by drawing a random nonce k and computing the commitment
+k*G (and k*H for Pedersen statements). These scalar multiplications do not
+depend on the statement or the witness, so they can be done ahead of time.
+`NoncePool` keeps up to `depth` entries
+
+    (k, {'G': k*G, 'H': k*H})
+
+ready. When fewer than `low_watermark` are left, a background thread refills
+the pool, either by itself or, with `processes > 0`, by farming batches out
+to worker processes (so the refill does not compete with the prover for the
+GIL). Provers that take a `nonces` argument (`dlog_prover`, and the compiled
+provers of sigma.py) draw from the pool, so the online cost of a proof is
+hashing plus a few additions and field operations.
+
+Each entry is handed out once and then forgotten: a nonce is never reused.
+If the pool runs dry, `get()` computes an entry on the spot (a "miss").
+A forked child (rewind.py forks, for one) would hold a copy of the
+parent's entries, which both could then hand out: the pool is emptied in
+the child, and its refill thread does not survive the fork, so there every
+entry is a miss.
+"""
+import os
+import threading
+import collections
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+
+import secp256k1
+from secp256k1 import Point, Fq, curve, order, uint256_from_str, precompute_table, mult_precompute
+
+
+"""
+## Producing entries
+"""
+def make_nonces(bases, tables, n, rnd_bytes=os.urandom):
+    out = []
+    for _ in range(n):
+        k = uint256_from_str(rnd_bytes(32)) % order
+        out.append((k, dict((name, mult_precompute(k, P, tables[name])) for name, P in bases.items())))
+    return out
+
+# In worker processes, points travel as coordinates, and tables are cached
+_worker_tables = {}
+
+def _make_nonces_remote(coords, n):
+    bases = dict((name, Point(curve, Fq(x), Fq(y))) for name, (x, y) in coords.items())
+    for name, P in bases.items():
+        if coords[name] not in _worker_tables:
+            _worker_tables[coords[name]] = precompute_table(order, P)
+    tables = dict((name, _worker_tables[coords[name]]) for name in bases)
+    return [(k, dict((name, (P.x.n, P.y.n)) for name, P in pts.items()))
+            for k, pts in make_nonces(bases, tables, n)]
+
+
+# The pools of this process, emptied in a forked child
+_pools = weakref.WeakSet()
+
+def _after_fork_in_child():
+    for pool in list(_pools):
+        pool._entries.clear()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+class NoncePool(object):
+    def __init__(self, bases, depth=256, low_watermark=64, batch=16, processes=0, rnd_bytes=os.urandom):
+        # bases: dict of name -> Point, e.g. {'G': G, 'H': H}
+        assert 0 <= low_watermark < depth and batch > 0
+        self.bases = dict(bases)
+        self.depth = depth
+        self.low_watermark = low_watermark
+        self.batch = batch
+        self.rnd_bytes = rnd_bytes
+        self.hits = self.misses = 0
+
+        self._tables = dict((name, precompute_table(order, P)) for name, P in self.bases.items())
+        self._entries = collections.deque()
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._executor = ProcessPoolExecutor(processes) if processes else None
+        self._coords = dict((name, (P.x.n, P.y.n)) for name, P in self.bases.items())
+        self._thread = threading.Thread(target=self._refill, name="NoncePool", daemon=True)
+        self._thread.start()
+        self._wakeup.set()
+        _pools.add(self)
+
+    def _produce(self, n):
+        if self._executor is None:
+            return make_nonces(self.bases, self._tables, n, self.rnd_bytes)
+        remote = self._executor.submit(_make_nonces_remote, self._coords, n).result()
+        return [(k, dict((name, Point(curve, Fq(x), Fq(y))) for name, (x, y) in pts.items()))
+                for k, pts in remote]
+
+    def _refill(self):
+        while not self._closed:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            while not self._closed and len(self._entries) < self.depth:
+                self._entries.extend(self._produce(min(self.batch, self.depth - len(self._entries))))
+
+    def get(self):
+        # Returns (k, {name: k*P}), never the same k twice
+        try:
+            entry = self._entries.popleft()
+            self.hits += 1
+        except IndexError:
+            entry = make_nonces(self.bases, self._tables, 1, self.rnd_bytes)[0]
+            self.misses += 1
+        if len(self._entries) < self.low_watermark: self._wakeup.set()
+        return entry
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        self._closed = True
+        self._wakeup.set()
+        self._thread.join()
+        if self._executor is not None: self._executor.shutdown()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
+
+
+"""
+## Tests
+"""
+def noncepool_test():
+    import time
+    G = secp256k1.G
+    H = secp256k1.make_random_point()
+    with NoncePool({'G': G, 'H': H}, depth=8, low_watermark=4, batch=4) as pool:
+        while len(pool) < 8: time.sleep(0.01)
+        seen = set()
+        for _ in range(12):
+            k, pts = pool.get()
+            assert k not in seen
+            seen.add(k)
+            assert pts['G'] == k*G and pts['H'] == k*H
+        assert pool.hits + pool.misses == 12
+
+        # A forked child gets none of the parent's entries
+        while len(pool) < 8: time.sleep(0.01)
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            k, _ = pool.get()
+            os.write(w, b'%d %d' % (len(pool), k))
+            os._exit(0)
+        os.close(w)
+        left, k = map(int, os.read(r, 1024).split())
+        os.close(r)
+        os.waitpid(pid, 0)
+        assert left == 0 and k not in set(k for k, _ in pool._entries) | seen
+    print("Nonce pool test complete!")
+
+if __name__ == '__main__':
+    noncepool_test()
@@ -0,0 +1,203 @@
+"""
+# One-out-of-many proofs: OR over many commitments, in logarithmic size
+
+`OR_prover` in zkp-assignment.py proves one of two statements. Chaining the
+CDS construction to N branches costs a commitment, a challenge and a
+response for every branch. This file implements the one-out-of-many proof
+of Groth and Kohlweiss [1] for a ring of Pedersen commitments
+`C_i = v_i*G + r_i*H`:
+
+    Zk{ (l, r): C_l = r*H }      (one of C_0 .. C_{N-1} commits to 0)
+
+For N = 2^n, a proof has 4n points and 3n+1 scalars, and is checked with
+one multi-exponentiation over the ring and the proof's points. Rings whose
+size is not a power of two are padded by repeating the last commitment.
+
+To show that a commitment `C` commits to the same value as one of the ring,
+prove the statement for the ring `[C_i - C]`: the difference at the right
+index is `(r_l - r)*H`.
+
+The notation follows Figure 2 of the paper, written additively. The
+prover's bits are l_j (bit j of l), and f_{j,1}(x) = l_j*x + a_j,
+f_{j,0}(x) = x - f_{j,1}(x); the product over j of f_{j,i_j}(x) is x^n at
+i = l, and a polynomial of degree < n elsewhere. The commitments c_d cancel
+its lower coefficients.
+
+[1] "One-out-of-Many Proofs: Or How to Leak a Secret and Spend a Coin"
+Groth, Kohlweiss. https://eprint.iacr.org/2014/764.pdf
+"""
+import os
+
+import secp256k1
+from secp256k1 import Point, Fp, G, order, identity, ser, uint256_from_str, multi_mult
+from bulletproofs import sha2, challenge, random_scalar, padded_size, log2
+from batchverify import random_weight
+
+p = order
+
+
+def pad_ring(C_arr):
+    N = max(2, padded_size(len(C_arr)))
+    return list(C_arr) + [C_arr[-1]] * (N - len(C_arr))
+
+def initial_challenge(C_arr, RO=sha2):
+    # Binds the statement: the ring as given, before padding
+    s = 'oneofmany:%d:' % len(C_arr) + ''.join(ser(C) for C in C_arr)
+    return uint256_from_str(RO(s)) % p
+
+def polymul_linear(poly, c0, c1):
+    # poly * (c0 + c1*x), coefficients mod p, lowest degree first
+    out = [0] * (len(poly) + 1)
+    for k, a in enumerate(poly):
+        out[k] = (out[k] + a * c0) % p
+        out[k + 1] = a * c1 % p
+    return out
+
+def expand(factors):
+    """
+    factors[j] = (F0, F1), each a polynomial or a scalar.
+    Returns, for every i in [0, 2^n), the product over j of F_{i_j}, where
+    i_j is bit j of i. Each level reuses the products of the previous one.
+    """
+    out = [[1]] if type(factors[0][0]) is list else [1]
+    for F0, F1 in factors:
+        if type(F0) is list:
+            out = [polymul_linear(P, *F0) for P in out] + [polymul_linear(P, *F1) for P in out]
+        else:
+            out = [P * F0 % p for P in out] + [P * F1 % p for P in out]
+    return out
+
+
+"""
+## Prover
+
+    Params:
+       C_arr is a list of Points, at least 2
+       l is an index with C_arr[l] == r*H
+       H is the second Pedersen generator
+    Returns:
+       prf, of the form (cls, cas, cbs, cds, fs, zas, zbs, zd),
+       four lists of n Points, three lists of n Fp's, and an Fp
+"""
+def oneofmany_prover(C_arr, l, r, H, rnd_bytes=os.urandom, RO=sha2, ring_logs=None):
+    # ring_logs: when the discrete logs of the whole ring with respect to H
+    #   are known (tests, benchmarks), the c_d are computed without the
+    #   multi-exponentiations over the ring, the prover's O(N log N) part
+    assert len(C_arr) >= 2 and 0 <= l < len(C_arr)
+    assert C_arr[l] == r*H
+    ring = pad_ring(C_arr)
+    n = log2(len(ring))
+    bits = [(l >> j) & 1 for j in range(n)]
+
+    rs, as_, ss, ts, rhos = [[random_scalar(rnd_bytes) for _ in range(n)] for _ in range(5)]
+    cls = [b*G + rj*H for b, rj in zip(bits, rs)]
+    cas = [aj*G + sj*H for aj, sj in zip(as_, ss)]
+    cbs = [(b*aj)*G + tj*H for b, aj, tj in zip(bits, as_, ts)]
+
+    # p_i(x) = prod_j f_{j,i_j}(x); p_l has degree n, the others less
+    ps = expand([([-aj % p, 1 - b], [aj, b]) for b, aj in zip(bits, as_)])
+    assert ps[l][n] == 1
+    if ring_logs is None:
+        cds = [multi_mult([P[k] for P in ps], ring) + rhos[k]*H for k in range(n)]
+    else:
+        logs = pad_ring(ring_logs)
+        cds = [((sum(P[k] * d for P, d in zip(ps, logs)) + rhos[k]) % p) * H for k in range(n)]
+
+    x = challenge(initial_challenge(C_arr, RO), cls + cas + cbs + cds, RO=RO)
+
+    fs = [(b * x + aj) % p for b, aj in zip(bits, as_)]
+    zas = [(rj * x + sj) % p for rj, sj in zip(rs, ss)]
+    zbs = [(rj * (x - fj) + tj) % p for rj, fj, tj in zip(rs, fs, ts)]
+    zd = (r * pow(x, n, p) - sum(rho * pow(x, k, p) for k, rho in enumerate(rhos))) % p
+    return (cls, cas, cbs, cds, [Fp(f) for f in fs], [Fp(z) for z in zas], [Fp(z) for z in zbs], Fp(zd))
+
+
+"""
+## Verifier
+
+The three verification equations of the paper, for every j,
+
+    x*cl_j + ca_j == f_j*G + za_j*H
+    (x - f_j)*cl_j + cb_j == zb_j*H
+    sum_i (prod_j f_{j,i_j}) C_i - sum_k x^k cd_k == zd*H
+
+are combined with random weights into one multi-exponentiation.
+"""
+def oneofmany_verifier(C_arr, prf, H, rnd_bytes=os.urandom, RO=sha2):
+    (cls, cas, cbs, cds, fs, zas, zbs, zd) = prf
+    assert len(C_arr) >= 2
+    ring = pad_ring(C_arr)
+    n = log2(len(ring))
+    assert len(cls) == len(cas) == len(cbs) == len(cds) == len(fs) == len(zas) == len(zbs) == n
+    assert all(type(P) is Point for P in list(C_arr) + cls + cas + cbs + cds)
+    assert all(type(s) is Fp for s in fs + zas + zbs + [zd])
+    fs, zas, zbs, zd = [f.n for f in fs], [z.n for z in zas], [z.n for z in zbs], zd.n
+
+    x = challenge(initial_challenge(C_arr, RO), cls + cas + cbs + cds, RO=RO)
+
+    # The ring coefficients, merged for the padding
+    gs = expand([((x - f) % p, f) for f in fs])
+    coeffs = gs[:len(C_arr)]
+    coeffs[-1] = (coeffs[-1] + sum(gs[len(C_arr):])) % p
+
+    scalars, points = coeffs, list(C_arr)
+    g = h = 0
+    xk = 1
+    for j in range(n):
+        e1, e2 = random_weight(rnd_bytes), random_weight(rnd_bytes)
+        scalars += [e1 * x + e2 * (x - fs[j]), e1, e2, -xk]
+        points += [cls[j], cas[j], cbs[j], cds[j]]
+        g -= e1 * fs[j]
+        h -= e1 * zas[j] + e2 * zbs[j]
+        xk = xk * x % p
+    scalars += [g, h - zd]
+    points += [G, H]
+
+    assert multi_mult(scalars, points) == identity
+    return True
+
+
+def proof_size(N):
+    # Size in bytes of a serialized proof, with 33-byte points and 32-byte scalars
+    n = log2(max(2, padded_size(N)))
+    return 33 * 4 * n + 32 * (3 * n + 1)
+
+
+"""
+## Tests
+"""
+def oneofmany_test(N=5):
+    H = secp256k1.make_random_point()
+    l = random_scalar() % N
+    r = random_scalar()
+    C_arr = [secp256k1.make_random_point() for _ in range(N)]
+    C_arr[l] = r*H
+
+    prf = oneofmany_prover(C_arr, l, r, H)
+    assert oneofmany_verifier(C_arr, prf, H)
+
+    # The proof is bound to the ring
+    C_bad = list(C_arr)
+    C_bad[(l + 1) % N] = C_bad[(l + 1) % N] + G
+    try: oneofmany_verifier(C_bad, prf, H)
+    except AssertionError: pass
+    else: assert False, "proof accepted for the wrong ring"
+    print("One-out-of-many test (N=%d) complete!" % N)
+
+def membership_test(N=4):
+    # C commits to the same value as one of the ring
+    H = secp256k1.make_random_point()
+    vs = [random_scalar() for _ in range(N)]
+    rs = [random_scalar() for _ in range(N)]
+    ring = [v*G + r*H for v, r in zip(vs, rs)]
+    l, r = 2, random_scalar()
+    C = vs[l]*G + r*H
+    diffs = [R - C for R in ring]
+    prf = oneofmany_prover(diffs, l, (rs[l] - r) % p, H)
+    assert oneofmany_verifier(diffs, prf, H)
+    print("One-out-of-many membership test complete!")
+
+if __name__ == '__main__':
+    oneofmany_test(2)
+    oneofmany_test(5)
+    membership_test()
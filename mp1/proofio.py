@@ -0,0 +1,351 @@
+"""
+# Compact binary proof format, with a streaming reader and writer
+
+Proofs are python tuples of Points and Fp scalars. This file defines a
+binary encoding for every proof type in zkp-assignment.py (and for
+Bulletproofs range proofs), together with the statement the proof is about,
+so that stored proofs can be verified again later.
+
+Encoding of the fields:
+
+    P   a Point, 33 bytes, the bytes of `ser()` (see `ser_bytes`)
+    S   an Fp scalar, 32 bytes, little endian as in `uint256_to_str`
+    I   an int scalar in [0, p) (the challenges of OR proofs), 32 bytes
+    U   an unsigned int, 4 bytes little endian
+    L   a list of Points, a 2-byte count followed by the points
+    B   bytes, a 4-byte length followed by the bytes
+    T   text, like B, utf-8 encoded
+
+Each record is `[4-byte length][1-byte type][statement fields][proof fields]`,
+and a stream is the 4-byte magic `ZKP1` followed by records. A proof whose
+format has a single field (a Schnorr signature) is that field, not a tuple.
+
+`ProofWriter` appends records to any writable binary file. `read_proofs`
+iterates over the records of a file, pipe or socket. Regular files are
+mapped with mmap, other streams are read in chunks into one reusable buffer,
+and fields are decoded straight out of a memoryview without copying each
+record. Only one record is decoded at a time, so millions of proofs can be
+streamed through a verifier in constant memory. A record longer than
+`MAX_RECORD` is rejected before it is buffered.
+"""
+import io
+import mmap
+import os
+import socket
+import struct
+
+from secp256k1 import Point, Fp, order, ser_bytes, deser_bytes, uint256_from_str, uint256_to_str
+
+MAGIC = b'ZKP1'
+MAX_RECORD = 1 << 22    # bytes: room for an L field of 2^16 - 1 points (2 MiB)
+
+# name: (type byte, statement fields, proof fields)
+RECORD_TYPES = {
+    "dlog":            (1, "P",   "PS"),          # (A,)        (K,s)
+    "pedersen":        (2, "PP",  "PPSS"),        # (C,X)       (KX,KC,sx,sr)
+    "pedersen_vector": (3, "L",   "PSS"),         # (C_arr,)    (C0,sx,sr)
+    "arith":           (4, "PPP", "PPPSS"),       # (A,B,C)     (KA,KB,KC,sa,sb)
+    "OR":              (5, "PP",  "PPSSII"),      # (A,B)       (KA,KB,sa,sb,ca,cb)
+    "schnorr":         (6, "PT",  "B"),           # (X,m)       sig
+    "range":           (7, "UL",  "PPPPSSSLLSS"), # (n,V_arr)   (A,S,T1,T2,taux,mu,t,Ls,Rs,a,b)
+}
+_kinds = dict((tag, name) for name, (tag, _, _) in RECORD_TYPES.items())
+
+_u32 = struct.Struct('<I')
+_u16 = struct.Struct('<H')
+
+
+"""
+## Encoding
+"""
+def encode_fields(schema, values):
+    out = []
+    assert len(schema) == len(values)
+    for f, v in zip(schema, values):
+        if f == 'P':
+            assert type(v) is Point
+            out.append(ser_bytes(v))
+        elif f == 'S':
+            assert type(v) is Fp
+            out.append(uint256_to_str(v.n))
+        elif f == 'I':
+            assert type(v) is int and 0 <= v < order
+            out.append(uint256_to_str(v))
+        elif f == 'U':
+            out.append(_u32.pack(v))
+        elif f == 'L':
+            out.append(_u16.pack(len(v)))
+            out += [ser_bytes(P) for P in v]
+        elif f in 'BT':
+            if f == 'T': v = v.encode('utf-8')
+            assert type(v) is bytes
+            out += [_u32.pack(len(v)), v]
+        else: raise ValueError("Unknown field type %r" % f)
+    return b''.join(out)
+
+def encode_record(kind, statement, prf):
+    tag, sschema, pschema = RECORD_TYPES[kind]
+    if len(pschema) == 1: prf = (prf,)
+    payload = bytes([tag]) + encode_fields(sschema, statement) + encode_fields(pschema, prf)
+    assert len(payload) <= MAX_RECORD, "record too large"
+    return _u32.pack(len(payload)) + payload
+
+
+"""
+## Decoding, from a memoryview
+"""
+def decode_fields(schema, buf, i):
+    out = []
+    for f in schema:
+        if f == 'P':
+            out.append(deser_bytes(buf[i:i+33]))
+            i += 33
+        elif f in 'SI':
+            x = int.from_bytes(buf[i:i+32], 'little')
+            assert x < order
+            out.append(Fp(x) if f == 'S' else x)
+            i += 32
+        elif f == 'U':
+            out.append(_u32.unpack_from(buf, i)[0])
+            i += 4
+        elif f == 'L':
+            (n,) = _u16.unpack_from(buf, i)
+            i += 2
+            out.append([deser_bytes(buf[i+33*j:i+33*(j+1)]) for j in range(n)])
+            i += 33 * n
+        elif f in 'BT':
+            (n,) = _u32.unpack_from(buf, i)
+            i += 4
+            v = bytes(buf[i:i+n])
+            assert len(v) == n, "truncated field"
+            out.append(v.decode('utf-8') if f == 'T' else v)
+            i += n
+        else: raise ValueError("Unknown field type %r" % f)
+    return out, i
+
+def decode_record(payload):
+    # payload: memoryview of one record, without its length prefix
+    if not len(payload) or payload[0] not in _kinds: raise ValueError("unknown record type")
+    kind = _kinds[payload[0]]
+    _, sschema, pschema = RECORD_TYPES[kind]
+    statement, i = decode_fields(sschema, payload, 1)
+    prf, i = decode_fields(pschema, payload, i)
+    assert i == len(payload), "trailing bytes in record"
+    prf = prf[0] if len(pschema) == 1 else tuple(prf)
+    return kind, tuple(statement), prf
+
+
+"""
+## Writer
+"""
+class ProofWriter(object):
+    def __init__(self, f):
+        # f: a binary file opened for writing, or a socket
+        self._owned = isinstance(f, socket.socket)
+        if self._owned: f = f.makefile('wb')
+        self.f = f
+        self.count = 0
+        self.f.write(MAGIC)
+
+    def write(self, kind, statement, prf):
+        self.f.write(encode_record(kind, statement, prf))
+        self.count += 1
+
+    def flush(self):
+        self.f.flush()
+
+    def close(self):
+        # Closes only the file made for a socket, not a file passed in
+        self.f.flush()
+        if self._owned: self.f.close()
+
+    def __enter__(self): return self
+    def __exit__(self, *args): self.close()
+
+
+"""
+## Reader
+"""
+def _read_into(f, buf):
+    if isinstance(f, socket.socket): return f.recv_into(buf)
+    return f.readinto(buf)
+
+def _iter_payloads_mmap(f):
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        view = memoryview(mm)
+        try:
+            assert view[:4] == MAGIC, "not a proof stream"
+            i = 4
+            while i < len(view):
+                (n,) = _u32.unpack_from(view, i)
+                if n > MAX_RECORD: raise ValueError("record of %d bytes, more than MAX_RECORD" % n)
+                assert i + 4 + n <= len(view), "truncated record"
+                payload = view[i+4:i+4+n]
+                try: yield payload
+                finally: payload.release()
+                i += 4 + n
+        finally:
+            view.release()
+
+def _iter_payloads_stream(f, chunk_size):
+    # A single buffer is reused: records are parsed in place, and only the
+    # incomplete record at the end of the buffer is moved to the front
+    buf = bytearray(chunk_size)
+    start = end = 0
+    magic_seen = False
+    while True:
+        if end == len(buf):
+            if start == 0: buf.extend(bytearray(len(buf)))   # one record is larger than the buffer
+            else:
+                buf[:end - start] = buf[start:end]
+                end, start = end - start, 0
+        with memoryview(buf) as view:
+            n = _read_into(f, view[end:])
+        if n == 0: break
+        end += n
+        with memoryview(buf) as view:
+            if not magic_seen:
+                if end < 4: continue
+                assert view[:4] == MAGIC, "not a proof stream"
+                start, magic_seen = 4, True
+            while end - start >= 4:
+                (size,) = _u32.unpack_from(view, start)
+                if size > MAX_RECORD: raise ValueError("record of %d bytes, more than MAX_RECORD" % size)
+                if end - start - 4 < size: break
+                payload = view[start+4:start+4+size]
+                try: yield payload
+                finally: payload.release()
+                start += 4 + size
+    assert start == end, "truncated record"
+
+def read_proofs(f, chunk_size=1 << 16):
+    """
+    Iterates over (kind, statement, prf) in the stream f, which may be a
+    binary file, a pipe or a socket.
+    """
+    try:
+        mappable = not isinstance(f, socket.socket) and f.seekable() and os.fstat(f.fileno()).st_size > 0
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        mappable = False
+    payloads = _iter_payloads_mmap(f) if mappable else _iter_payloads_stream(f, chunk_size)
+    for payload in payloads:
+        yield decode_record(payload)
+
+
+"""
+## Verifying a stream of stored proofs
+
+Dlog and Pedersen proofs are verified in batches of `batch_size` with the
+batch verifiers, so memory stays bounded by one batch of each kind. Range
+proofs are verified one at a time. `H` is the second Pedersen generator.
+"""
+def verify_proofs(records, H, batch_size=64, **kwargs):
+    import batchverify
+    import bulletproofs
+    verifiers = {
+        "dlog": lambda items: batchverify.dlog_batch_verifier(items, batch_size=batch_size, **kwargs),
+        "pedersen": lambda items: batchverify.pedersen_batch_verifier(items, H, batch_size=batch_size, **kwargs),
+    }
+    pending = {"dlog": [], "pedersen": []}
+    count = 0
+    for kind, statement, prf in records:
+        if kind in pending:
+            pending[kind].append(statement + (prf,))
+            if len(pending[kind]) == batch_size:
+                assert verifiers[kind](pending[kind])
+                pending[kind] = []
+        elif kind == "range":
+            n, V_arr = statement
+            assert bulletproofs.range_verifier(V_arr, prf, H, n)
+        else:
+            raise ValueError("No stream verifier for %s proofs" % kind)
+        count += 1
+    for kind, items in pending.items():
+        if items: assert verifiers[kind](items)
+    return count
+
+
+"""
+## Tests
+"""
+def proofio_test():
+    import tempfile
+    import secp256k1
+    G = secp256k1.G
+    H = secp256k1.make_random_point()
+    a = uint256_from_str(os.urandom(32)) % order
+    A = a*G
+    records = [
+        ("dlog", (A,), (G, Fp(a))),
+        ("pedersen", (A, H), (G, H, Fp(1), Fp(2))),
+        ("pedersen_vector", ([A, G, H],), (A, Fp(3), Fp(4))),
+        ("OR", (A, H), (G, H, Fp(5), Fp(6), 7, order - 1)),
+        ("schnorr", (A, "hello"), b'\x01' * 65),
+        ("range", (8, [A]), (A, G, H, A, Fp(1), Fp(2), Fp(3), [G, H], [H, G], Fp(4), Fp(5))),
+    ]
+
+    def check(got):
+        got = list(got)
+        assert len(got) == len(records)
+        for (kind, st, prf), (kind_, st_, prf_) in zip(records, got):
+            assert kind == kind_
+            assert list(st) == list(st_)
+            assert (prf == prf_) if kind == "schnorr" else list(prf) == list(prf_)
+
+    # File, read with mmap
+    with tempfile.TemporaryFile() as f:
+        with ProofWriter(f) as w:
+            for r in records: w.write(*r)
+        f.seek(0)
+        check(read_proofs(f))
+
+    # Stream, with a buffer smaller than a record
+    stream = io.BytesIO()
+    with ProofWriter(stream) as w:
+        for r in records: w.write(*r)
+    stream.seek(0)
+    check(read_proofs(io.BufferedReader(stream), chunk_size=16))
+
+    # Socket
+    s0, s1 = socket.socketpair()
+    with ProofWriter(s0) as w:
+        for r in records: w.write(*r)
+    s0.close()
+    check(read_proofs(s1))
+    s1.close()
+
+    # A record longer than MAX_RECORD is rejected before it is read, and an
+    # unknown record type is a ValueError
+    for bad in (MAGIC + _u32.pack(MAX_RECORD + 1) + b'\x01', MAGIC + _u32.pack(1) + b'\x7f'):
+        for f in (io.BufferedReader(io.BytesIO(bad)), tempfile.TemporaryFile()):
+            if not isinstance(f, io.BufferedReader):
+                f.write(bad)
+                f.seek(0)
+            try:
+                list(read_proofs(f, chunk_size=16))
+                assert False, "a bad record was read"
+            except ValueError:
+                pass
+            f.close()
+    print("Proof format test complete!")
+
+def verify_proofs_test(n=10):
+    import tempfile
+    import secp256k1
+    import batchverify
+    G = secp256k1.G
+    H = secp256k1.make_random_point()
+    with tempfile.TemporaryFile() as f:
+        with ProofWriter(f) as w:
+            for _ in range(n):
+                a = uint256_from_str(os.urandom(32)) % order
+                w.write("dlog", (a*G,), batchverify.make_dlog_proof(a, a*G))
+                x, r = a, uint256_from_str(os.urandom(32)) % order
+                w.write("pedersen", (x*G + r*H, x*G), batchverify.make_pedersen_proof(x, r, H))
+        f.seek(0)
+        assert verify_proofs(read_proofs(f), H, batch_size=4) == 2 * n
+    print("Stored proof verification test complete!")
+
+if __name__ == '__main__':
+    proofio_test()
+    verify_proofs_test()
@@ -0,0 +1,333 @@
+"""
+# Rewinding harness for extractors and forking-lemma experiments
+
+An extractor runs the adversary once, recording its random tape and its
+random oracle queries, and then "rewinds" it to the query its proof relies
+on (the critical query), answering that query with a fresh challenge. Two
+accepting proofs for the same commitment and different challenges give away
+the witness.
+
+Re-running the adversary from scratch, replaying the tape and the recorded
+answers, repeats all its work before the critical query, every time a
+rewind fails (a picky adversary may reject the new challenge and go on to
+another commitment). This harness supports two modes:
+
+- `'replay'`: re-run from scratch, as the extractor in zkp-assignment.py
+  is specified to. Works anywhere.
+- `'fork'` (the default where `os.fork` exists): once the first run shows
+  the critical query, a child process replays the adversary up to it, once,
+  and stays there as a snapshot, forking a branch with a fresh answer per
+  rewind. A rewind only costs the work after the critical query, and the
+  work before it is done twice in all (the first run and the replay), not
+  once per rewind. At most three processes are alive at a time.
+
+Either way, the second run sees the same random tape as the first, and the
+same oracle answers before the critical query.
+
+    run1, run2, stats = rewind(Adv, (A,))
+
+returns two `Run`s `(result, transcript, tape)` that rely on the same
+query with different answers, and counters: rewinds, snapshots, oracle
+queries actually answered, and wall time of the first run and of the
+rewinds. `Adv(*args, rnd_bytes, RO)` is called like the adversaries of
+zkp-assignment.py, and in fork mode its result must be picklable (Points
+and Fp scalars are, see secp256k1.py).
+
+`Oracle` is also a programmable random oracle, for simulators.
+"""
+import os
+import pickle
+import struct
+import time
+from collections import namedtuple
+
+from secp256k1 import ser
+
+Run = namedtuple('Run', 'result transcript tape')
+
+
+"""
+## Random tape and random oracle
+"""
+class Tape(object):
+    # Replays the bytes of `recorded`, then draws fresh ones; records everything
+    def __init__(self, rnd_bytes=os.urandom, recorded=b''):
+        self.rnd_bytes = rnd_bytes
+        self.recorded = recorded
+        self.out = bytearray()
+
+    def __call__(self, n):
+        i = len(self.out)
+        b = self.recorded[i:i+n]
+        if len(b) < n: b += self.rnd_bytes(n - len(b))
+        self.out += b
+        return bytes(b)
+
+
+class Oracle(object):
+    """
+    A lazily sampled random oracle with 32-byte answers. The transcript
+    [...(q,h)...] holds each distinct query once, in order. The first
+    fresh queries are answered from `answers`, then `hook(i, q)` may
+    choose the answer to the i-th fresh query (None: a random one).
+    """
+    def __init__(self, rnd_bytes=os.urandom, answers=(), hook=None):
+        self.rnd_bytes = rnd_bytes
+        self.answers = list(answers)
+        self.hook = hook
+        self.table = {}
+        self.transcript = []
+
+    def program(self, q, h):
+        # For simulators: fix the answer to q before anyone asks
+        assert q not in self.table, "query already answered"
+        self.table[q] = h
+        self.transcript.append((q, h))
+
+    def __call__(self, q):
+        if q in self.table: return self.table[q]
+        i = len(self.transcript)
+        h = None
+        if i < len(self.answers): h = self.answers[i]
+        elif self.hook is not None: h = self.hook(i, q)
+        if h is None: h = self.rnd_bytes(32)
+        assert type(h) is bytes and len(h) == 32
+        self.table[q] = h
+        self.transcript.append((q, h))
+        return h
+
+
+def dlog_critical(run):
+    # A proof (K, s) relies on the query ser(K)
+    K = run.result[0]
+    for i, (q, _) in enumerate(run.transcript):
+        if q == ser(K): return i
+
+
+"""
+## Counters
+"""
+class RewindStats(object):
+    def __init__(self):
+        self.rewinds = 0        # runs after the first
+        self.snapshots = 0      # processes held at the critical query (fork mode)
+        self.queries = 0        # oracle queries answered, not counting the ones a fork skipped
+        self.first_time = 0.0   # wall time of the first run
+        self.total_time = 0.0
+
+    @property
+    def rewind_time(self):
+        return self.total_time - self.first_time
+
+    def __repr__(self):
+        return ('rewinds=%d snapshots=%d queries=%d first=%.3fs rewinding=%.3fs total=%.3fs' %
+                (self.rewinds, self.snapshots, self.queries, self.first_time, self.rewind_time, self.total_time))
+
+
+"""
+## Pipes between the forked processes
+"""
+_u32 = struct.Struct('<I')
+
+def _send(fd, msg):
+    data = pickle.dumps(msg)
+    data = _u32.pack(len(data)) + data
+    while data: data = data[os.write(fd, data):]
+
+def _recv(fd):
+    def read(n):
+        out = b''
+        while len(out) < n:
+            b = os.read(fd, n - len(out))
+            if not b: return None
+            out += b
+        return out
+    hdr = read(4)
+    data = hdr and read(_u32.unpack(hdr)[0])
+    if data is None: return ('error', 'process exited without an answer')
+    return pickle.loads(data)
+
+
+"""
+## The harness
+"""
+class Rewinder(object):
+    def __init__(self, Adv, args=(), critical=dlog_critical, max_rewinds=64, rnd_bytes=os.urandom):
+        # critical(run): the index in run.transcript of the query the proof relies on, or None
+        self.Adv = Adv
+        self.args = tuple(args)
+        self.critical = critical
+        self.max_rewinds = max_rewinds
+        self.rnd_bytes = rnd_bytes
+        self.stats = RewindStats()
+
+    def _success(self, i, run1, run2):
+        return self.critical(run2) == i and run2.transcript[i][1] != run1.transcript[i][1]
+
+    def replay(self):
+        t0 = time.time()
+        tape = Tape(self.rnd_bytes)
+        oracle = Oracle(self.rnd_bytes)
+        run1 = Run(self.Adv(*(self.args + (tape, oracle))), oracle.transcript, bytes(tape.out))
+        self.stats.queries += len(run1.transcript)
+        self.stats.first_time = time.time() - t0
+        i = self.critical(run1)
+        assert i is not None, "the proof does not rely on any oracle query"
+        answers = [h for _, h in run1.transcript[:i]]
+        for _ in range(self.max_rewinds):
+            self.stats.rewinds += 1
+            tape = Tape(self.rnd_bytes, run1.tape)
+            oracle = Oracle(self.rnd_bytes, answers)
+            run2 = Run(self.Adv(*(self.args + (tape, oracle))), oracle.transcript, bytes(tape.out))
+            self.stats.queries += len(run2.transcript)
+            if self._success(i, run1, run2):
+                self.stats.total_time = time.time() - t0
+                return run1, run2
+        assert False, "no successful rewind in %d attempts" % self.max_rewinds
+
+    def fork(self):
+        # The first run here; then one replay, in a child, to the critical
+        # query, where that child forks a branch per rewind
+        t0 = time.time()
+        tape = Tape(self.rnd_bytes)
+        oracle = Oracle(self.rnd_bytes)
+        run1 = Run(self.Adv(*(self.args + (tape, oracle))), oracle.transcript, bytes(tape.out))
+        self.stats.queries += len(run1.transcript)
+        self.stats.first_time = time.time() - t0
+        i = self.critical(run1)
+        assert i is not None, "the proof does not rely on any oracle query"
+        self._run1, self._i = run1, i
+        self._branching = False
+        pid, fd = self._fork()
+        if pid == 0:
+            self.stats = RewindStats()
+            self._tape = Tape(self.rnd_bytes, run1.tape)
+            answers = [h for _, h in run1.transcript[:i]]
+            self._run(self._tape, Oracle(self.rnd_bytes, answers, hook=self._snapshot))
+        msg = self._wait(pid, fd)
+        assert msg[0] != 'error', msg[1]
+        assert msg[0] == 'ok', "the replay did not reach the critical query"
+        _, run2, stats = msg
+        self.stats.rewinds += stats.rewinds
+        self.stats.snapshots += stats.snapshots
+        self.stats.queries += stats.queries
+        self.stats.total_time = time.time() - t0
+        return run1, run2
+
+    def _fork(self):
+        # In the child, returns (0, None), and answers go to the new pipe
+        r, w = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(r)
+            if hasattr(self, '_upstream'): os.close(self._upstream)
+            self._upstream = w
+            return 0, None
+        os.close(w)
+        return pid, r
+
+    def _wait(self, pid, fd):
+        msg = _recv(fd)
+        os.close(fd)
+        os.waitpid(pid, 0)
+        return msg
+
+    def _run(self, tape, oracle):
+        # Runs the adversary in a forked process, and sends the Run upstream
+        try:
+            run = Run(self.Adv(*(self.args + (tape, oracle))), oracle.transcript, bytes(tape.out))
+            self.stats.queries += len(run.transcript)
+            msg = ('run', run, self.critical(run), self.stats)
+            pickle.dumps(msg)
+        except BaseException as e:
+            msg = ('error', '%s: %s' % (type(e).__name__, e))
+        try: _send(self._upstream, msg)
+        finally: os._exit(0)
+
+    def _snapshot(self, i, q):
+        # Oracle hook of the replay, called at the first fresh query: the
+        # critical one. This process is the snapshot, and each rewind a
+        # child of it, with a fresh answer
+        if self._branching: return None
+        assert i == self._i
+        run1 = self._run1
+        stats = self.stats
+        stats.snapshots += 1
+        stats.queries += i
+        msg = ('error', "no successful rewind in %d attempts" % self.max_rewinds)
+        for _ in range(self.max_rewinds):
+            stats.rewinds += 1
+            h = self.rnd_bytes(32)
+            pid, fd = self._fork()
+            if pid == 0:
+                self._branching = True
+                self.stats = RewindStats()
+                self.stats.queries -= i      # the queries before the fork were not made again
+                return h
+            reply = self._wait(pid, fd)
+            if reply[0] != 'run':
+                msg = reply
+                break
+            _, run2, j, branch_stats = reply
+            stats.queries += branch_stats.queries
+            if self._success(i, run1, run2):
+                msg = ('ok', run2, stats)
+                break
+        try: _send(self._upstream, msg)
+        finally: os._exit(0)
+
+
+def rewind(Adv, args=(), critical=dlog_critical, mode=None, max_rewinds=64, rnd_bytes=os.urandom):
+    """
+    Returns (run1, run2, stats), where run2 was rewound to the critical
+    query of run1 and still relies on it. mode: 'fork', 'replay', or None
+    for 'fork' where available.
+    """
+    if mode is None: mode = 'fork' if hasattr(os, 'fork') else 'replay'
+    assert mode in ('fork', 'replay')
+    r = Rewinder(Adv, args, critical, max_rewinds, rnd_bytes)
+    run1, run2 = r.fork() if mode == 'fork' else r.replay()
+    return run1, run2, r.stats
+
+
+"""
+## Tests
+"""
+def picky_adversary(a, setup=0):
+    # The "picky" prover of dlog_test_extractor_harder, which first does
+    # `setup` scalar multiplications worth of work
+    from secp256k1 import G, Fp, order, uint256_from_str
+
+    def Adv(A, rnd_bytes, RO):
+        assert A == a * G
+        for _ in range(setup): uint256_from_str(rnd_bytes(32)) * G
+        while True:
+            coin = rnd_bytes(1)
+            if ord(coin) < 128: continue
+            k = uint256_from_str(rnd_bytes(32)) % order
+            K = k*G
+            c = uint256_from_str(RO(ser(K)))
+            if c & 0b111 != 0: continue
+            return (K, Fp(k + c*a))
+    return Adv
+
+def rewind_test():
+    from secp256k1 import G, uint256_from_str
+    a = uint256_from_str(os.urandom(32))
+    A = a * G
+    modes = ['replay'] + (['fork'] if hasattr(os, 'fork') else [])
+    for mode in modes:
+        run1, run2, stats = rewind(picky_adversary(a), (A,), mode=mode)
+        (K1, s1), (K2, s2) = run1.result, run2.result
+        i = dlog_critical(run1)
+        assert K1 == K2 and dlog_critical(run2) == i
+        assert run1.transcript[:i] == run2.transcript[:i]
+        assert run2.tape[:len(run1.tape)] == run1.tape[:len(run2.tape)]
+        c1, c2 = [uint256_from_str(run.transcript[i][1]) for run in (run1, run2)]
+        assert c1 != c2
+        assert s1.n*G == K1 + c1*A and s2.n*G == K2 + c2*A
+        assert stats.rewinds >= 1
+    print("Rewinding test complete!")
+
+if __name__ == '__main__':
+    rewind_test()
@@ -14,139 +14,64 @@
 #|   `uint256_from_str(rnd_bytes(32))` is an exponent.
 #|
 #|Sometimes an exponent will be represented by objects of the python class  Fp,
-#|which automatically handles arithmetic modulo p. 
+#|which automatically handles arithmetic modulo p.
 #|The underlying 'long' value can be extracted as `p.n` if `type(p) is Fp`.
-import sys
-sys.path += ['elliptic-curves-finite-fields']
-from finitefield.finitefield import FiniteField
-from elliptic_generalized import GeneralizedEllipticCurve, Point, Ideal
-import elliptic
+#|
+#|The definitions are in the `cryptocore` package at the top of the
+#|repository (`cryptocore/curve.py`), which is shared by all the machine
+#|problems; install it with `pip install -e .` from there. This handout
+#|walks through them, and runs a few experiments.
 import os
 import random
+from cryptocore.ecff.elliptic_generalized import Point, Ideal
 
 
 #|## The the definition of secp256k1, Bitcoin's elliptic curve.
-
-#| First define the finite field, Fq
-q = 2**256 - 2**32 - 2**9 - 2**8 - 2**7 - 2**6 - 2**4 - 1
-Fq = FiniteField(q,1) # elliptic curve over F_q
-
-#| Then define the elliptic curve, always of the form y ** 2 = x ** 3 + {a6}
-#|   (Weirerstrass Form)
-curve = GeneralizedEllipticCurve(a6=Fq(7)) # E: y ** 2 = x ** 3 + 7
-
-#| base point, a generator of the group
-Gx = Fq(0x79BE667EF9DCBBAC55A06295CE870B07029BFCDB2DCE28D959F2815B16F81798)
-Gy = Fq(0x483ADA7726A3C4655DA4FBFC0E1108A8FD17B448A68554199C47D08FFB10D4B8)
-G = Point(curve, Gx, Gy)
-
-#| This is the order (# of elements in) the curve
-p = order = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
-Fp = FiniteField(p,1)
-
-#| Get the identity element
-identity = Ideal(curve)
+#|
+#| First the finite field, `Fq = FiniteField(q,1)`, then the elliptic curve,
+#| always of the form y ** 2 = x ** 3 + {a6} (Weirerstrass Form),
+#| `curve = GeneralizedEllipticCurve(a6=Fq(7))`, its base point `G`, a
+#| generator of the group, the order `p` (# of elements in) the curve, with
+#| `Fp = FiniteField(p,1)`, and the identity element.
+#|
+#| The field classes come from a field arithmetic backend, see
+#| `cryptocore/backends.py`: the generic `FiniteField` classes by default,
+#| or plain python ints with `CRYPTOCORE_BACKEND=int`.
+from cryptocore.curve import q, Fq, curve, Gx, Gy, G, p, order, Fp, identity
 
 #|## Serialize and deserialize 32-byte (256-bit) numbers
 #|
 #|Since the underlying field, `Fq`, is 32 bytes, we can represent each point
-#|as a 32-byte X coordinate and 32-byte Y coordinate. The following routines
-#|serialize/deserialize such 32-byte numbers to strings.
-#|
-import struct
-def uint256_from_str(s):
-    """Convert bytes to uint256"""
-    r = 0
-    t = struct.unpack(b"<IIIIIIII", s[:32])
-    for i in range(8):
-        r += t[i] << (i * 32)
-    return r
-
-def uint256_to_str(s):
-    """Convert bytes to uint256"""
-    assert 0 <= s < 2**256
-    t = []
-    for i in range(8):
-        t.append((s >> (i * 32) & 0xffffffff))
-    s = struct.pack(b"<IIIIIIII", *t)
-    return s
+#|as a 32-byte X coordinate and 32-byte Y coordinate. `uint256_from_str` and
+#|`uint256_to_str` serialize/deserialize such 32-byte numbers to strings.
+from cryptocore.curve import uint256_from_str, uint256_to_str
 
 #|## Compute Square Roots
 #|
-#|This easy sqrt works for this curve, not necessarily all curves
+#|`sqrt` is an easy square root that works for this curve, not necessarily all curves
 #|https://en.wikipedia.org/wiki/Quadratic_residue#Prime_or_prime_power_modulus
 #|
 #|There is not always a solution in this `Fq` (for around half the values)
-def sqrt(a):
-    # q: modulus of the underlying finitefield
-    assert type(a) is Fq
-
-    assert (q - 1) % 2 == 0 and (q+1)%4 == 0
-    legendre = a ** ((q-1)//2)
-    if legendre == Fq(-1): raise ValueError # no solution
-    else: return a ** ((q+1)//4)
-
-    
+#|
 #|## Solve for y given x, making use of the efficient square root above
 #|
 #|Because of the fact `y**2 = (-y)**2`, for every x value in the field, there are
 #|generally two curve points with that x coordinate (corresponding to the points
-#|(x,y) and (-y,x)), where we can solve for y efficiently as `sqrt(x**3 + 7)`.
-def solve(x):
-    # Solve for y, given x
-    # There are two possible points that satisfy the curve,
-    # an even and an odd. We choose the odd one.
-    assert type(x) is Fq
-    y = sqrt(x**3 + 7)
-    assert y*y == x**3 + 7
-    if y.n % 2 == 0: y = -y
-    if not curve.testPoint(x, y): raise ValueError
-    return Point(curve, x, y)
-
+#|(x,y) and (-y,x)), where `solve` finds y efficiently as `sqrt(x**3 + 7)`.
+from cryptocore.curve import sqrt, solve
 
 #|## Serialize and deserialize elliptic curve points
 #|
 #|Because we have an easy way to solve for `y` given `x`, (more specifically,
-#|a canonical version of two possible points with the same `x`), we can 
+#|a canonical version of two possible points with the same `x`), we can
 #|represent any pont as the `x` coordinate, and a byte indicating whether
-#|`y` is even or odd.
-def ser(point):
-    # Returns a 33-byte string
-    assert curve.testPoint(point.x, point.y)
-    s = '0'
-    sign = int(point.y.n % 2 == 0)
-    s += str(sign)
-    s += uint256_to_str(point.x.n).hex()
-    assert len(s) == 66 and type(s) == str
-    return s
-
-def deser(s):
-    s = bytes.fromhex(s)
-    assert len(s) == 33
-    sign = int(s[0])
-    assert sign in (0,1)
-    x = uint256_from_str(s[1:])
-    assert 0 <= x < q
-    # Note: this checks that X is the coordinate of a valid point
-    point = solve(Fq(x)) 
-    if sign: point.y = -point.y
-    return point
+#|`y` is even or odd: `ser` and `deser`. `ser_bytes` and `deser_bytes` are
+#|the same encoding as raw bytes, without the hex round trip.
+#|Points and scalars can also be pickled.
+from cryptocore.curve import ser, deser, ser_bytes, deser_bytes
 
 #|## Generate a random point on the curve
-import os
-def make_random_point(rnd_bytes=os.urandom):
-    # 32-byte string for x coordinate
-    while True:
-        # Not all x values are valid, find out by rejection sampling
-        x = uint256_from_str(rnd_bytes(32))
-        try: point = solve(Fq(x))
-        except ValueError: continue
-        break
-
-    # Generate a random bit whether to flip the Y coordinate
-    if ord(rnd_bytes(1)) % 2 == 0:
-        point.y = -point.y
-    return point
+from cryptocore.curve import make_random_point
 
 #|## Experiments
 #|
@@ -175,39 +100,23 @@ assert A * order == identity
 
 
 #| ## How to implement exponentiation (actually scalar multiplication)
-
-#|(see Goldwasser and Bellare, page 258)
-def mult(m, A):
-    assert type(m) in (int, int)
-    assert type(A) is Point
-    X = {}
-    X[0] = A
-    y = identity
-    i = 0
-    while m > 0:
-        if m % 2 == 1:
-            y += X[i] # Group operation (point addition)
-        X[i+1] = X[i] + X[i] 
-        i += 1
-        m = m//2 # Divide (dropping the least significant bit)
-        if m == 0: return y
+#|
+#|`mult(m, A)` is double-and-add (see Goldwasser and Bellare, page 258).
+#|`precompute_table` and `mult_precompute` do fixed-base multiplication:
+#|if the same point A is multiplied by many different scalars (like the
+#|generator G), the doublings are done once, ahead of time, in a table
+#|`A, 2*A, 4*A, ...`. `multi_mult` computes `m1*P1 + ... + mn*Pn` with the
+#|bucket method (Pippenger), sharing one chain of doublings between all
+#|the points.
+from cryptocore.curve import mult, precompute_table, mult_precompute, fixed_base_table, multi_mult
 
 #|# Test multiplication
 assert 5 * G == mult(5, G)
-
-def precompute_table(m, A):
-    # TODO, if you like
-    pass
-
-def mult_precompute(m, A, pow2table=None):
-    # TODO, if you like
-    pass
+assert mult_precompute(12345, G) == 12345 * G
+assert multi_mult([3, 5, order - 2], [G, A, G]) == 1*G + 5*A
 
 #| ## Plot points
-def plot_point(p, *args, **kwargs):
-    assert type(p) is Point
-    assert p != identity
-    plt.plot(float(p.x.n), float(p.y.n), *args, **kwargs)
+from cryptocore.curve import plot_point
 
 try:
     #raise Exception("skipping drawings")
@@ -0,0 +1,472 @@
+"""
+# A compiler for sigma protocols over linear discrete log statements
+
+`dlog_prover`, `pedersen_prover`, `arith_prover` and `OR_prover` all follow
+the same commit / challenge / respond pattern. This file generates the
+prover and verifier from a description of the statement in
+Camenisch-Stadler notation, for example
+
+    sigma = compile_statement('ZK{(x, r): X = x*G, C = x*G + r*H}', G=G, H=H)
+    prf = sigma.prover({'X': X, 'C': C}, {'x': x, 'r': r})
+    assert sigma.verifier({'X': X, 'C': C}, prf)
+
+Each equation sets a public point equal to a sum of terms `secret*Base`.
+Bases passed to `compile_statement` are fixed (like G and H), and the prover
+precomputes a doubling table for each of them on first use; any other name
+must be supplied as a public point with the statement.
+
+Statements can be combined with `&` (AND) and `|` (OR), or with `OR` inside
+the description: `ZK{(a, b): A = a*G OR B = b*G}`. An AND of two linear
+statements is a single linear statement, so a secret shared between them is
+proven to be the same value. OR uses the Cramer-Damgard-Schoenmakers
+technique: the prover simulates the branches it has no witness for.
+
+Proofs are flat tuples: the commitments (one Point per equation), followed by
+the responses (one Fp per secret, for each branch), followed by the branch
+challenges of each OR (ints). The challenge is derived just as in the
+hand-written provers, `c = uint256_from_str(RO(ser(K1) + ser(K2) + ...))`,
+so the compiled proofs for dlog, Pedersen and two-branch OR statements are
+accepted by `dlog_verifier`, `pedersen_verifier` and `OR_verifier`. With a
+`transcript` (see transcript.py), the challenge is `transcript_challenge`
+with a protocol label naming the statement (as parsed) and its public
+points, the fixed bases, the public points in order of their names and the
+commitments, so a proof is bound to the statement it was made for.
+
+The verifier combines all of a proof's equations with random weights into a
+single multi-exponentiation, in which every base appears once.
+"""
+import re
+import os
+
+import secp256k1
+from secp256k1 import Point, Fp, order, identity, ser, uint256_from_str, multi_mult, precompute_table, mult_precompute
+from cryptocore.oracles import sha2
+from batchverify import random_weight, chunks
+from transcript import transcript_challenge
+
+p = order
+
+def random_scalar(rnd_bytes=os.urandom):
+    return uint256_from_str(rnd_bytes(32)) % p
+
+
+class Context(object):
+    # Resolves names to points, for one statement instance
+    def __init__(self, protocol, publics, nonces=None):
+        self.protocol = protocol
+        self.publics = publics
+        self.nonces = nonces
+
+    def point(self, name):
+        if name in self.publics: P = self.publics[name]
+        elif name in self.protocol.bases: P = self.protocol.bases[name]
+        else: raise KeyError("No value given for public point %s" % name)
+        assert type(P) is Point
+        return P
+
+    def mul(self, k, name):
+        if name in self.protocol.bases and name not in self.publics:
+            return mult_precompute(k, self.point(name), self.protocol.table(name))
+        return k * self.point(name)
+
+    def nonce_mul(self, entry, name):
+        # k*P from a NoncePool entry (k, {name: k*P}), if the pool has this base
+        k, pts = entry
+        if name in pts and self.nonces.bases[name] == self.point(name): return pts[name]
+        return self.mul(k, name)
+
+
+"""
+## Statements
+
+Each statement type implements the three moves of the sigma protocol, a
+simulator, and `terms`, which lists `(scalar, point)` pairs whose sum must
+be the identity for the proof to be valid.
+"""
+class Statement(object):
+    def __and__(self, other):
+        if isinstance(self, LinearStatement) and isinstance(other, LinearStatement):
+            secrets = self.secrets + [x for x in other.secrets if x not in self.secrets]
+            return LinearStatement(secrets, self.equations + other.equations)
+        return AndStatement([self, other])
+
+    def __or__(self, other):
+        left = self.branches if isinstance(self, OrStatement) else [self]
+        right = other.branches if isinstance(other, OrStatement) else [other]
+        return OrStatement(left + right)
+
+
+class LinearStatement(Statement):
+    def __init__(self, secrets, equations):
+        # equations: list of (lhs, [(secret, base), ...])
+        self.secrets = list(secrets)
+        self.equations = list(equations)
+        for _, terms in self.equations:
+            for x, _ in terms: assert x in self.secrets
+        self.n_commitments = len(self.equations)
+        self.n_responses = len(self.secrets)
+
+    def __str__(self):
+        eqs = ', '.join('%s = %s' % (lhs, ' + '.join('%s*%s' % t for t in terms))
+                        for lhs, terms in self.equations)
+        return 'ZK{(%s): %s}' % (', '.join(self.secrets), eqs)
+
+    def holds(self, ctx, witness):
+        if not all(x in witness for x in self.secrets): return False
+        return all(ctx.point(lhs) == self._combine(ctx, witness, terms)
+                   for lhs, terms in self.equations)
+
+    def _combine(self, ctx, scalars, terms):
+        y = identity
+        for x, base in terms:
+            y = y + ctx.mul(int(scalars[x]) % p, base)
+        return y
+
+    def commit(self, ctx, witness, rnd_bytes):
+        if ctx.nonces is None:
+            ks = dict((x, random_scalar(rnd_bytes)) for x in self.secrets)
+            Ks = [self._combine(ctx, ks, terms) for _, terms in self.equations]
+            return ks, Ks
+        # Precomputed nonces: one pool entry per secret
+        entries = dict((x, ctx.nonces.get()) for x in self.secrets)
+        Ks = []
+        for _, terms in self.equations:
+            K = identity
+            for x, base in terms: K = K + ctx.nonce_mul(entries[x], base)
+            Ks.append(K)
+        return dict((x, e[0]) for x, e in entries.items()), Ks
+
+    def respond(self, ctx, state, witness, c):
+        ks = state
+        return [Fp(ks[x] + c * int(witness[x])) for x in self.secrets]
+
+    def simulate(self, ctx, c, rnd_bytes):
+        # Choose the responses, and solve for the commitments
+        ss = [Fp(random_scalar(rnd_bytes)) for _ in self.secrets]
+        sd = dict(zip(self.secrets, (s.n for s in ss)))
+        Ks = []
+        for lhs, terms in self.equations:
+            scalars = [sd[x] for x, _ in terms] + [-c]
+            points = [ctx.point(base) for _, base in terms] + [ctx.point(lhs)]
+            Ks.append(multi_mult(scalars, points))
+        return Ks, ss
+
+    def terms(self, ctx, Ks, ss, c, rnd_bytes):
+        # w * (sum_j s_j*B_j - K - c*P) for each equation
+        assert all(type(s) is Fp for s in ss)
+        sd = dict(zip(self.secrets, (s.n for s in ss)))
+        out = []
+        for (lhs, terms), K in zip(self.equations, Ks):
+            w = random_weight(rnd_bytes)
+            out += [(w * sd[x], ctx.point(base)) for x, base in terms]
+            out += [(-w, K), (-w * c, ctx.point(lhs))]
+        return out
+
+
+class AndStatement(Statement):
+    # Conjunction of statements, proven with the same challenge
+    def __init__(self, parts):
+        self.parts = list(parts)
+        self.n_commitments = sum(s.n_commitments for s in self.parts)
+        self.n_responses = sum(s.n_responses for s in self.parts)
+
+    def __str__(self):
+        return ' AND '.join('(%s)' % s for s in self.parts)
+
+    def holds(self, ctx, witness):
+        return all(s.holds(ctx, witness) for s in self.parts)
+
+    def commit(self, ctx, witness, rnd_bytes):
+        states, Ks = [], []
+        for s in self.parts:
+            state, K = s.commit(ctx, witness, rnd_bytes)
+            states.append(state)
+            Ks += K
+        return states, Ks
+
+    def respond(self, ctx, state, witness, c):
+        out = []
+        for s, st in zip(self.parts, state):
+            out += s.respond(ctx, st, witness, c)
+        return out
+
+    def simulate(self, ctx, c, rnd_bytes):
+        Ks, ss = [], []
+        for s in self.parts:
+            K, r = s.simulate(ctx, c, rnd_bytes)
+            Ks += K
+            ss += r
+        return Ks, ss
+
+    def terms(self, ctx, Ks, ss, c, rnd_bytes):
+        out = []
+        for s, K, r in zip(self.parts, split(Ks, self.parts, 'n_commitments'),
+                           split(ss, self.parts, 'n_responses')):
+            out += s.terms(ctx, K, r, c, rnd_bytes)
+        return out
+
+
+class OrStatement(Statement):
+    # Disjunction of statements. The responses are followed by the
+    # challenge of each branch, which must sum to the overall challenge.
+    def __init__(self, branches):
+        self.branches = list(branches)
+        assert len(self.branches) >= 2
+        self.n_commitments = sum(s.n_commitments for s in self.branches)
+        self.n_responses = sum(s.n_responses for s in self.branches) + len(self.branches)
+
+    def __str__(self):
+        return ' OR '.join('(%s)' % s for s in self.branches)
+
+    def holds(self, ctx, witness):
+        return any(s.holds(ctx, witness) for s in self.branches)
+
+    def commit(self, ctx, witness, rnd_bytes):
+        real = [i for i, s in enumerate(self.branches) if s.holds(ctx, witness)]
+        assert real, "witness does not satisfy any branch"
+        real = real[0]
+        state, Ks = {"real": real}, []
+        for i, s in enumerate(self.branches):
+            if i == real:
+                state["inner"], K = s.commit(ctx, witness, rnd_bytes)
+            else:
+                ci = random_scalar(rnd_bytes)
+                K, r = s.simulate(ctx, ci, rnd_bytes)
+                state[i] = (ci, r)
+            Ks += K
+        return state, Ks
+
+    def respond(self, ctx, state, witness, c):
+        real = state["real"]
+        cs = [state[i][0] if i != real else None for i in range(len(self.branches))]
+        cs[real] = (c - sum(ci for ci in cs if ci is not None)) % p
+        out = []
+        for i, s in enumerate(self.branches):
+            if i == real: out += s.respond(ctx, state["inner"], witness, cs[real])
+            else: out += state[i][1]
+        return out + cs
+
+    def simulate(self, ctx, c, rnd_bytes):
+        cs = [random_scalar(rnd_bytes) for _ in self.branches[1:]]
+        cs = [(c - sum(cs)) % p] + cs
+        Ks, ss = [], []
+        for s, ci in zip(self.branches, cs):
+            K, r = s.simulate(ctx, ci, rnd_bytes)
+            Ks += K
+            ss += r
+        return Ks, ss + cs
+
+    def terms(self, ctx, Ks, ss, c, rnd_bytes):
+        cs = ss[len(ss) - len(self.branches):]
+        ss = ss[:len(ss) - len(self.branches)]
+        assert all(type(ci) is int and 0 <= ci < p for ci in cs)
+
+        # Check the challenges are correctly constrained
+        assert sum(cs) % p == c % p
+
+        out = []
+        for s, K, r, ci in zip(self.branches, split(Ks, self.branches, 'n_commitments'),
+                               split(ss, self.branches, 'n_responses'), cs):
+            out += s.terms(ctx, K, r, ci, rnd_bytes)
+        return out
+
+
+def split(items, parts, attr):
+    # Cut a flat list into consecutive pieces, sized by each part
+    out, i = [], 0
+    for s in parts:
+        n = getattr(s, attr)
+        out.append(items[i:i+n])
+        i += n
+    return out
+
+
+"""
+## Parsing statement descriptions
+"""
+_statement_re = re.compile(r'^\s*(?:ZKP?|ZKPOK)?\s*\{\s*\(([^)]*)\)\s*:(.*)\}\s*$', re.I | re.S)
+_name_re = re.compile(r'^[A-Za-z_][A-Za-z_0-9]*$')
+
+def parse_statement(description):
+    m = _statement_re.match(description)
+    if not m: raise ValueError("Can't parse statement %r" % description)
+    secrets = [x.strip() for x in m.group(1).split(',') if x.strip()]
+    for x in secrets:
+        if not _name_re.match(x): raise ValueError("Bad secret name %r" % x)
+
+    branches = []
+    for branch in re.split(r'\bOR\b', m.group(2)):
+        equations = []
+        for eq in branch.split(','):
+            if not eq.strip(): continue
+            if eq.count('=') != 1: raise ValueError("Bad equation %r" % eq)
+            lhs, rhs = (s.strip() for s in eq.split('='))
+            if not _name_re.match(lhs) or lhs in secrets:
+                raise ValueError("Left side of %r must be a public point" % eq)
+            terms = []
+            for term in rhs.split('+'):
+                factors = [f.strip() for f in term.split('*')]
+                if len(factors) != 2 or not all(_name_re.match(f) for f in factors):
+                    raise ValueError("Bad term %r, expected secret*Base" % term)
+                if factors[1] in secrets: factors.reverse()
+                x, base = factors
+                if x not in secrets or base in secrets:
+                    raise ValueError("Term %r must be one secret times one public point" % term)
+                terms.append((x, base))
+            equations.append((lhs, terms))
+        if not equations: raise ValueError("Empty branch in %r" % description)
+        used = set(x for _, terms in equations for x, _ in terms)
+        branches.append(LinearStatement([x for x in secrets if x in used], equations))
+
+    if len(branches) == 1: return branches[0]
+    return OrStatement(branches)
+
+
+"""
+## The compiled protocol
+"""
+class SigmaProtocol(object):
+    def __init__(self, statement, bases):
+        self.statement = statement
+        self.bases = dict(bases)
+        self._tables = {}
+
+    def table(self, name):
+        # Doubling tables for the fixed bases are built on first use
+        if name not in self._tables:
+            self._tables[name] = precompute_table(order, self.bases[name])
+        return self._tables[name]
+
+    def label(self, publics):
+        # => the protocol label of the transcript: the statement, and the
+        #    names of its public points, in the order they are absorbed
+        return ('sigma %s; %s' % (self.statement, ','.join(sorted(publics)))).encode('utf-8')
+
+    def challenge(self, publics, Ks, RO=sha2, transcript=None):
+        if transcript is None:
+            return uint256_from_str(RO(''.join(ser(K) for K in Ks)))
+        statement = [publics[name] for name in sorted(publics)]
+        return transcript_challenge(transcript, self.label(publics), self.bases, statement, Ks)
+
+    def prover(self, publics, witness, rnd_bytes=os.urandom, RO=sha2, transcript=None, nonces=None,
+               check_witness=True):
+        # nonces: an optional NoncePool (see noncepool.py)
+        # check_witness: the check costs as much as computing the commitments,
+        #   callers that already trust the witness can skip it
+        ctx = Context(self, publics, nonces)
+        if check_witness: assert self.statement.holds(ctx, witness)
+
+        state, Ks = self.statement.commit(ctx, witness, rnd_bytes)
+        c = self.challenge(publics, Ks, RO, transcript)
+        ss = self.statement.respond(ctx, state, witness, c)
+        return tuple(Ks) + tuple(ss)
+
+    def _terms(self, publics, prf, RO, rnd_bytes, transcript):
+        st = self.statement
+        assert len(prf) == st.n_commitments + st.n_responses
+        Ks, ss = list(prf[:st.n_commitments]), list(prf[st.n_commitments:])
+        assert all(type(K) is Point for K in Ks)
+
+        # Recompute c w/ the information given
+        c = self.challenge(publics, Ks, RO, transcript)
+        return st.terms(Context(self, publics), Ks, ss, c, rnd_bytes)
+
+    def _check(self, terms):
+        # Sum the scalars of repeated points, then one multi-exponentiation
+        merged = {}
+        for m, P in terms:
+            key = (P.x.n, P.y.n)
+            merged[key] = (merged[key][0] + m, P) if key in merged else (m, P)
+        scalars = [m for m, _ in merged.values()]
+        points = [P for _, P in merged.values()]
+        assert multi_mult(scalars, points) == identity
+
+    def verifier(self, publics, prf, RO=sha2, rnd_bytes=os.urandom, transcript=None):
+        self._check(self._terms(publics, prf, RO, rnd_bytes, transcript))
+        return True
+
+    def batch_verifier(self, proofs, RO=sha2, rnd_bytes=os.urandom, batch_size=64, transcript=None):
+        # proofs: iterable of (publics, prf)
+        start = 0
+        for chunk in chunks(proofs, batch_size):
+            terms = []
+            for publics, prf in chunk:
+                terms += self._terms(publics, prf, RO, rnd_bytes, transcript)
+            try: self._check(terms)
+            except AssertionError:
+                raise AssertionError("invalid proof among proofs %d..%d" % (start, start + len(chunk) - 1))
+            start += len(chunk)
+        return True
+
+
+def compile_statement(statement, **bases):
+    # statement: a description string, or a Statement built with & and |
+    # bases: the fixed public points, e.g. G=G, H=H
+    if isinstance(statement, str): statement = parse_statement(statement)
+    return SigmaProtocol(statement, bases)
+
+
+"""
+## Tests
+"""
+def sigma_pedersen_test():
+    import batchverify
+    G = secp256k1.G
+    H = secp256k1.make_random_point()
+    sigma = compile_statement('ZK{(x, r): X = x*G, C = x*G + r*H}', G=G, H=H)
+
+    x = random_scalar()
+    r = random_scalar()
+    X, C = x*G, x*G + r*H
+    prf = sigma.prover({'X': X, 'C': C}, {'x': x, 'r': r})
+    assert sigma.verifier({'X': X, 'C': C}, prf)
+
+    # Same format as the hand-written Pedersen proofs
+    assert batchverify.pedersen_batch_verifier([(C, X, prf)], H)
+
+    # Wrong statement
+    try: sigma.verifier({'X': X, 'C': C + G}, prf)
+    except AssertionError: pass
+    else: assert False, "proof accepted for the wrong statement"
+    print("Sigma compiler Pedersen test complete!")
+
+def sigma_or_test():
+    from transcript import Transcript
+    G = secp256k1.G
+    sigma = compile_statement('ZK{(a, b): A = a*G OR B = b*G}', G=G)
+    b = random_scalar()
+    A, B = secp256k1.make_random_point(), b*G
+    prf = sigma.prover({'A': A, 'B': B}, {'b': b})
+    (KA, KB, sa, sb, ca, cb) = prf
+    assert sigma.verifier({'A': A, 'B': B}, prf)
+
+    # AND of an OR and a linear statement
+    H = secp256k1.make_random_point()
+    both = compile_statement(parse_statement('ZK{(a, b): A = a*G OR B = b*G}') &
+                             parse_statement('ZK{(r): R = r*H}'), G=G, H=H)
+    r = random_scalar()
+    publics = {'A': A, 'B': B, 'R': r*H}
+    prfs = [(publics, both.prover(publics, {'b': b, 'r': r})) for _ in range(3)]
+    assert both.batch_verifier(iter(prfs))
+
+    # With a binary transcript instead of the string oracle
+    t = Transcript(b'sigma_or_test')
+    prf = both.prover(publics, {'b': b, 'r': r}, transcript=t)
+    assert both.verifier(publics, prf, transcript=t)
+
+    # The transcript binds the statement and the bases, not just the points
+    def rejected(sigma, publics, prf):
+        try: sigma.verifier(publics, prf, transcript=t)
+        except AssertionError: return True
+        return False
+    dlog = compile_statement('ZK{(x): X = x*G}', G=G)
+    x = random_scalar()
+    prf = dlog.prover({'X': x*G}, {'x': x}, transcript=t)
+    assert dlog.verifier({'X': x*G}, prf, transcript=t)
+    assert rejected(compile_statement('ZK{(y): X = y*G}', G=G), {'X': x*G}, prf)
+    assert rejected(compile_statement('ZK{(x): X = x*G}', G=G, H=H), {'X': x*G}, prf)
+    print("Sigma compiler OR test complete!")
+
+if __name__ == '__main__':
+    sigma_pedersen_test()
+    sigma_or_test()
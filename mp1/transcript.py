@@ -0,0 +1,116 @@
+"""
+# Fiat-Shamir transcripts
+
+The random oracle `sha2` in zkp-assignment.py hashes a string built by
+concatenating the hex `ser()` of every prover message, and the challenge is
+read back with `uint256_from_str`. Every challenge rehashes everything from
+scratch, and nothing but the prover's messages is bound into the hash.
+
+A `Transcript` instead absorbs raw bytes into one running SHA256 state, as
+the protocol proceeds:
+
+    t = Transcript(b'dlog')
+    t.append_point(b'A', A)         # the statement
+    t.append_point(b'K', K)         # the prover's commitment
+    c = t.challenge(b'c')           # an integer mod p
+
+Every message is framed with its label and length, so different sequences
+of messages never hash the same way. `fork()` copies the hasher state, which
+makes it cheap to start many proofs from a common prefix (say, a session id
+and the public parameters). A challenge is squeezed from 64 bytes of output,
+so it is uniform mod p, and is absorbed back into the state, so later
+challenges depend on it.
+
+The provers and verifiers in zkp-assignment.py, batchverify.py and sigma.py
+take an optional `transcript` argument. When it is given, they use
+`transcript_challenge` (below) instead of `RO`.
+"""
+import hashlib
+import struct
+
+from secp256k1 import order, ser_bytes, uint256_to_str
+
+p = order
+
+
+class Transcript(object):
+    def __init__(self, label=b''):
+        self._hasher = hashlib.sha256()
+        self.append_message(b'transcript', label)
+
+    def append_message(self, label, data):
+        assert type(label) is bytes
+        self._hasher.update(struct.pack('<I', len(label)) + label + struct.pack('<I', len(data)))
+        self._hasher.update(data)
+        return self
+
+    def append_point(self, label, point):
+        return self.append_message(label, ser_bytes(point))
+
+    def append_scalar(self, label, x):
+        return self.append_message(label, uint256_to_str(int(x) % p))
+
+    def fork(self):
+        t = Transcript.__new__(Transcript)
+        t._hasher = self._hasher.copy()
+        return t
+
+    def challenge(self, label=b'challenge'):
+        self.append_message(b'challenge', label)
+        lo = self._hasher.copy()
+        lo.update(b'\x00')
+        hi = self._hasher.copy()
+        hi.update(b'\x01')
+        c = int.from_bytes(lo.digest() + hi.digest(), 'little') % p
+        self.append_scalar(b'c', c)
+        return c
+
+
+"""
+## Challenges for sigma protocols
+
+The convention used by all the provers and verifiers that accept a
+transcript: fork it, absorb a label naming the protocol, its fixed bases
+(each after its name, in order of the names), the statement's points, then
+the prover's commitments, and squeeze the challenge. Two protocols with as
+many points, or one over other bases, never share a challenge.
+"""
+def transcript_challenge(transcript, protocol, bases, statement, commitments):
+    # protocol: bytes, e.g. b'dlog'; bases: dict of name -> Point, e.g. {'G': G}
+    t = transcript.fork().append_message(b'protocol', protocol)
+    for name in sorted(bases):
+        t.append_message(b'base', name.encode('utf-8')).append_point(b'base', bases[name])
+    for P in statement: t.append_point(b'statement', P)
+    for K in commitments: t.append_point(b'commitment', K)
+    return t.challenge(b'c')
+
+
+"""
+## Tests
+"""
+def transcript_test():
+    import secp256k1
+    G = secp256k1.G
+    t = Transcript(b'test').append_point(b'G', G)
+
+    # Forks are independent, and deterministic
+    a, b = t.fork(), t.fork()
+    assert a.challenge() == b.challenge()
+    assert a.challenge() != t.fork().challenge()
+
+    # Framing: moving bytes between messages changes the challenge
+    x = Transcript().append_message(b'm', b'ab').append_message(b'm', b'c').challenge()
+    y = Transcript().append_message(b'm', b'a').append_message(b'm', b'bc').challenge()
+    assert x != y and 0 <= x < p
+
+    # The protocol and its bases are bound, not just the points
+    H = secp256k1.make_random_point()
+    c = transcript_challenge(t, b'pedersen', {'G': G, 'H': H}, [G, H], [H, G])
+    assert c == transcript_challenge(t, b'pedersen', {'G': G, 'H': H}, [G, H], [H, G])
+    assert c != transcript_challenge(t, b'OR', {'G': G, 'H': H}, [G, H], [H, G])
+    assert c != transcript_challenge(t, b'pedersen', {'G': G, 'H': G}, [G, H], [H, G])
+    assert c != transcript_challenge(t, b'pedersen', {'G': G}, [G, H], [H, G])
+    print("Transcript test complete!")
+
+if __name__ == '__main__':
+    transcript_test()
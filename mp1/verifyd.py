@@ -0,0 +1,305 @@
+"""
+# Proof verification daemon
+
+A local service that verifies proofs for many clients. An asyncio front-end
+accepts connections on a Unix or TCP socket, and collects the incoming
+proofs into micro-batches: a batch is dispatched when it holds `max_batch`
+proofs, or `max_delay` after its first proof arrived, whichever comes first.
+Batches are verified on a pool of worker processes with the batch verifiers
+(see batchverify.py and proofio.verify_proofs). If a batch fails, its proofs
+are checked one by one, so each request gets its own answer.
+
+Wire protocol. The client sends the 4-byte magic `ZKP1`, then proof records
+exactly as written by `proofio.ProofWriter`. Each record is answered, in
+order, with `[4-byte length][status byte][error message]`, where the status
+is 1 for a valid proof and 0 otherwise. An empty record (length 0) asks for
+the server's counters, answered as `[4-byte length][json]`. A record
+longer than `MAX_RECORD` closes the connection, after the answers to the
+records before it.
+
+The counters report requests, valid and invalid proofs, batches and their
+average size, throughput, and percentiles of the per-request latency (from
+arrival of the record to its answer being ready).
+
+usage: python verifyd.py [--unix PATH | --tcp HOST:PORT] [--workers N]
+                         [--max-batch 64] [--max-delay-ms 20] [--stats-interval 0]
+"""
+import argparse
+import asyncio
+import collections
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import proofio
+from proofio import MAGIC
+
+_u32 = struct.Struct('<I')
+
+# The longest record accepted: a connection that announces a longer one is
+# dropped before it is read. Room for a Pedersen vector of about 1900 points.
+MAX_RECORD = 1 << 16
+assert MAX_RECORD <= proofio.MAX_RECORD
+
+# The largest range proof accepted: bits per value, values, and so at most
+# log2 of their product rounds of L, R points
+MAX_RANGE_BITS = 64
+MAX_RANGE_VALUES = 64
+MAX_RANGE_ROUNDS = (MAX_RANGE_BITS * MAX_RANGE_VALUES).bit_length() - 1
+
+# The second Pedersen generator, H, from zkp-assignment.py
+Hx = 0x4d81249b749d3cb7641cd8522f5e1a45b6bd8db03f20d6b96d5077c84d2c053f
+Hy = 0xf39272d1d9a4cca99bcce01590b7e8355bd2fafec94dd10f9e0c98f6cb5be8fa
+
+
+"""
+## Worker processes
+"""
+_H = None
+
+def _init_worker():
+    global _H
+    from secp256k1 import Point, Fq, curve
+    _H = Point(curve, Fq(Hx), Fq(Hy))
+
+def _verify_one(record):
+    try: proofio.verify_proofs([record], _H)
+    except Exception as e: return (False, str(e) or "invalid proof")
+    return (True, "")
+
+def _decode(payload):
+    # A record, with the size of a range proof bounded before its
+    # verifier makes generators for it
+    record = proofio.decode_record(memoryview(payload))
+    kind, statement, prf = record
+    if kind == "range":
+        n, V_arr = statement
+        Ls, Rs = prf[7], prf[8]
+        if not (0 < n <= MAX_RANGE_BITS and 0 < len(V_arr) <= MAX_RANGE_VALUES
+                and len(Ls) <= MAX_RANGE_ROUNDS and len(Rs) <= MAX_RANGE_ROUNDS):
+            raise ValueError("range proof too large")
+    return record
+
+def verify_batch(payloads):
+    # Returns a list of (ok, error), one for each record payload
+    results = [None] * len(payloads)
+    records = []
+    for i, payload in enumerate(payloads):
+        # Any failure to decode is this record's alone
+        try: records.append((i, _decode(payload)))
+        except Exception as e: results[i] = (False, "bad record: %s" % (str(e) or type(e).__name__))
+    try:
+        proofio.verify_proofs((r for _, r in records), _H, batch_size=max(1, len(records)))
+    except Exception:
+        # Find the invalid proofs
+        for i, r in records: results[i] = _verify_one(r)
+    else:
+        for i, _ in records: results[i] = (True, "")
+    return results
+
+
+"""
+## Counters
+"""
+class Stats(object):
+    def __init__(self, window=10000):
+        self.start = time.time()
+        self.requests = self.valid = self.invalid = 0
+        self.batches = self.batched = 0
+        self.latencies = collections.deque(maxlen=window)   # the most recent requests
+
+    def record_batch(self, results, latencies):
+        self.batches += 1
+        self.batched += len(results)
+        for (ok, _), dt in zip(results, latencies):
+            self.requests += 1
+            if ok: self.valid += 1
+            else: self.invalid += 1
+            self.latencies.append(dt)
+
+    def snapshot(self):
+        lat = sorted(self.latencies)
+        def pct(q): return lat[min(len(lat) - 1, int(q * len(lat)))] * 1e3 if lat else 0.0
+        uptime = time.time() - self.start
+        return {
+            "requests": self.requests, "valid": self.valid, "invalid": self.invalid,
+            "batches": self.batches,
+            "avg_batch": self.batched / self.batches if self.batches else 0.0,
+            "throughput": self.requests / uptime if uptime else 0.0,
+            "latency_ms": {"p50": pct(0.5), "p90": pct(0.9), "p99": pct(0.99), "max": pct(1.0)},
+            "uptime": uptime,
+        }
+
+
+"""
+## Micro-batching
+"""
+class Batcher(object):
+    def __init__(self, pool, workers, max_batch, max_delay, stats):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = stats
+        self.pending = []
+        self.timer = None
+        # Keep every worker busy, with one batch queued behind it
+        self.inflight = asyncio.Semaphore(2 * workers)
+
+    def submit(self, payload):
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self.pending.append((payload, fut, time.time()))
+        if len(self.pending) >= self.max_batch: self.flush()
+        elif self.timer is None: self.timer = loop.call_later(self.max_delay, self.flush)
+        return fut
+
+    def flush(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.pending:
+            batch, self.pending = self.pending, []
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        loop = asyncio.get_running_loop()
+        async with self.inflight:
+            try:
+                results = await loop.run_in_executor(self.pool, verify_batch, [p for p, _, _ in batch])
+            except Exception as e:
+                results = [(False, "verifier error: %r" % e)] * len(batch)
+        now = time.time()
+        self.stats.record_batch(results, [now - t for _, _, t in batch])
+        for (_, fut, _), result in zip(batch, results):
+            if not fut.done(): fut.set_result(result)
+
+
+"""
+## Connections
+"""
+def _frame(payload):
+    return _u32.pack(len(payload)) + payload
+
+async def handle_connection(reader, writer, batcher, stats, max_outstanding=1024):
+    # Answers go out in the order the records came in
+    answers = asyncio.Queue(maxsize=max_outstanding)
+
+    async def send_answers():
+        while True:
+            fut = await answers.get()
+            if fut is None: break
+            result = await fut
+            if isinstance(result, bytes): writer.write(_frame(result))
+            else:
+                ok, err = result
+                writer.write(_frame(bytes([ok]) + err.encode('utf-8')))
+            if answers.empty(): await writer.drain()
+
+    sender = asyncio.ensure_future(send_answers())
+    try:
+        magic = await reader.readexactly(4)
+        if magic != MAGIC: return
+        while True:
+            (n,) = _u32.unpack(await reader.readexactly(4))
+            if n > MAX_RECORD: return
+            if n == 0:
+                fut = asyncio.get_running_loop().create_future()
+                fut.set_result(json.dumps(stats.snapshot()).encode('utf-8'))
+            else:
+                fut = batcher.submit(await reader.readexactly(n))
+            await answers.put(fut)   # blocks reading when too many are outstanding
+    except (asyncio.IncompleteReadError, ConnectionResetError):
+        pass
+    finally:
+        await answers.put(None)
+        try: await sender
+        except ConnectionResetError: pass
+        writer.close()
+
+async def serve(args):
+    stats = Stats()
+    pool = ProcessPoolExecutor(args.workers, initializer=_init_worker)
+    # Forks the workers now, before any connection is open, so that they do
+    # not hold client sockets open after the server closes them
+    pool.submit(len, ()).result()
+    batcher = Batcher(pool, args.workers, args.max_batch, args.max_delay_ms / 1e3, stats)
+    handler = lambda r, w: handle_connection(r, w, batcher, stats)
+    if args.tcp:
+        host, port = args.tcp.rsplit(':', 1)
+        server = await asyncio.start_server(handler, host, int(port))
+    else:
+        if os.path.exists(args.unix): os.remove(args.unix)
+        server = await asyncio.start_unix_server(handler, args.unix)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    print("verifyd: listening on %s with %d workers" % (args.tcp or args.unix, args.workers), file=sys.stderr)
+
+    async def report():
+        while args.stats_interval:
+            await asyncio.sleep(args.stats_interval)
+            print("verifyd: %s" % json.dumps(stats.snapshot()), file=sys.stderr)
+    reporter = asyncio.ensure_future(report())
+
+    async with server:
+        await stop.wait()
+    reporter.cancel()
+    pool.shutdown()
+    if args.unix and not args.tcp: os.remove(args.unix)
+    print("verifyd: %s" % json.dumps(stats.snapshot()), file=sys.stderr)
+
+
+"""
+## A blocking client
+"""
+class VerifyClient(object):
+    def __init__(self, address):
+        # address: a Unix socket path, or a (host, port) pair
+        if isinstance(address, str):
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.f = self.sock.makefile('rwb')
+        self.f.write(MAGIC)
+
+    def _reply(self):
+        self.f.flush()
+        hdr = self.f.read(4)
+        assert len(hdr) == 4, "connection closed"
+        return self.f.read(_u32.unpack(hdr)[0])
+
+    def verify(self, kind, statement, prf):
+        self.f.write(proofio.encode_record(kind, statement, prf))
+        reply = self._reply()
+        return reply[0] == 1, reply[1:].decode('utf-8')
+
+    def stats(self):
+        self.f.write(_u32.pack(0))
+        return json.loads(self._reply().decode('utf-8'))
+
+    def close(self):
+        self.f.close()
+        self.sock.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Proof verification daemon")
+    where = parser.add_mutually_exclusive_group()
+    where.add_argument('--unix', default='/tmp/verifyd.sock')
+    where.add_argument('--tcp', help='HOST:PORT')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--max-batch', type=int, default=64)
+    parser.add_argument('--max-delay-ms', type=float, default=20.0)
+    parser.add_argument('--stats-interval', type=float, default=0, help='seconds between log lines (0: off)')
+    asyncio.run(serve(parser.parse_args()))
+
+if __name__ == '__main__':
+    main()
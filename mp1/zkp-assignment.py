@@ -42,6 +42,8 @@ arithmetic modulo p. The underlying 'long' value can be extracted as `p.n` if
 import secp256k1
 from secp256k1 import Point, q, Fq, order, p, Fp, G, curve, ser, deser, uint256_from_str, uint256_to_str
 import os, random
+from transcript import Transcript, transcript_challenge
+from noncepool import NoncePool
 
 # p is the order (the # of elements in) the group, i.e., the number of points on the curve
 # order = p = 0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141
@@ -70,49 +72,22 @@ and random points in the group.
 """
 
 ## Default random oracle
-def make_random_oracle():
-    """This function returns a new random oracle, `RO`.
-    The random oracle maps arbitrary-length input strings `s` to
-    a 32-byte digest. It is initialized with an empty dictionary. 
-    Each time RO is queried with a new value, a
-    random response is sampled and stored."""
-    
-    _mapping = {}
-    def RO(s):
-        assert type(s) is str
-        if not s in _mapping:
-            _mapping[s] = os.urandom(32)
-        return _mapping[s]
-    return RO
+# `make_random_oracle()` returns a new random oracle, `RO`.
+# The random oracle maps arbitrary-length input strings `s` to
+# a 32-byte digest. It is initialized with an empty dictionary.
+# Each time RO is queried with a new value, a
+# random response is sampled and stored.
+#
+# `sha2` is the random oracle instantiated with the SHA2 hash, used by
+# default; `sha2_to_long` hashes bytes to an integer, and `random_point`
+# picks a random point on the curve (given a seed). They are defined in
+# `cryptocore/oracles.py`, shared with the rest of mp1.
+from cryptocore.oracles import make_random_oracle, sha2, sha2_to_long, random_point
 
 ## Map a string to a random value in Zp
 def random_oracle_string_to_Zp(s):
     return sha2_to_long(s) % p
 
-#Find sha2 hash of a string
-def sha2(x):
-    from Crypto.Hash import SHA256
-    return SHA256.new(x.encode("utf-8")).digest()
-
-def sha2_to_long(seed):
-    from Crypto.Hash import SHA256
-    return int(SHA256.new(seed).hexdigest(),16)
-
-## Pick a random point on the curve (given a seed)
-def random_point(seed=None, rnd_bytes=os.urandom):
-    if seed is None: seed = rnd_bytes(32)
-    # assert type(seed) == str and len(seed) == 32
-    x = sha2_to_long(seed)
-    while True:
-        try:
-            p = secp256k1.solve(Fq(x))
-        except ValueError:
-            seed = sha2(('random_point:' + str(seed)))
-            x = sha2_to_long(seed)
-            continue
-        break
-    return p
-
 print(random_point(sha2("hi")))
 """
 _Question:_ can we figure out the discrete log of `random_point("hi")`?
@@ -136,19 +111,31 @@ The Prover takes several additional arguments:
 
  - RO, a random oracle, such that `RO(s)` where `s` is an arbitrary length string, returns a randomly chosen value. By default, will use the sha2 hash.
 
+ - transcript, optionally a binary Fiat-Shamir `Transcript` (see transcript.py) to use instead of `RO`.
+
+ - nonces, optionally a `NoncePool` (see noncepool.py) of precomputed blinding factors and commitments.
+
+ - check_witness, whether to check that `a*G == A` first. The check is a scalar multiplication, which costs as much as the commitment: a prover drawing from a pool, with a witness it trusts, can skip it.
+
 These can be overridden in later section as part of the security proof constructions.
 """
-def dlog_prover(A, a, rnd_bytes=os.urandom, RO=sha2):
-    assert a*G == A
+def dlog_prover(A, a, rnd_bytes=os.urandom, RO=sha2, transcript=None, nonces=None, check_witness=True):
+    if check_witness: assert a*G == A
 
-    # blinding factor
-    k = uint256_from_str(rnd_bytes(32)) % order
+    if nonces is None:
+        # blinding factor
+        k = uint256_from_str(rnd_bytes(32)) % order
 
-    # commitment
-    K = k*G
+        # commitment
+        K = k*G
+    else:
+        # precomputed blinding factor and commitment, see noncepool.py
+        k, pts = nonces.get()
+        K = pts['G']
 
     # Invoke the random oracle to receive a challenge
-    c = uint256_from_str(RO(ser(K)))
+    if transcript is None: c = uint256_from_str(RO(ser(K)))
+    else: c = transcript_challenge(transcript, b'dlog', {'G': G}, [A], [K])
 
     # response
     s = Fp(k + c*a)
@@ -156,27 +143,98 @@ def dlog_prover(A, a, rnd_bytes=os.urandom, RO=sha2):
     return (K,s)
 
 
-def dlog_verifier(A, prf, RO=sha2):
+def dlog_verifier(A, prf, RO=sha2, transcript=None):
     (K,s) = prf
     assert type(A) is type(K) is Point
     assert type(s) is Fp
 
     # Recompute c w/ the information given
-    c = uint256_from_str(RO(ser(K)))
+    if transcript is None: c = uint256_from_str(RO(ser(K)))
+    else: c = transcript_challenge(transcript, b'dlog', {'G': G}, [A], [K])
 
     # Check the verification condition
     assert s.n *G == K + c*A
     return True
 
 
+"""
+Each test runs as soon as its part is defined. The test of a part that is
+not done yet (a #TODO left) fails: `run_test` prints the error and goes on
+with the rest of the series, and the failed tests are listed at the end.
+"""
+import traceback
+failed_tests = []
+
+def run_test(test):
+    try:
+        test()
+    except Exception:
+        traceback.print_exc()
+        print('%s FAILED (is its #TODO done?)' % test.__name__)
+        failed_tests.append(test.__name__)
+
+
 def dlog_test():
     a = uint256_from_str(os.urandom(32))
     A = a*G
     prf = dlog_prover(A, a)
     assert dlog_verifier(A, prf)
+
+    # Opting in to a binary Fiat-Shamir transcript
+    t = Transcript(b'dlog_test')
+    prf = dlog_prover(A, a, transcript=t)
+    assert dlog_verifier(A, prf, transcript=t)
+
+    # Drawing the nonce from a precomputed pool
+    with NoncePool({'G': G}, depth=2, low_watermark=1, batch=1) as nonces:
+        prf = dlog_prover(A, a, nonces=nonces, check_witness=False)
+    assert dlog_verifier(A, prf)
     print('Dlog correctness test complete!')
 
-dlog_test()
+run_test(dlog_test)
+
+"""
+Many proofs can be verified at once, with one multi-exponentiation per batch
+instead of separate scalar multiplications per proof (see batchverify.py).
+The batch verifiers take an iterable of (statement, proof) items.
+"""
+import batchverify
+
+def dlog_batch_verifier(proofs, RO=sha2, rnd_bytes=os.urandom, batch_size=64, transcript=None):
+    # proofs: iterable of (A, (K,s))
+    return batchverify.dlog_batch_verifier(proofs, RO, rnd_bytes, batch_size, transcript)
+
+def pedersen_batch_verifier(proofs, RO=sha2, rnd_bytes=os.urandom, batch_size=64, transcript=None):
+    # proofs: iterable of (C, X, (KX,KC,sx,sr))
+    return batchverify.pedersen_batch_verifier(proofs, H, RO, rnd_bytes, batch_size, transcript)
+
+def dlog_batch_test():
+    def proofs(n):
+        for _ in range(n):
+            a = uint256_from_str(os.urandom(32))
+            A = a*G
+            yield A, dlog_prover(A, a)
+    assert dlog_batch_verifier(proofs(10))
+    print('Dlog batch verification test complete!')
+
+run_test(dlog_batch_test)
+
+"""
+The same proofs can be generated from a description of the statement, with a
+compiled prover and verifier (see sigma.py).
+"""
+import sigma
+dlog_sigma = sigma.compile_statement('ZK{(a): A = a*G}', G=G)
+
+def dlog_sigma_test():
+    a = uint256_from_str(os.urandom(32))
+    A = a*G
+    prf = dlog_sigma.prover({'A': A}, {'a': a})
+    assert dlog_verifier(A, prf)
+    assert dlog_sigma.verifier({'A': A}, dlog_prover(A, a))
+    print('Compiled dlog proof test complete!')
+
+run_test(dlog_sigma_test)
 
 """
 ## Part 1: Make a Pedersen commitment to your crypto egg. 
@@ -210,13 +268,14 @@ def pedersen_prover(C, X, x, r, rnd_bytes=os.urandom, RO=sha2):
 
     return (KX,KC,sx,sr)
 
-def pedersen_verifier(C, X, prf, RO=sha2):
+def pedersen_verifier(C, X, prf, RO=sha2, transcript=None):
     (KX,KC,sx,sr) = prf
     assert type(KX) == type(KC) == Point
     assert type(sx) == type(sr) == Fp
 
     # Recompute c w/ the information given
-    c = uint256_from_str(RO(ser(KX) + ser(KC)))
+    if transcript is None: c = uint256_from_str(RO(ser(KX) + ser(KC)))
+    else: c = transcript_challenge(transcript, b'pedersen', {'G': G, 'H': H}, [C, X], [KX, KC])
 
     assert sx.n *G            == KX + c*X
     assert sx.n *G + sr.n *H  == KC + c*C
@@ -234,7 +293,7 @@ def pedersen_test():
     assert pedersen_verifier(C, X, prf)
     print("Pedersen correctness test complete!")
 
-pedersen_test()
+run_test(pedersen_test)
 
 
 """
@@ -293,7 +352,7 @@ def pederson_vector_test():
     assert pedersen_vector_verifier(C_arr, prf)
     print("Pedersen vector correctness test complete!")
 
-pederson_vector_test()
+run_test(pederson_vector_test)
 
 """
 ## Part 2. Arithmetic relations
@@ -343,7 +402,7 @@ def arith_test():
     assert arith_verifier(A, B, C, prf)
     print("Arithmetic Relation correctness test complete")
 
-arith_test()
+run_test(arith_test)
 
 """
 ## Part 3. OR composition
@@ -362,13 +421,14 @@ def OR_prover(A, B, x, rnd_bytes=os.urandom, RO=sha2):
 
     # TODO: Fill your code in here (20 points)
 
-def OR_verifier(A, B, prf, RO=sha2):
+def OR_verifier(A, B, prf, RO=sha2, transcript=None):
     (KA,KB,sa,sb,ca,cb) = prf
     assert type(KA) is type(KB) is Point
     assert type(sa) is type(sb) is Fp
 
     # Check the challenges are correctly constrained
-    c = uint256_from_str(RO(ser(KA) + ser(KB)))
+    if transcript is None: c = uint256_from_str(RO(ser(KA) + ser(KB)))
+    else: c = transcript_challenge(transcript, b'OR', {'G': G}, [A, B], [KA, KB])
     assert (ca + cb) % p == c
 
     # Check each proof the same way
@@ -397,8 +457,8 @@ def OR_test2():
     assert OR_verifier(A, B, prf)
     print("OR composition correctness 2 test complete!")
 
-OR_test1()
-OR_test2()
+run_test(OR_test1)
+run_test(OR_test2)
 
 
 """
@@ -416,11 +476,12 @@ def schnorr_sign(x, m, rnd_bytes=os.urandom, RO=sha2):
 
     # TODO: Your code goes here (10 points)
 
-def schnorr_verify(X, m, sig, RO=sha2):
+def schnorr_verify(X, m, sig, RO=sha2, transcript=None):
     assert type(X) is Point
     assert type(sig) is bytes and len(sig) is 65
     (K,s) = deser(sig[:33].hex()), uint256_from_str(sig[33:])
-    c = uint256_from_str(RO(ser(K) + sha2(m).hex()))
+    if transcript is None: c = uint256_from_str(RO(ser(K) + sha2(m).hex()))
+    else: c = transcript_challenge(transcript.fork().append_message(b'message', m.encode("utf-8")), b'schnorr', {'G': G}, [X], [K])
     assert s *G == K + c*X
     return True
 
@@ -434,7 +495,7 @@ def schnorr_test():
     assert schnorr_verify(X, msg, sig)
     print("Schnorr Test complete")
 
-schnorr_test()
+run_test(schnorr_test)
 
 
 """
@@ -530,8 +591,8 @@ def dlog_test_extractor_harder():
     assert a == a_
     print('Extractor test complete!')
 
-dlog_test_extractor()
-dlog_test_extractor_harder()
+run_test(dlog_test_extractor)
+run_test(dlog_test_extractor_harder)
 
 def dlog_simulator(A, rnd_bytes):
     """
@@ -571,5 +632,6 @@ def dlog_test_simulator():
 
     print("DLOG simulator test complete!")
 
-dlog_test_simulator()
+run_test(dlog_test_simulator)
 
+print('Failed tests: %s' % (', '.join(failed_tests) if failed_tests else 'none'))
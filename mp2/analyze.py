@@ -0,0 +1,47 @@
+"""
+# Circuit report: depth, width, gate counts and fan-out
+
+Levelizes a circuit (JSON or Bristol Fashion) and prints its depth (the
+number of layers of independent gates), the widths of its layers, its
+gates by type, the number of nonlinear gates (those that need a garbled
+table with Free-XOR), the fan-out of its wires, and the most wires whose
+values an evaluator holds at once, dropping each after its last use.
+
+usage: python analyze.py <circuit> ...
+"""
+import sys
+
+import compiled
+
+
+def bar(n, most, width=50):
+    return '#' * max(1 if n else 0, int(width * n / max(1, most)))
+
+def report(filename):
+    cc = compiled.load(filename)
+    st = cc.stats()
+    print('%s' % filename)
+    print('  %d gates, %d inputs, %d outputs' % (st['gates'], st['inputs'], st['outputs']))
+    print('  depth %d, max width %d, mean width %.1f' % (st['depth'], st['max_width'], st['mean_width']))
+    print('  gates: ' + ', '.join('%s %d' % kv for kv in sorted(st['counts'].items(), key=lambda kv: -kv[1])))
+    print('  AND %d, XOR %d, nonlinear %d' % (st['AND'], st['XOR'], st['nonlinear']))
+    print('  live wires: peak %d in topological order, %d layer by layer, of %d'
+          % (st['peak_live'], st['peak_live_layered'], st['inputs'] + st['gates']))
+    print('  fan-out: max %d, mean %.2f' % (st['max_fanout'], st['mean_fanout']))
+    hist = st['fanout_histogram']
+    for f, n in hist.items():
+        print('    %5d %9d %s' % (f, n, bar(n, max(hist.values()))))
+    widths = st['widths']
+    print('  layer widths:')
+    step = max(1, len(widths) // 40)
+    for i in range(0, len(widths), step):
+        w = max(widths[i:i + step])
+        label = '%d' % (i + 1) if step == 1 else '%d-%d' % (i + 1, min(i + step, len(widths)))
+        print('    %11s %9d %s' % (label, w, bar(w, st['max_width'])))
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("usage: python analyze.py <circuit> ...")
+        sys.exit(1)
+    for filename in sys.argv[1:]:
+        report(filename)
@@ -0,0 +1,111 @@
+"""
+# Benchmark: loading Bristol Fashion circuits
+
+For each circuit, reports its size, the time to read it (bristol.read) and
+the peak memory that takes (tracemalloc), the time to load it again from
+the compiled cache, and the time to evaluate it once. The standard
+benchmark circuits (aes_128.txt, sha256.txt, mult64.txt, ... from
+https://homes.esat.kuleuven.be/~nsmart/MPC/) are given as arguments; with
+`--mult BITS ...` it also generates n x n bit schoolbook multipliers, which
+have about 6 n^2 gates (a 1024 bit one has 6 million), and checks that
+they multiply.
+
+usage: python bench_bristol.py [circuit.txt ...] [--mult 64 256 1024]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import bristol
+import compiled
+from compiled import Builder
+
+
+def add(b, xs, ys):
+    # xs + ys, ripple carry, for len(xs) <= len(ys)
+    out, c = [], None
+    for i, y in enumerate(ys):
+        if i >= len(xs):
+            out.append(b.XOR(y, c))
+            c = b.AND(y, c)
+        elif c is None:
+            out.append(b.XOR(xs[i], y))
+            c = b.AND(xs[i], y)
+        else:
+            # full adder: sum x^y^c, carry ((x^c) & (y^c)) ^ c
+            xc, yc = b.XOR(xs[i], c), b.XOR(y, c)
+            out.append(b.XOR(xc, y))
+            c = b.XOR(b.AND(xc, yc), c)
+    return out + [c]
+
+def multiplier(n):
+    # x * y, for n bit x (wires 0..n-1) and y (n..2n-1), low bits first
+    assert n >= 2
+    b = Builder(2*n, input_sizes=[n, n])
+    x, y = list(range(n)), list(range(n, 2*n))
+    acc = [b.AND(x[i], y[0]) for i in range(n)]
+    out = [acc.pop(0)]
+    for j in range(1, n):
+        acc = add(b, acc, [b.AND(x[i], y[j]) for i in range(n)])
+        out.append(acc.pop(0))
+    return b.build(out + acc, output_sizes=[2*n])
+
+def to_bits(v, n):
+    return [(v >> i) & 1 for i in range(n)]
+
+def from_bits(bits):
+    return sum(v << i for i, v in enumerate(bits))
+
+def measure(path, name):
+    size = os.path.getsize(path)
+    t0 = time.perf_counter()
+    cc = bristol.read(path)
+    t_read = time.perf_counter() - t0
+    # Again, for the memory: tracemalloc slows reading down several times
+    tracemalloc.start()
+    bristol.read(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    compiled.load(path)                 # fills the cache
+    t0 = time.perf_counter()
+    cached = compiled.load(path)
+    t_cached = time.perf_counter() - t0
+
+    bits = [random.randint(0, 1) for _ in range(cc.n_inputs)]
+    t0 = time.perf_counter()
+    result = cached.evaluate_bits(bits)
+    t_eval = time.perf_counter() - t0
+    assert result == cc.evaluate_bits(bits)
+
+    n_and = sum(1 for t in cc.table if t == compiled.AND)
+    print('%-16s %9d %9d %8.1f %9.2f %9.1f %7.1f %9.3f %8.2f'
+          % (name, cc.n_gates, n_and, size / 2**20, t_read, peak / 2**20,
+             peak / max(1, cc.n_gates), t_cached, t_eval), flush=True)
+    return cc
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('circuits', nargs='*')
+    parser.add_argument('--mult', type=int, nargs='*', default=[64, 256])
+    args = parser.parse_args()
+
+    print('%-16s %9s %9s %8s %9s %9s %7s %9s %8s'
+          % ('circuit', 'gates', 'AND', 'file MB', 'read s', 'peak MB', 'B/gate', 'cached s', 'eval s'))
+    for path in args.circuits:
+        measure(path, os.path.basename(path))
+
+    with tempfile.TemporaryDirectory() as d:
+        for n in args.mult:
+            path = os.path.join(d, 'mult%d.txt' % n)
+            bristol.write(multiplier(n), path)
+            cc = measure(path, 'mult%d' % n)
+            x, y = random.getrandbits(n), random.getrandbits(n)
+            assert from_bits(cc.evaluate_bits(to_bits(x, n) + to_bits(y, n))) == x * y
+            os.remove(compiled.cache_path(compiled.file_digest(path)))
+
+if __name__ == '__main__':
+    main()
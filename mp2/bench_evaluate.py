@@ -0,0 +1,59 @@
+"""
+# Benchmark: plaintext evaluation, one input at a time vs bit-sliced
+
+Evaluates a circuit on `--n` random inputs with `BooleanCircuit.evaluate`
+(one at a time), `BooleanCircuit.evaluate_batch` and the compiled
+circuit's `evaluate_bits_batch` (bit-sliced, in batches of `--batch`), and
+reports evaluations per second and the speedup over evaluate. The batch
+results are checked against evaluate. The last line of each batch size is
+the compiled circuit on inputs that are already packed into words, without
+the conversion to and from lists of bits, as `truth_table` does it.
+
+usage: python bench_evaluate.py <circuit> [--n 10000] [--batch 64 1024 10000]
+"""
+import argparse
+import random
+import time
+
+import compiled
+from circuit import BooleanCircuit, pack_bits
+
+
+def rate(f, n):
+    t0 = time.perf_counter()
+    out = f()
+    return out, n / (time.perf_counter() - t0)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('circuit')
+    parser.add_argument('--n', type=int, default=10000)
+    parser.add_argument('--batch', type=int, nargs='*', default=[64, 1024, 10000])
+    args = parser.parse_args()
+
+    cc = compiled.load(args.circuit)
+    plain = BooleanCircuit(from_json=cc.to_json())
+    names = cc.input_names()
+    bits = [[random.randint(0, 1) for _ in names] for _ in range(args.n)]
+    inputs = [dict(zip(names, b)) for b in bits]
+    print('%s: %d gates, %d inputs, %d evaluations' % (args.circuit, cc.n_gates, cc.n_inputs, args.n))
+
+    expected, base = rate(lambda: [plain.evaluate(inp) for inp in inputs], args.n)
+    print('%-36s %12.0f evals/s' % ('evaluate', base))
+    for size in args.batch:
+        chunks = [range(i, min(i + size, args.n)) for i in range(0, args.n, size)]
+        out, r = rate(lambda: [o for c in chunks for o in plain.evaluate_batch([inputs[k] for k in c])], args.n)
+        assert out == expected
+        print('%-36s %12.0f evals/s %7.1fx' % ('evaluate_batch, batches of %d' % size, r, r / base))
+        out, r = rate(lambda: [o for c in chunks for o in cc.evaluate_bits_batch([bits[k] for k in c])], args.n)
+        outs = cc.output_names()
+        assert [dict(zip(outs, o)) for o in out] == expected
+        print('%-36s %12.0f evals/s %7.1fx' % ('compiled, batches of %d' % size, r, r / base))
+        # Without converting inputs and outputs (as for truth tables)
+        words = [pack_bits(zip(*[bits[k] for k in c])) for c in chunks]
+        masks = [(1 << len(c)) - 1 for c in chunks]
+        _, r = rate(lambda: [cc.evaluate_words(w, m) for w, m in zip(words, masks)], args.n)
+        print('%-36s %12.0f evals/s %7.1fx' % ('compiled words, batches of %d' % size, r, r / base))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+# Benchmark: garbling modes
+
+For each circuit, garbling mode (generator.MODES) and, for the Free-XOR
+modes, garbling hash (util.HASHES), garbles the circuit
+and evaluates it on random inputs `--rounds` times, checks the output
+labels, and reports gates garbled and evaluated per second, the garbled
+table bytes per gate (raw, and in the JSON output), and the speedups over
+the first mode (classic, the 4-row scheme), and AES key schedules, blocks
+and ECB calls per gate, garbling and evaluating. Circuits are JSON or Bristol
+files; `--mult N` adds a generated N x N bit multiplier (see
+bench_bristol.py).
+
+usage: python bench_garble.py [circuit ...] [--mult 16] [--rounds 3]
+                              [--modes classic freexor halfgates]
+                              [--hashes aes sha256]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import compiled
+import util
+from generator import GarbledCircuitGenerator, MODES
+from evaluator import GarbledCircuitEvaluator
+
+
+def bench(obj, cc, mode, hash, rounds):
+    c = GarbledCircuitGenerator(from_json=obj, compiled=cc)
+    names = cc.input_names()
+    t_garble = t_eval = 0
+    size = json_size = 0
+    counts = {'garble': util.collections.Counter(), 'eval': util.collections.Counter()}
+    for _ in range(rounds):
+        inputs = dict((wid, random.randint(0, 1)) for wid in names)
+        util.aes_counts.clear()
+        t0 = time.perf_counter()
+        c.garble(mode, hash)
+        t_garble += time.perf_counter() - t0
+        counts['garble'].update(util.aes_counts)
+        size = sum(len(row) // 2 for rows in c.garble_table.values() for row in rows)
+
+        with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+            path = f.name
+        c.output(path, inputs, debug=False, quiet=True)
+        json_size = os.path.getsize(path)
+        garbled = json.load(open(path))
+        os.remove(path)
+
+        e = GarbledCircuitEvaluator(from_json=garbled, compiled=cc)
+        util.aes_counts.clear()
+        t0 = time.perf_counter()
+        out = e.garbled_evaluate(garbled["inputs"])
+        t_eval += time.perf_counter() - t0
+        counts['eval'].update(util.aes_counts)
+        for wid, v in cc.evaluate(inputs).items():
+            assert out[wid] == c.wire_labels[wid][v], "output wire mismatch"
+    return t_garble / rounds, t_eval / rounds, size, json_size, counts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('circuits', nargs='*', default=['example_circuits/32adder.json'])
+    parser.add_argument('--mult', type=int, nargs='*', default=[16])
+    parser.add_argument('--rounds', type=int, default=3)
+    parser.add_argument('--modes', nargs='*', default=list(MODES))
+    parser.add_argument('--hashes', nargs='*', default=list(util.HASHES))
+    args = parser.parse_args()
+
+    circuits = [(os.path.basename(path), compiled.load(path)) for path in args.circuits]
+    if args.mult:
+        from bench_bristol import multiplier
+        circuits += [('mult%d' % n, multiplier(n)) for n in args.mult]
+
+    configs = [(mode, None if mode == 'classic' else hash)
+               for mode in args.modes for hash in (args.hashes if mode != 'classic' else [None])]
+    print('%-14s %-17s %7s %10s %10s %9s %9s %8s %8s  %s'
+          % ('circuit', 'mode', 'gates', 'garble g/s', 'eval g/s', 'table B/g', 'JSON B/g',
+             'garble x', 'eval x', 'AES per gate (garble; eval): key schedules, blocks, ECB calls'))
+    for name, cc in circuits:
+        obj = cc.to_json()
+        base = None
+        for mode, hash in configs:
+            g, e, size, json_size, counts = bench(obj, cc, mode, hash, args.rounds)
+            if base is None: base = (g, e)
+            n = cc.n_gates * args.rounds
+            aes = '; '.join('%.2f, %.2f, %.3f' % tuple(counts[side][k] / n for k in ('key schedules', 'blocks', 'ECB calls'))
+                            for side in ('garble', 'eval'))
+            print('%-14s %-17s %7d %10.0f %10.0f %9.1f %9.1f %8.1f %8.1f  %s'
+                  % (name, mode + ('/' + hash if hash else ''), cc.n_gates, cc.n_gates / g, cc.n_gates / e,
+                     size / cc.n_gates, json_size / cc.n_gates, base[0] / g, base[1] / e, aes), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+"""
+# Benchmark: layer-parallel garbling and evaluation
+
+For each circuit and garbling mode, garbles and evaluates the circuit in
+one process (garble, garbled_evaluate), then with parallel.Pool on each
+number of `--workers`, checks the output labels, and reports the seconds
+and the speedups over one process. Besides circuit files, `--adders K`
+generates K independent 32-bit adders side by side (a circuit as wide as
+a batch of additions, or as an AES round), and `--mult N` an N x N bit
+multiplier (see bench_bristol.py), which is deep and narrow. Only layers
+of at least `--min-chunk` gates per worker are split.
+
+usage: python bench_parallel.py [circuit ...] [--adders 256] [--mult 32]
+                                [--workers 1 2 4] [--modes classic halfgates]
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+import compiled
+import parallel
+from bench_bristol import add, multiplier
+from generator import GarbledCircuitGenerator
+from evaluator import GarbledCircuitEvaluator
+
+
+def adders(k, n=32):
+    # k independent n bit adders, x_i + y_i for i < k
+    b = compiled.Builder(2*n*k, input_sizes=[n] * (2*k))
+    outs = []
+    for i in range(k):
+        outs += add(b, list(range(2*n*i, 2*n*i + n)), list(range(2*n*i + n, 2*n*(i+1))))
+    return b.build(outs, output_sizes=[n + 1] * k)
+
+def timed(f):
+    t0 = time.perf_counter()
+    out = f()
+    return out, time.perf_counter() - t0
+
+def run(cc, obj, mode, hash, workers, min_chunk):
+    # => seconds garbling, seconds evaluating
+    g = GarbledCircuitGenerator(from_json=obj, compiled=cc)
+    g.levelize()
+    inputs = dict((wid, random.randint(0, 1)) for wid in g.input_wires)
+    if workers:
+        with parallel.Pool(g, workers, min_chunk) as pool:
+            pool.garble(mode, hash)     # starts the workers
+            _, t_garble = timed(lambda: pool.garble(mode, hash))
+    else:
+        _, t_garble = timed(lambda: g.garble(mode, hash))
+
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        path = f.name
+    g.output(path, inputs, debug=False, quiet=True)
+    garbled = json.load(open(path))
+    os.remove(path)
+    e = GarbledCircuitEvaluator(from_json=garbled, compiled=cc)
+    e.levelize()
+    if workers:
+        with parallel.Pool(e, workers, min_chunk) as pool:
+            pool.evaluate(garbled["inputs"])
+            out, t_eval = timed(lambda: pool.evaluate(garbled["inputs"]))
+    else:
+        out, t_eval = timed(lambda: e.garbled_evaluate(garbled["inputs"]))
+    for wid, v in cc.evaluate(inputs).items():
+        assert out[wid] == g.wire_labels[wid][v], "output wire mismatch"
+    return t_garble, t_eval
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('circuits', nargs='*')
+    parser.add_argument('--adders', type=int, nargs='*', default=[256])
+    parser.add_argument('--mult', type=int, nargs='*', default=[32])
+    parser.add_argument('--workers', type=int, nargs='*', default=sorted({1, 2, os.cpu_count()}))
+    parser.add_argument('--modes', nargs='*', default=['classic', 'halfgates'])
+    parser.add_argument('--hash', default='aes')
+    parser.add_argument('--min-chunk', type=int, default=parallel.MIN_CHUNK)
+    args = parser.parse_args()
+
+    circuits = [(os.path.basename(path), compiled.load(path)) for path in args.circuits]
+    circuits += [('adders%d' % k, adders(k)) for k in args.adders]
+    circuits += [('mult%d' % n, multiplier(n)) for n in args.mult]
+
+    print('%d CPUs' % os.cpu_count())
+    print('%-12s %7s %6s %-10s %-9s %9s %9s %9s %9s'
+          % ('circuit', 'gates', 'depth', 'mode', 'workers', 'garble s', 'eval s', 'garble x', 'eval x'))
+    for name, cc in circuits:
+        obj = cc.to_json()
+        depth = cc.stats()['depth']
+        for mode in args.modes:
+            base = run(cc, obj, mode, args.hash, None, args.min_chunk)
+            rows = [('serial', base)] + [(str(w), run(cc, obj, mode, args.hash, w, args.min_chunk))
+                                         for w in args.workers]
+            for workers, (g, e) in rows:
+                print('%-12s %7d %6d %-10s %-9s %9.3f %9.3f %9.2f %9.2f'
+                      % (name, cc.n_gates, depth, mode, workers, g, e, base[0] / g, base[1] / e), flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+# Benchmark: garbling on request vs pre-garbling
+
+For each circuit and garbling mode, serves `--requests` requests, one
+every `--interval` seconds, each a random input assignment to be garbled
+for and streamed (into memory) to the evaluator, and reports the online
+latency of each request, from its inputs to the last byte sent:
+- on request: stream.write garbles the circuit then and there,
+- pre-garbled: a pregarble.Pool of `--depth` copies, garbled by
+  `--workers` threads (or processes, with `--processes`), hands out a
+  ready copy, and only the labels of the inputs are picked then.
+The pool fills before the first request. Requests that come faster than the
+workers garble wait for a copy, as many as `waits` reports: latency is then
+back to garbling, less the head start. One response of each is evaluated
+and checked.
+
+usage: python bench_pregarble.py [circuit ...] [--mult 32] [--modes classic halfgates]
+                                 [--requests 20] [--interval 0.05] [--depth 8] [--workers 1]
+"""
+import argparse
+import io
+import os
+import random
+import time
+
+import compiled
+import pregarble
+import roundtrip
+import stream
+
+
+def serve(respond, g, args):
+    # Serves args.requests requests, args.interval seconds apart, with
+    # respond(inputs, f) => the latency of each, the last response
+    latencies = []
+    for _ in range(args.requests):
+        t_next = time.perf_counter() + args.interval
+        inputs = dict((wid, random.randint(0, 1)) for wid in g.input_wires)
+        f = io.BytesIO()
+        t0 = time.perf_counter()
+        respond(inputs, f)
+        latencies.append(time.perf_counter() - t0)
+        time.sleep(max(0, t_next - time.perf_counter()))
+    return latencies, (inputs, f.getvalue())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('circuits', nargs='*')
+    parser.add_argument('--mult', type=int, nargs='*', default=[32])
+    parser.add_argument('--modes', nargs='*', default=['classic', 'halfgates'])
+    parser.add_argument('--hash', default='aes')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--interval', type=float, default=0.05)
+    parser.add_argument('--depth', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--processes', action='store_true')
+    args = parser.parse_args()
+
+    circuits = [(os.path.basename(path), compiled.load(path)) for path in args.circuits]
+    if args.mult:
+        from bench_bristol import multiplier
+        circuits += [('mult%d' % n, multiplier(n)) for n in args.mult]
+
+    print('%-12s %-10s %-12s %10s %10s %10s %6s %9s'
+          % ('circuit', 'mode', 'garbled', 'mean ms', 'median ms', 'max ms', 'waits', 'pool MB'))
+    for name, cc in circuits:
+        g, e = roundtrip.garblers(cc)
+        g.levelize(); e.levelize(); stream.schedule_digest(e)
+        for mode in args.modes:
+            runs = []
+            latencies, response = serve(lambda inputs, f: stream.write(g, f, inputs, mode, args.hash), g, args)
+            roundtrip.check_stream(e, response[1], response[0], cc)
+            runs.append(('on request', latencies, '-', '-'))
+
+            with pregarble.Pool(g, mode, args.hash, args.depth, workers=args.workers,
+                                processes=args.processes) as pool:
+                pool.fill()
+                size = sum(len(p) for p in pool.ready)
+                latencies, response = serve(lambda inputs, f: pool.get().write(f, inputs), g, args)
+                roundtrip.check_stream(e, response[1], response[0], cc)
+                runs.append(('pre-garbled', latencies, pool.waits, '%.2f' % (size / 2**20)))
+
+            for garbled, latencies, waits, mb in runs:
+                ms = sorted(t * 1e3 for t in latencies)
+                print('%-12s %-10s %-12s %10.2f %10.2f %10.2f %6s %9s'
+                      % (name, mode, garbled, sum(ms) / len(ms), ms[len(ms) // 2], ms[-1], waits, mb), flush=True)
+
+if __name__ == '__main__':
+    main()
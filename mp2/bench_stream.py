@@ -0,0 +1,154 @@
+"""
+# Benchmark: JSON files vs streaming garbled circuits
+
+For each circuit and garbling mode, garbles and evaluates the circuit
+- through a JSON file: garble, output, json.load, a new evaluator (which
+  loads the tables), garbled_evaluate, one after the other,
+- through a stream (stream.py) in memory, garbling all of it, then
+  evaluating all of it, which shows the cost of the format alone,
+- through a pipe, to an evaluator in another process (forked, with the
+  circuit already loaded), so that garbling and evaluating overlap,
+- through a stream in memory again, with labels from a seed (see
+  garble), so that the generator keeps the labels of live wires only,
+and reports the seconds each step takes, the bytes sent, and the peak
+memory of the evaluating side and of the garbling side (tracemalloc, in
+separate runs: the JSON file and the tables, against the stream's; the
+garbling side writes the stream to nowhere). With the two processes on two
+cores, the pipe's time end to end approaches the larger of garbling and
+evaluating; on one core it cannot be below their sum.
+
+usage: python bench_stream.py [circuit ...] [--mult 32] [--modes classic halfgates] [--hash aes]
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+import compiled
+import stream
+import util
+from generator import GarbledCircuitGenerator
+from evaluator import GarbledCircuitEvaluator
+
+
+class Discard(object):
+    # A binary file that drops what is written to it
+    def write(self, data): return len(data)
+    def flush(self): pass
+
+def peak(f):
+    # => the peak memory f allocates, in bytes
+    tracemalloc.start()
+    f()
+    _, top = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return top
+
+def via_json(g, cc, obj, inputs, mode, hash):
+    t0 = time.perf_counter()
+    g.garble(mode, hash)
+    t_garble = time.perf_counter() - t0
+    with tempfile.NamedTemporaryFile(suffix='.json', delete=False) as f:
+        path = f.name
+    g.output(path, inputs, debug=False, quiet=True)
+    t_output = time.perf_counter() - t0 - t_garble
+    size = os.path.getsize(path)
+
+    def load_and_evaluate():
+        garbled = json.load(open(path))
+        e = GarbledCircuitEvaluator(from_json=garbled, compiled=cc)
+        t1 = time.perf_counter()
+        return e.garbled_evaluate(garbled["inputs"]), time.perf_counter() - t1
+    t1 = time.perf_counter()
+    out, t_eval = load_and_evaluate()
+    t_load = time.perf_counter() - t1 - t_eval
+    check(g, cc, inputs, out)
+    epeak = peak(load_and_evaluate)
+    gpeak = peak(lambda: (g.garble(mode, hash), g.output(path, inputs, debug=False, quiet=True)))
+    os.remove(path)
+    return dict(garble=t_garble, write=t_output, load=t_load, evaluate=t_eval,
+                total=t_garble + t_output + t_load + t_eval, bytes=size, peak=epeak, gpeak=gpeak)
+
+def via_memory(g, e, cc, inputs, mode, hash, chunk, seed=None):
+    f = io.BytesIO()
+    t0 = time.perf_counter()
+    size = stream.write(g, f, inputs, mode, hash, chunk, seed=seed)
+    t_garble = time.perf_counter() - t0
+    data = f.getvalue()
+    t0 = time.perf_counter()
+    out = stream.evaluate(e, io.BytesIO(data))
+    t_eval = time.perf_counter() - t0
+    check(g, cc, inputs, out)
+    epeak = peak(lambda: stream.evaluate(e, io.BytesIO(data)))
+    gpeak = peak(lambda: stream.write(g, Discard(), inputs, mode, hash, chunk, seed=seed))
+    # Less the stream itself, which a pipe would not hold
+    return dict(garble=t_garble, evaluate=t_eval, total=t_garble + t_eval, bytes=size,
+                peak=epeak - len(data), gpeak=gpeak)
+
+def _garble_into(g, w, inputs, mode, hash, chunk, labels):
+    with os.fdopen(w, 'wb') as f:
+        stream.write(g, f, inputs, mode, hash, chunk)
+    labels.send(dict((wid, g.wire_labels[wid]) for wid in g.output_wires))
+
+def via_pipe(g, e, cc, inputs, mode, hash, chunk):
+    ctx = multiprocessing.get_context('fork')
+    r, w = os.pipe()
+    labels, child_labels = ctx.Pipe()
+    t0 = time.perf_counter()
+    p = ctx.Process(target=_garble_into, args=(g, w, inputs, mode, hash, chunk, child_labels))
+    p.start()
+    os.close(w)
+    with os.fdopen(r, 'rb') as f:
+        out = stream.evaluate(e, f)
+    t_total = time.perf_counter() - t0
+    g.wire_labels = labels.recv()
+    p.join()
+    check(g, cc, inputs, out)
+    return dict(total=t_total)
+
+def check(g, cc, inputs, out):
+    for wid, v in cc.evaluate(inputs).items():
+        assert out[wid] == g.wire_labels[wid][v], "output wire mismatch"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('circuits', nargs='*')
+    parser.add_argument('--mult', type=int, nargs='*', default=[32])
+    parser.add_argument('--modes', nargs='*', default=['classic', 'halfgates'])
+    parser.add_argument('--hash', default='aes')
+    parser.add_argument('--chunk', type=int, default=stream.CHUNK)
+    args = parser.parse_args()
+
+    circuits = [(os.path.basename(path), compiled.load(path)) for path in args.circuits]
+    if args.mult:
+        from bench_bristol import multiplier
+        circuits += [('mult%d' % n, multiplier(n)) for n in args.mult]
+
+    print('%-12s %-10s %-7s %8s %8s %8s %8s %8s %9s %8s %9s'
+          % ('circuit', 'mode', 'via', 'garble s', 'write s', 'load s', 'eval s', 'total s', 'MB sent', 'eval MB',
+             'garble MB'))
+    for name, cc in circuits:
+        obj = cc.to_json()
+        g = GarbledCircuitGenerator(from_json=obj, compiled=cc)
+        e = GarbledCircuitEvaluator(from_json=obj, compiled=cc)
+        g.levelize(); e.levelize(); stream.schedule_digest(e)
+        for mode in args.modes:
+            inputs = dict((wid, random.randint(0, 1)) for wid in g.input_wires)
+            runs = [('JSON', via_json(g, cc, obj, inputs, mode, args.hash)),
+                    ('stream', via_memory(g, e, cc, inputs, mode, args.hash, args.chunk)),
+                    ('seeded', via_memory(g, e, cc, inputs, mode, args.hash, args.chunk, util.generate_key())),
+                    ('pipe', via_pipe(g, e, cc, inputs, mode, args.hash, args.chunk))]
+            for via, r in runs:
+                cell = lambda k, scale=1: '%8.2f' % (r[k] / scale) if k in r else '%8s' % '-'
+                print('%-12s %-10s %-7s %s %s %s %s %s %s %s %s'
+                      % (name, mode, via, cell('garble'), cell('write'), cell('load'), cell('evaluate'),
+                         cell('total'), ' ' + cell('bytes', 2**20), cell('peak', 2**20),
+                         ' ' + cell('gpeak', 2**20)), flush=True)
+
+if __name__ == '__main__':
+    main()
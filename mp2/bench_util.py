@@ -0,0 +1,81 @@
+"""
+# Benchmark: XOR and special encryption, one at a time vs in bulk
+
+Reports the time per call of
+- XOR of two `--size` byte strings, byte by byte (as simpleOT.strxor and
+  util.specialDecryption did) and with util.xor_bytes,
+- specialEncryption and specialDecryption of a 16 byte label, once per row,
+  and with specialEncryptions and specialDecryptions on the `--n` rows of
+  n/4 garbled gates (4 rows per gate, under 2 keys each, as in classic
+  garbling), with the AES key schedules each takes,
+and the speedups. The batches are checked against the single calls.
+
+usage: python bench_util.py [--n 4096] [--size 16 64 4096] [--rounds 5]
+"""
+import argparse
+import time
+
+import util
+
+
+def bytewise_xor(a, b):
+    return b''.join(bytes([x ^ y]) for (x, y) in zip(a, b))
+
+def per_call(f, calls, rounds):
+    # => the best time per call of `calls` calls, over `rounds` rounds
+    best = None
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        f()
+        t = (time.perf_counter() - t0) / calls
+        best = t if best is None else min(best, t)
+    return best
+
+def row(name, t, base, schedules=None):
+    print('%-40s %10.2f us %8.1fx %s' % (name, t * 1e6, base / t,
+                                        '' if schedules is None else '%6.2f key schedules' % schedules))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('--n', type=int, default=4096)
+    parser.add_argument('--size', type=int, nargs='*', default=[16, 64, 4096])
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    for size in args.size:
+        a, b = util.random_bytes(size), util.random_bytes(size)
+        assert bytewise_xor(a, b) == util.xor_bytes(a, b)
+        calls = max(1, 2**16 // size)
+        base = per_call(lambda: [bytewise_xor(a, b) for _ in range(calls)], calls, args.rounds)
+        row('xor %d bytes, byte by byte' % size, base, base)
+        row('xor %d bytes, xor_bytes' % size, per_call(lambda: [util.xor_bytes(a, b) for _ in range(calls)], calls, args.rounds), base)
+
+    # The rows of n/4 gates: 4 rows per gate, under 2 keys A and 2 keys B
+    n = args.n - args.n % 4
+    keys = [(util.generate_key(), util.generate_key()) for _ in range(n // 2)]
+    pairs = [(keys[i // 4 * 2][i % 2], util.generate_key()) for i in range(n)]
+    inner = util.specialEncryptions(pairs)
+    outer = [(keys[i // 4 * 2 + 1][i // 2 % 2], c) for i, c in enumerate(inner)]
+
+    def schedules(f):
+        util.aes_counts.clear()
+        f()
+        return util.aes_counts['key schedules'] / n
+
+    enc = lambda: [util.specialEncryption(k, m) for k, m in outer]
+    base = per_call(enc, n, args.rounds)
+    row('specialEncryption, %d rows' % n, base, base, schedules(enc))
+    enc = lambda: util.specialEncryptions(outer)
+    row('specialEncryptions, %d rows' % n, per_call(enc, n, args.rounds), base, schedules(enc))
+
+    cs = util.specialEncryptions(outer)
+    dec = lambda: [util.specialDecryption(k, c) for (k, _), c in zip(outer, cs)]
+    assert dec() == [c for _, c in outer]
+    base = per_call(dec, n, args.rounds)
+    row('specialDecryption, %d rows' % n, base, base, schedules(dec))
+    dec = lambda: util.specialDecryptions([(k, c) for (k, _), c in zip(outer, cs)])
+    assert dec() == [c for _, c in outer]
+    row('specialDecryptions, %d rows' % n, per_call(dec, n, args.rounds), base, schedules(dec))
+
+if __name__ == '__main__':
+    main()
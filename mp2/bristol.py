@@ -0,0 +1,277 @@
+"""
+# Bristol Fashion circuits
+
+The standard benchmark circuits for MPC (AES-128, SHA-256, adders and
+multipliers, https://homes.esat.kuleuven.be/~nsmart/MPC/) are distributed
+in Bristol Fashion:
+
+    <number of gates> <number of wires>
+    <number of input values> <bits of value 1> ... <bits of value n>
+    <number of output values> <bits of value 1> ... <bits of value n>
+
+    2 1 <in> <in> <out> XOR
+    2 1 <in> <in> <out> AND
+    1 1 <in> <out> INV
+    1 1 <in> <out> EQW          (out = in)
+    1 1 <0 or 1> <out> EQ       (out = constant)
+    2k k <k ins> <k ins> <k outs> MAND
+
+The input wires are numbered first, the output wires last, and the gates
+come in topological order. `read()` streams such a file straight into a
+CompiledCircuit (compiled.py), one line at a time, so a circuit with
+millions of gates costs its columns (17 bytes per gate) plus 4 bytes per
+wire while it is read, and no dict per gate. INV and EQW become gates
+with both inputs on the same wire, EQ a constant table (on wire 0), MAND
+one AND gate per output.
+
+`write()` does the reverse. Tables other than AND and XOR are written as
+AND, XOR and INV gates, from their algebraic normal form; OR, say, is
+`(a AND b) XOR (a XOR b)`.
+
+`compiled.load()` recognizes Bristol files, and caches them like JSON ones.
+
+    python bristol.py <circuit.json> <circuit.txt>     # convert, either way
+    python bristol.py <circuit>                        # test the round trip
+"""
+from array import array
+
+import compiled
+from compiled import CompiledCircuit, AND, XOR, INV, EQW
+
+UNSET = 0xFFFFFFFF
+
+
+def _open(f, mode):
+    if isinstance(f, str):
+        return open(f, mode), True
+    return f, False
+
+def _header(f):
+    # The three header lines, skipping blank ones
+    lines = []
+    while len(lines) < 3:
+        line = f.readline()
+        if not line: raise ValueError("truncated Bristol header")
+        if line.strip(): lines.append([int(x) for x in line.split()])
+    (n_gates, n_wires), ins, outs = lines
+    if ins[0] != len(ins) - 1 or outs[0] != len(outs) - 1:
+        raise ValueError("not a Bristol Fashion header: %r %r" % (ins, outs))
+    return n_gates, n_wires, ins[1:], outs[1:]
+
+def read(f):
+    # f: a filename or a text file => CompiledCircuit
+    f, close = _open(f, 'r')
+    try:
+        n_gates, n_wires, input_sizes, output_sizes = _header(f)
+        n_inputs, n_outputs = sum(input_sizes), sum(output_sizes)
+
+        # remap: Bristol wire => our wire (inputs keep their numbers)
+        remap = array('I', [UNSET]) * n_wires
+        remap[:n_inputs] = array('I', range(n_inputs))
+        in0, in1, out, table = array('I'), array('I'), array('I'), array('B')
+        w = n_inputs
+
+        def wire(x):
+            v = remap[int(x)]
+            if v == UNSET: raise ValueError("wire %s used before it is set" % x)
+            return v
+
+        for line in f:
+            parts = line.split()
+            if not parts: continue
+            op = parts[-1]
+            if op == 'XOR' or op == 'AND':
+                in0.append(wire(parts[2]))
+                in1.append(wire(parts[3]))
+                table.append(XOR if op == 'XOR' else AND)
+                outs = parts[4:5]
+            elif op == 'INV' or op == 'EQW':
+                a = wire(parts[2])
+                in0.append(a)
+                in1.append(a)
+                table.append(INV if op == 'INV' else EQW)
+                outs = parts[3:4]
+            elif op == 'EQ':
+                assert parts[2] in ('0', '1') and n_inputs > 0
+                in0.append(0)
+                in1.append(0)
+                table.append(15 if parts[2] == '1' else 0)
+                outs = parts[3:4]
+            elif op == 'MAND':
+                k = int(parts[1])
+                for i in range(k):
+                    in0.append(wire(parts[2 + i]))
+                    in1.append(wire(parts[2 + k + i]))
+                    table.append(AND)
+                outs = parts[2 + 2*k:2 + 3*k]
+            else:
+                raise ValueError("unknown Bristol gate: %r" % line)
+            for o in outs:
+                o = int(o)
+                if remap[o] != UNSET: raise ValueError("wire %d is set twice" % o)
+                remap[o] = w
+                out.append(w)
+                w += 1
+
+        outputs = array('I', (remap[x] for x in range(n_wires - n_outputs, n_wires)))
+        if UNSET in outputs: raise ValueError("an output wire is never set")
+    finally:
+        if close: f.close()
+    return CompiledCircuit(n_inputs, in0, in1, out, table, outputs,
+                           input_sizes=input_sizes, output_sizes=output_sizes)
+
+
+"""
+## Writing
+
+Each table t is written as t0 XOR (c1 AND a) XOR (c2 AND b) XOR (c3 AND ab),
+its algebraic normal form, with the constant as an INV.
+"""
+def _anf(t):
+    t00, t01, t10, t11 = compiled.bits_table(t)
+    return t00, t00 ^ t10, t00 ^ t01, t00 ^ t01 ^ t10 ^ t11
+
+def _gates(t, a, b):
+    # => [(op, inputs)], the last one computing t(a, b); an input is a wire,
+    # or ('tmp', i) for the output of the i'th gate of the list
+    if t == AND: return [('AND', (a, b))]
+    if t == XOR: return [('XOR', (a, b))]
+    c0, c1, c2, c3 = _anf(t)
+    terms = [x for x, c in ((a, c1), (b, c2)) if c]
+    gates = []
+    if c3:
+        gates.append(('AND', (a, b)))
+        terms.append(('tmp', 0))
+    if not terms:
+        return [('EQ', (c0,))]
+    if len(terms) == 1 and not gates:
+        return [('INV' if c0 else 'EQW', (terms[0],))]
+    acc = terms[0]
+    for x in terms[1:]:
+        gates.append(('XOR', (acc, x)))
+        acc = ('tmp', len(gates) - 1)
+    if c0:
+        gates.append(('INV', (acc,)))
+    return gates
+
+GATES = [_gates(t, 'a', 'b') for t in range(16)]
+
+def write(cc, f, input_sizes=None, output_sizes=None):
+    # Writes CompiledCircuit cc to f, a filename or a text file
+    input_sizes = input_sizes or cc.input_sizes or [cc.n_inputs]
+    output_sizes = output_sizes or cc.output_sizes or [len(cc.outputs)]
+    assert sum(input_sizes) == cc.n_inputs and sum(output_sizes) == len(cc.outputs)
+    n_inputs, n_outputs = cc.n_inputs, len(cc.outputs)
+
+    # The output wires get the last numbers. An output that is an input
+    # wire, or that is listed twice, is copied there by an EQW at the end.
+    slot = {}
+    copies = []
+    for k, w in enumerate(cc.outputs):
+        if w >= n_inputs and w not in slot: slot[w] = k
+        else: copies.append(k)
+    n_emit = sum(len(GATES[t]) for t in cc.table) + len(copies)
+    n_wires = n_inputs + n_emit
+    first_out = n_wires - n_outputs
+
+    f, close = _open(f, 'w')
+    try:
+        f.write('%d %d\n' % (n_emit, n_wires))
+        f.write(' '.join(map(str, [len(input_sizes)] + list(input_sizes))) + '\n')
+        f.write(' '.join(map(str, [len(output_sizes)] + list(output_sizes))) + '\n\n')
+
+        number = array('I', [UNSET]) * cc.n_wires   # our wire => Bristol wire
+        number[:n_inputs] = array('I', range(n_inputs))
+        fresh = n_inputs
+        lines = []
+        for a, b, o, t in zip(cc.in0, cc.in1, cc.out, cc.table):
+            env = {'a': number[a], 'b': number[b]}
+            tmps = []
+            gates = GATES[t]
+            for i, (op, args) in enumerate(gates):
+                if i == len(gates) - 1 and o in slot:
+                    x = first_out + slot[o]
+                else:
+                    x = fresh
+                    fresh += 1
+                tmps.append(x)
+                if op == 'EQ':
+                    lines.append('1 1 %d %d EQ\n' % (args[0], x))
+                    continue
+                ins = [tmps[v[1]] if type(v) is tuple else env[v] for v in args]
+                lines.append('%d 1 %s %d %s\n' % (len(ins), ' '.join(map(str, ins)), x, op))
+            number[o] = tmps[-1]
+            if len(lines) >= 65536:
+                f.writelines(lines)
+                del lines[:]
+        for k in copies:
+            lines.append('1 1 %d %d EQW\n' % (number[cc.outputs[k]], first_out + k))
+        f.writelines(lines)
+        assert fresh == first_out
+    finally:
+        if close: f.close()
+
+
+"""
+## Tests
+"""
+def bristol_test(filename, rounds=100):
+    import io
+    import random
+    cc = compiled.load(filename, cache=False)
+    buf = io.StringIO()
+    write(cc, buf)
+    again = read(io.StringIO(buf.getvalue()))
+    assert again.n_inputs == cc.n_inputs and len(again.outputs) == len(cc.outputs)
+    for _ in range(rounds):
+        bits = [random.randint(0, 1) for _ in range(cc.n_inputs)]
+        assert again.evaluate_bits(bits) == cc.evaluate_bits(bits)
+
+    # Every table survives the round trip, including constants and copies
+    b = compiled.Builder(2)
+    outs = [b.add(0, 1, t) for t in range(16)]
+    cc = b.build(outs + [0, outs[3], outs[3]])
+    buf = io.StringIO()
+    write(cc, buf)
+    again = read(io.StringIO(buf.getvalue()))
+    for x in range(4):
+        bits = [x >> 1, x & 1]
+        assert again.evaluate_bits(bits) == cc.evaluate_bits(bits)
+        assert cc.evaluate_bits(bits)[:16] == [(t >> x) & 1 for t in range(16)]
+
+    # EQ, EQW, INV and MAND, read from a file
+    text = '''6 9
+    2 2 1
+    1 4
+
+    1 1 1 3 EQ
+    1 1 0 4 INV
+    2 2 0 1 2 3 5 6 MAND
+    1 1 2 7 EQW
+    2 1 5 7 8 XOR
+    '''
+    cc = read(io.StringIO(text.replace('\n    ', '\n')))
+    assert cc.input_sizes == [2, 1] and cc.output_sizes == [4]
+    assert cc.n_gates == 6
+    for x in range(8):
+        a, b, c = x & 1, (x >> 1) & 1, x >> 2
+        # outputs are wires 5..8 = a&c, b&1, c, (a&c)^c
+        assert cc.evaluate_bits([a, b, c]) == [a & c, b, c, (a & c) ^ c]
+    print("Bristol test complete: %s" % filename)
+
+if __name__ == '__main__':
+    import sys
+    import json
+    if len(sys.argv) == 3:
+        cc = compiled.load(sys.argv[1])
+        if sys.argv[2].endswith('.json'):
+            with open(sys.argv[2], 'w') as f:
+                json.dump(cc.to_json(), f, indent=4)
+        else:
+            write(cc, sys.argv[2])
+        print('Wrote', sys.argv[2])
+    elif len(sys.argv) == 2:
+        bristol_test(sys.argv[1])
+    else:
+        print("usage: python bristol.py <circuit> [<out.txt>]")
+        sys.exit(1)
@@ -1,9 +1,42 @@
 import json
 from collections import defaultdict, deque
 
+# Bit-sliced gates: each of a, b holds one bit per evaluation, and mask has
+# a 1 for each evaluation. SLICED[t] is the gate with truth table t as 4
+# bits (bit 2*a + b is the output on a, b), from its algebraic normal form
+# t00 ^ (t00^t10)*a ^ (t00^t01)*b ^ (t00^t01^t10^t11)*ab.
+def _sliced(t):
+    t00, t01, t10, t11 = [(t >> i) & 1 for i in range(4)]
+    if t == 0b1000: return lambda a, b, mask: a & b
+    if t == 0b0110: return lambda a, b, mask: a ^ b
+    if t == 0b1110: return lambda a, b, mask: a | b
+    c0, c1, c2, c3 = t00, t00 ^ t10, t00 ^ t01, t00 ^ t01 ^ t10 ^ t11
+    def gate(a, b, mask):
+        v = mask if c0 else 0
+        if c1: v ^= a
+        if c2: v ^= b
+        if c3: v ^= a & b
+        return v
+    return gate
+
+SLICED = [_sliced(t) for t in range(16)]
+
+_TO_ASCII = bytes.maketrans(b'\x00\x01', b'01')
+_FROM_ASCII = bytes.maketrans(b'01', b'\x00\x01')
+
+def pack_bits(columns):
+    # columns: a list of bits per wire, one per evaluation => an int per wire
+    return [int(bytes(col)[::-1].translate(_TO_ASCII) or b'0', 2) for col in columns]
+
+def unpack_bits(words, n):
+    # the reverse of pack_bits, for n evaluations
+    return [list(format(w, '0%db' % n).encode()[::-1].translate(_FROM_ASCII)) if n else [] for w in words]
+
 class BooleanCircuit(object):
 
-    def __init__(self, from_json=None):
+    def __init__(self, from_json=None, compiled=None):
+        # compiled: a CompiledCircuit of the same circuit (see compiled.py),
+        # whose gate order is used instead of sorting again
         self.gates = {}
         self.wires = {}
 
@@ -59,7 +92,23 @@ class BooleanCircuit(object):
             self.output_wires = wires.difference(input_map)
 
             # Do the topological sort
-            self._topological_sort()
+            if compiled is not None:
+                self.sorted_gates = self._compiled_order(compiled)
+            else:
+                self._topological_sort()
+
+    def _compiled_order(self, compiled):
+        # The gate order of a CompiledCircuit of this circuit, once each of
+        # its gates is checked against ours: same wires, same table
+        names, gids = compiled.wire_names, compiled.gate_ids
+        if compiled.n_gates != len(self.gates) or set(compiled.input_names()) != self.input_wires:
+            raise ValueError("the compiled circuit is of another circuit")
+        for gid, a, b, o, t in zip(gids, compiled.in0, compiled.in1, compiled.out, compiled.table):
+            gate = self.gates.get(gid)
+            if (gate is None or gate["inp"] != [names[a], names[b]] or gate["out"][0] != names[o]
+                    or gate["table"] != [(t >> i) & 1 for i in range(4)]):
+                raise ValueError("the compiled circuit is of another circuit, at gate %s" % gid)
+        return list(gids)
 
     def _topological_sort(self):
         # Precondition: 
@@ -98,27 +147,117 @@ class BooleanCircuit(object):
 
         self.sorted_gates = sorted_gates
 
-    def evaluate(self, inp):
+    def levelize(self):
+        # Postcondition: self.layers[i] lists the gates at depth i+1, whose
+        #   deepest input is the output of a gate of layer i (or an input
+        #   wire, for layer 0). The gates of a layer are independent, and
+        #   evaluating the layers in order is a topological order.
+        depth = dict((wid,0) for wid in self.input_wires)
+        layers = []
+        for gid in self.sorted_gates:
+            gate = self.gates[gid]
+            d = 1 + max(depth[w] for w in gate["inp"])
+            depth[gate["out"][0]] = d
+            if d > len(layers): layers.append([])
+            layers[d-1].append(gid)
+        self.layers = layers
+        return layers
+
+    def wire_index(self):
+        # A number for each wire: the input wires in sorted order, then the
+        # output wire of each gate in topological order, as in compiled
+        # circuits (see compiled.py)
+        if not hasattr(self, '_wire_index'):
+            index = dict((wid, i) for i, wid in enumerate(sorted(self.input_wires)))
+            for gid in self.sorted_gates:
+                index[self.gates[gid]["out"][0]] = len(index)
+            self._wire_index = index
+        return self._wire_index
+
+    def schedule(self, layers=None):
+        # The gates in evaluation order: layer by layer if layers are given
+        # (see levelize), else in topological order
+        if layers is None: return self.sorted_gates
+        return [gid for layer in layers for gid in layer]
+
+    def stats(self):
+        # Depth, width, gate and fan-out counts, see CompiledCircuit.stats
+        return self.compile().stats()
+
+    def compile(self):
+        # The CompiledCircuit of this circuit
+        import compiled
+        return compiled.compile_circuit(self)
+
+    def liveness(self, layers=None):
+        # For evaluating the gates in the order of self.schedule(layers):
+        # => dead, where dead[i] lists the wires that gate i of the order
+        #    reads last, which can be dropped after it (never output wires)
+        if not hasattr(self, '_liveness') or self._liveness[0] is not layers:
+            order = self.schedule(layers)
+            last = {}
+            for i, gid in enumerate(order):
+                for wid in self.gates[gid]["inp"]:
+                    last[wid] = i
+            dead = [[] for _ in order]
+            for wid, i in last.items():
+                if wid not in self.output_wires: dead[i].append(wid)
+            self._liveness = (layers, dead)
+        return self._liveness[1]
+
+    def evaluate(self, inp, layers=None, keep=False):
         # Precondition: initialized, topologically sort
-        # Postcondition: self.wire_values takes on values resulting from this evaluation
-        # Takes an array of bits as input
+        # Postcondition: self.wire_values takes on values resulting from this evaluation,
+        #   of the output wires only (each other wire is dropped after its
+        #   last use, see liveness) unless keep, and self.peak_live is the
+        #   most values held at once
+        # Takes an array of bits as input, and optionally a layered schedule
         assert len(inp) == len(self.input_wires)
-        wire_values = dict( (wid,None) for wid in self.wires )
+        wire_values = {}
         for wid,v in list(inp.items()):
-            assert v in (0,1)
+            assert v in (0,1) and wid in self.input_wires
             wire_values[wid] = v
 
-        for gid in self.sorted_gates:
+        dead = None if keep else self.liveness(layers)
+        peak = len(wire_values)
+        for i, gid in enumerate(self.schedule(layers)):
             gate = self.gates[gid]
             a = wire_values[gate["inp"][0]]
             b = wire_values[gate["inp"][1]]
             c = gate["table"][2*a + b]
             wire_values[gate["out"][0]] = c
+            if dead is not None:
+                if len(wire_values) > peak: peak = len(wire_values)
+                for wid in dead[i]: del wire_values[wid]
 
         self.wire_values = wire_values
+        self.peak_live = peak if dead is not None else len(wire_values)
 
         return dict((wid,wire_values[wid]) for wid in self.output_wires)
 
+    def evaluate_batch(self, inputs):
+        # Evaluates the circuit on each of a list of inputs (as for evaluate)
+        # at once, bit-sliced: each wire holds a python int with one bit per
+        # input, so each gate is a few bitwise operations for the whole list
+        n = len(inputs)
+        for inp in inputs:
+            assert len(inp) == len(self.input_wires)
+            assert all(v in (0,1) for v in inp.values())
+        input_wires = list(self.input_wires)
+        words = pack_bits([[inp[wid] for inp in inputs] for wid in input_wires])
+        wire_words = dict(zip(input_wires, words))
+        mask = (1 << n) - 1
+        for gid in self.sorted_gates:
+            gate = self.gates[gid]
+            a = wire_words[gate["inp"][0]]
+            b = wire_words[gate["inp"][1]]
+            t = sum(v << i for i, v in enumerate(gate["table"]))
+            wire_words[gate["out"][0]] = SLICED[t](a, b, mask)
+
+        output_wires = list(self.output_wires)
+        columns = unpack_bits([wire_words[wid] for wid in output_wires], n)
+        return [dict((wid, col[k]) for wid, col in zip(output_wires, columns)) for k in range(n)]
+
 if __name__ == "__main__":
     import sys
     if len(sys.argv) < 2:
@@ -0,0 +1,522 @@
+"""
+# Compiled circuits: integer wires and gate columns
+
+`BooleanCircuit` keeps every gate as a dict keyed by its string id, and
+parses the JSON and sorts the gates again each time one is constructed.
+A `CompiledCircuit` is the same circuit, sorted once, with
+
+- wires renumbered to dense ints: the input wires first (in name order),
+  then the output wire of each gate, in topological order, so that gate `i`
+  writes wire `n_inputs + i`
+- gates stored as parallel columns, in topological order: `in0`, `in1`,
+  `out` (wire numbers) and `table`, the truth table as 4 bits, bit `2*a + b`
+  being the output for inputs `a`, `b`
+
+The columns are `array`s when a circuit is compiled, and `memoryview`s over
+an `mmap` of the cache file when it is loaded from the cache: `load()` keys
+the cache on the sha256 of the JSON file, so only the first load of a
+circuit parses and sorts it. The wire and gate names are only decoded when
+they are used. `load()` also reads Bristol Fashion files (see bristol.py),
+and `Builder` makes circuits gate by gate.
+
+    cc = compiled.load('example_circuits/32adder.json')
+    cc.evaluate(inputs)                      # same as BooleanCircuit.evaluate
+    BooleanCircuit(from_json=obj, compiled=cc)   # skips the sort
+
+The cache is in `$CIRCUIT_CACHE`, or `~/.cache/mp2-circuits`. A cache
+file of another version, or whose size does not match its header (cut
+short, say), is compiled again.
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+from array import array
+
+from circuit import SLICED, pack_bits, unpack_bits
+
+MAGIC = b'MP2C'
+VERSION = 3
+HEADER = struct.Struct('<4sIIIIII')  # magic, version, n_inputs, n_gates, n_outputs, meta length, names length
+
+def cache_dir():
+    return os.environ.get('CIRCUIT_CACHE', os.path.join(os.path.expanduser('~'), '.cache', 'mp2-circuits'))
+
+def table_bits(table):
+    # [t00, t01, t10, t11] => 4-bit int
+    return sum(v << i for i, v in enumerate(table))
+
+def bits_table(bits):
+    return [(bits >> i) & 1 for i in range(4)]
+
+AND, XOR, OR = table_bits([0,0,0,1]), table_bits([0,1,1,0]), table_bits([0,1,1,1])
+INV, EQW = table_bits([1,1,0,0]), table_bits([0,0,1,1])   # of the first input
+
+# Names of the tables, for reports; "nonlinear" tables need an AND (or a
+# garbled table) however they are written, the others are XORs of inputs
+TABLE_NAMES = {AND: 'AND', XOR: 'XOR', OR: 'OR', 7: 'NAND', 1: 'NOR', 9: 'XNOR',
+               INV: 'INV', EQW: 'EQW', 5: 'INV', 10: 'EQW', 0: 'ZERO', 15: 'ONE'}
+
+def table_name(t):
+    return TABLE_NAMES.get(t, 'T' + ''.join(map(str, bits_table(t))))
+
+def nonlinear(t):
+    t00, t01, t10, t11 = bits_table(t)
+    return t00 ^ t01 ^ t10 ^ t11 == 1
+
+
+class CompiledCircuit(object):
+    def __init__(self, n_inputs, in0, in1, out, table, outputs, names=None,
+                 input_sizes=None, output_sizes=None, _names_blob=None, _mm=None):
+        assert len(in0) == len(in1) == len(out) == len(table)
+        self.n_inputs = n_inputs
+        self.n_gates = len(table)
+        self.n_wires = n_inputs + self.n_gates
+        self.in0, self.in1, self.out, self.table = in0, in1, out, table
+        self.outputs = outputs          # wire numbers of the output wires
+        # How the inputs and outputs split into values (Bristol Fashion), or None
+        self.input_sizes = input_sizes
+        self.output_sizes = output_sizes
+        self._names = names             # {"wires": [...], "gates": [...]}, or None
+        self._names_blob = _names_blob
+        self._mm = _mm                  # the mmap the columns are views of
+
+    @property
+    def names(self):
+        # Circuits built without names (from Bristol files, say) get
+        # "w<number>" and "g<number>", made on first use
+        if self._names is None:
+            if self._names_blob:
+                self._names = json.loads(bytes(self._names_blob).decode())
+            else:
+                self._names = {"wires": ['w%d' % w for w in range(self.n_wires)],
+                               "gates": ['g%d' % i for i in range(self.n_gates)]}
+            self._names_blob = None
+        return self._names
+
+    def has_names(self):
+        return self._names is not None or bool(self._names_blob)
+
+    @property
+    def wire_names(self):
+        return self.names["wires"]
+
+    @property
+    def gate_ids(self):
+        return self.names["gates"]
+
+    @property
+    def wire_index(self):
+        # name => wire number
+        if not hasattr(self, '_wire_index'):
+            self._wire_index = dict((name, w) for w, name in enumerate(self.wire_names))
+        return self._wire_index
+
+    def input_names(self):
+        return self.wire_names[:self.n_inputs]
+
+    def output_names(self):
+        names = self.wire_names
+        return [names[w] for w in self.outputs]
+
+    def evaluate(self, inp):
+        # Same as BooleanCircuit.evaluate: inp maps input wire names to bits
+        assert len(inp) == self.n_inputs
+        index = self.wire_index
+        values = bytearray(self.n_wires)
+        for wid, v in inp.items():
+            assert v in (0, 1)
+            w = index[wid]
+            assert w < self.n_inputs, "not an input wire: %r" % wid
+            values[w] = v
+        for a, b, o, t in zip(self.in0, self.in1, self.out, self.table):
+            values[o] = (t >> (2*values[a] + values[b])) & 1
+        names = self.wire_names
+        return dict((names[w], values[w]) for w in self.outputs)
+
+    def evaluate_bits(self, bits):
+        # bits: the input bits in wire order => the output bits in order
+        assert len(bits) == self.n_inputs
+        values = bytearray(self.n_wires)
+        values[:self.n_inputs] = bytes(bits)
+        for a, b, o, t in zip(self.in0, self.in1, self.out, self.table):
+            values[o] = (t >> (2*values[a] + values[b])) & 1
+        return [values[w] for w in self.outputs]
+
+    def to_json(self):
+        # The JSON circuit format of example_circuits/, for BooleanCircuit
+        names, gids = self.wire_names, self.gate_ids
+        gates = {}
+        for i, (a, b, o, t) in enumerate(zip(self.in0, self.in1, self.out, self.table)):
+            gates[gids[i]] = {"inp": [names[a], names[b]], "out": [names[o]], "table": bits_table(t)}
+        return {"gates": gates}
+
+    def levelize(self):
+        # => layers, a list of array('I') of gate numbers: layer i holds the
+        # gates at depth i+1, which only depend on earlier layers
+        n_in = self.n_inputs
+        depth = array('I', bytes(4 * self.n_wires))
+        layers = []
+        for i, (a, b) in enumerate(zip(self.in0, self.in1)):
+            d = 1 + max(depth[a], depth[b])
+            depth[n_in + i] = d
+            if d > len(layers): layers.append(array('I'))
+            layers[d-1].append(i)
+        return layers
+
+    def peak_live(self, order=None):
+        # The most wires alive at once, evaluating the gates in order (gate
+        # numbers, topological by default) and dropping each wire after the
+        # last gate that reads it: an input lives from the start, the output
+        # of a gate from that gate, and the outputs of the circuit to the end
+        order = range(self.n_gates) if order is None else order
+        n_in = self.n_inputs
+        last = array('I', bytes(4 * self.n_wires))  # position + 1 of the last use
+        n = 0
+        for pos, i in enumerate(order):
+            last[n_in + i] = pos + 1
+            last[self.in0[i]] = pos + 1
+            last[self.in1[i]] = pos + 1
+            n += 1
+        for w in self.outputs: last[w] = n + 1
+        drops = _bincount(last, n + 2)
+        live = peak = n_in - drops[0]
+        for pos in range(1, n + 1):
+            live += 1
+            if live > peak: peak = live
+            live -= drops[pos]
+        return peak
+
+    def stats(self, layers=None):
+        # Depth and widths of the layers, gate counts by table, fan-out, and
+        # the peak live wires, in topological order and layer by layer
+        if layers is None: layers = self.levelize()
+        widths = [len(layer) for layer in layers]
+        by_table = _bincount(self.table, 16)
+        counts = {}
+        for t, n in enumerate(by_table):
+            if n: counts[table_name(t)] = counts.get(table_name(t), 0) + n
+        fanout = array('I', bytes(4 * self.n_wires))
+        for a, b in zip(self.in0, self.in1):
+            fanout[a] += 1
+            if b != a: fanout[b] += 1
+        hist = {}
+        for f in fanout: hist[f] = hist.get(f, 0) + 1
+        return {
+            'gates': self.n_gates,
+            'inputs': self.n_inputs,
+            'outputs': len(self.outputs),
+            'depth': len(layers),
+            'max_width': max(widths) if widths else 0,
+            'mean_width': self.n_gates / len(layers) if layers else 0,
+            'widths': widths,
+            'counts': counts,
+            'AND': counts.get('AND', 0),
+            'XOR': counts.get('XOR', 0),
+            'nonlinear': sum(n for t, n in enumerate(by_table) if nonlinear(t)),
+            'max_fanout': max(fanout) if self.n_wires else 0,
+            'mean_fanout': sum(fanout) / self.n_wires if self.n_wires else 0,
+            'fanout_histogram': dict(sorted(hist.items())),
+            'peak_live': self.peak_live(),
+            'peak_live_layered': self.peak_live(i for layer in layers for i in layer),
+        }
+
+    def evaluate_words(self, words, mask):
+        # Bit-sliced: words holds an int per input wire with one bit per
+        # evaluation, mask a 1 for each evaluation => an int per output wire
+        assert len(words) == self.n_inputs
+        values = list(words) + [0] * self.n_gates
+        for a, b, o, t in zip(self.in0, self.in1, self.out, self.table):
+            values[o] = SLICED[t](values[a], values[b], mask)
+        return [values[w] for w in self.outputs]
+
+    def evaluate_bits_batch(self, batch):
+        # evaluate_bits on each of a list of input bit lists, bit-sliced
+        n = len(batch)
+        assert all(len(bits) == self.n_inputs for bits in batch)
+        words = pack_bits(zip(*batch)) if n else [0] * self.n_inputs
+        columns = unpack_bits(self.evaluate_words(words, (1 << n) - 1), n)
+        return [list(bits) for bits in zip(*columns)] if columns else [[] for _ in range(n)]
+
+    def evaluate_batch(self, inputs):
+        # evaluate on each of a list of inputs, bit-sliced
+        names = self.input_names()
+        outs = self.output_names()
+        results = self.evaluate_bits_batch([[inp[wid] for wid in names] for inp in inputs])
+        return [dict(zip(outs, bits)) for bits in results]
+
+    def truth_table(self):
+        # The outputs on all 2^n_inputs inputs, at once: an int per output
+        # wire, whose bit k is its value when input wire i is bit i of k
+        n = self.n_inputs
+        assert n <= 24, "too many inputs for a truth table"
+        size = 1 << n
+        words = []
+        for i in range(n):
+            # bit k is bit i of k: 2^i zeros, 2^i ones, repeated
+            w, length = ((1 << (1 << i)) - 1) << (1 << i), 2 << i
+            while length < size:
+                w |= w << length
+                length *= 2
+            words.append(w)
+        return self.evaluate_words(words, (1 << size) - 1)
+
+    # The cache file: the header, then the columns in0, in1, out, outputs
+    # (uint32), table (uint8) padded to 4 bytes, then the input and output
+    # sizes as JSON, then the names as JSON (empty if the circuit has none)
+    def to_bytes(self):
+        meta = json.dumps([self.input_sizes, self.output_sizes]).encode()
+        names = json.dumps(self.names, separators=(',', ':')).encode() if self.has_names() else b''
+        parts = [HEADER.pack(MAGIC, VERSION, self.n_inputs, self.n_gates, len(self.outputs), len(meta), len(names))]
+        for col in (self.in0, self.in1, self.out, self.outputs):
+            parts.append(_le(array('I', col)).tobytes())
+        tab = bytes(self.table)
+        parts.append(tab + b'\0' * (-len(tab) % 4))
+        parts.append(meta)
+        parts.append(names)
+        return b''.join(parts)
+
+    def save(self, filename):
+        tmp = '%s.%d.tmp' % (filename, os.getpid())
+        with open(tmp, 'wb') as f:
+            f.write(self.to_bytes())
+        os.replace(tmp, filename)
+
+    @classmethod
+    def open(cls, filename):
+        # Raises ValueError if filename is not a whole compiled circuit of this version
+        with open(filename, 'rb') as f:
+            if os.fstat(f.fileno()).st_size < HEADER.size: raise ValueError("not a compiled circuit: %s" % filename)
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, n_inputs, n_gates, n_outputs, n_meta, n_names = HEADER.unpack_from(mm, 0)
+        if magic != MAGIC: raise ValueError("not a compiled circuit: %s" % filename)
+        if version != VERSION: raise ValueError("compiled circuit version %d, expected %d" % (version, VERSION))
+        size = HEADER.size + 4 * (3*n_gates + n_outputs) + n_gates + (-n_gates % 4) + n_meta + n_names
+        if len(mm) != size:
+            raise ValueError("compiled circuit of %d bytes, its header says %d: %s" % (len(mm), size, filename))
+        assert sys.byteorder == 'little' and array('I').itemsize == 4, "cache is little-endian uint32"
+        view = memoryview(mm)
+        pos = HEADER.size
+        cols = []
+        for n in (n_gates, n_gates, n_gates, n_outputs):
+            cols.append(view[pos:pos + 4*n].cast('I'))
+            pos += 4*n
+        table = view[pos:pos + n_gates]
+        pos += n_gates + (-n_gates % 4)
+        input_sizes, output_sizes = json.loads(bytes(view[pos:pos + n_meta]).decode())
+        pos += n_meta
+        in0, in1, out, outputs = cols
+        return cls(n_inputs, in0, in1, out, table, outputs, input_sizes=input_sizes,
+                   output_sizes=output_sizes, _names_blob=view[pos:], _mm=mm)
+
+def _bincount(values, n):
+    counts = [0] * n
+    for v in values: counts[v] += 1
+    return counts
+
+def _le(a):
+    if sys.byteorder != 'little': a.byteswap()
+    return a
+
+
+"""
+## Compiling
+"""
+def compile_circuit(c):
+    # c: a BooleanCircuit, already sorted
+    inputs = sorted(c.input_wires)
+    wire_names = list(inputs)
+    index = dict((wid, w) for w, wid in enumerate(inputs))
+    in0, in1, out, table = array('I'), array('I'), array('I'), array('B')
+    for gid in c.sorted_gates:
+        gate = c.gates[gid]
+        a, b = gate["inp"]
+        o = gate["out"][0]
+        index[o] = len(wire_names)
+        wire_names.append(o)
+        in0.append(index[a])
+        in1.append(index[b])
+        out.append(index[o])
+        table.append(table_bits(gate["table"]))
+    outputs = array('I', sorted(index[wid] for wid in c.output_wires))
+    names = {"wires": wire_names, "gates": list(c.sorted_gates)}
+    return CompiledCircuit(len(inputs), in0, in1, out, table, outputs, names=names)
+
+class Builder(object):
+    # Builds a CompiledCircuit gate by gate: add() returns the new wire
+    def __init__(self, n_inputs, input_sizes=None):
+        self.n_inputs = n_inputs
+        self.input_sizes = input_sizes
+        self.in0, self.in1, self.out, self.table = array('I'), array('I'), array('I'), array('B')
+
+    def add(self, a, b, table):
+        w = self.n_inputs + len(self.table)
+        assert a < w and b < w
+        self.in0.append(a)
+        self.in1.append(b)
+        self.out.append(w)
+        self.table.append(table)
+        return w
+
+    def AND(self, a, b): return self.add(a, b, AND)
+    def XOR(self, a, b): return self.add(a, b, XOR)
+    def OR(self, a, b): return self.add(a, b, OR)
+    def INV(self, a): return self.add(a, a, INV)
+
+    def build(self, outputs, output_sizes=None):
+        return CompiledCircuit(self.n_inputs, self.in0, self.in1, self.out, self.table,
+                               array('I', outputs), input_sizes=self.input_sizes,
+                               output_sizes=output_sizes)
+
+def from_json(obj):
+    from circuit import BooleanCircuit
+    return compile_circuit(BooleanCircuit(from_json=obj))
+
+def _read_json(filename):
+    with open(filename) as f:
+        return from_json(json.load(f))
+
+def cache_path(digest):
+    return os.path.join(cache_dir(), 'v%d-%s.bin' % (VERSION, digest))
+
+def file_digest(filename):
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def load(filename, cache=True):
+    # Loads a circuit file, JSON or Bristol Fashion, through the cache
+    with open(filename, 'rb') as f:
+        is_json = f.read(64).lstrip().startswith(b'{')
+    if is_json:
+        parse = _read_json
+    else:
+        import bristol
+        parse = bristol.read
+    path = cache_path(file_digest(filename))
+    if cache and os.path.exists(path):
+        try:
+            return CompiledCircuit.open(path)
+        except ValueError:
+            pass    # cut short or stale: compiled again, below
+    cc = parse(filename)
+    if cache:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        cc.save(path)
+    return cc
+
+
+"""
+## Tests
+"""
+def compiled_test(filename, rounds=100):
+    import random
+    import tempfile
+    from circuit import BooleanCircuit
+    obj = json.load(open(filename))
+    plain = BooleanCircuit(from_json=obj)
+    cc = from_json(obj)
+    assert cc.n_inputs == len(plain.input_wires) and cc.n_gates == len(plain.gates)
+    assert set(cc.output_names()) == plain.output_wires
+    assert list(cc.out) == list(range(cc.n_inputs, cc.n_wires))
+
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'c.bin')
+        cc.save(path)
+        loaded = CompiledCircuit.open(path)
+        for col in ('in0', 'in1', 'out', 'table', 'outputs'):
+            assert list(getattr(loaded, col)) == list(getattr(cc, col))
+        assert loaded.names == cc.names
+
+        # A cache file cut short, or of another version, is compiled again
+        os.environ['CIRCUIT_CACHE'], cache = d, os.environ.get('CIRCUIT_CACHE')
+        try:
+            cached = cache_path(file_digest(filename))
+            load(filename)
+            data = open(cached, 'rb').read()
+            for bad in (data[:-1], data[:HEADER.size - 1], b'', data[:4] + struct.pack('<I', 2) + data[8:]):
+                with open(cached, 'wb') as f:
+                    f.write(bad)
+                try:
+                    CompiledCircuit.open(cached)
+                    assert False, "a bad cache file opened"
+                except ValueError:
+                    pass
+                assert list(load(filename).table) == list(cc.table)
+                assert open(cached, 'rb').read() == data
+        finally:
+            if cache is None: del os.environ['CIRCUIT_CACHE']
+            else: os.environ['CIRCUIT_CACHE'] = cache
+
+        # BooleanCircuit can take its order from a compiled circuit
+        again = BooleanCircuit(from_json=obj, compiled=loaded)
+        assert again.sorted_gates == plain.sorted_gates
+        # but not from that of another circuit, of as many gates
+        other = json.loads(json.dumps(obj))
+        gate = other["gates"][cc.gate_ids[0]]
+        gate.pop("type", None)
+        gate["table"] = [1 - v for v in plain.gates[cc.gate_ids[0]]["table"]]
+        try:
+            BooleanCircuit(from_json=other, compiled=loaded)
+            assert False, "the order of another circuit was used"
+        except ValueError:
+            pass
+
+        batch = [dict((wid, random.randint(0, 1)) for wid in plain.input_wires) for _ in range(rounds)]
+        expected = [plain.evaluate(inputs) for inputs in batch]
+        for inputs, outputs in zip(batch, expected):
+            assert cc.evaluate(inputs) == outputs
+            assert loaded.evaluate(inputs) == outputs
+            assert again.evaluate(inputs) == outputs
+
+        # Layers: the same in both forms, and a valid schedule
+        layers = plain.levelize()
+        gids = cc.gate_ids
+        assert [[gids[i] for i in layer] for layer in cc.levelize()] == layers
+        assert sorted(plain.schedule(layers)) == sorted(plain.sorted_gates)
+        for inputs, outputs in zip(batch[:10], expected):
+            assert plain.evaluate(inputs, layers=layers) == outputs
+        st = cc.stats()
+        assert st['depth'] == len(layers) and sum(st['widths']) == cc.n_gates
+        assert sum(st['counts'].values()) == cc.n_gates
+
+        # Liveness: the dict evaluators hold as many values at most
+        again.evaluate(batch[0])
+        assert again.peak_live == st['peak_live'] and set(again.wire_values) == plain.output_wires
+        again.evaluate(batch[0], layers=again.levelize())
+        assert again.peak_live == st['peak_live_layered']
+        again.evaluate(batch[0], keep=True)
+        assert len(again.wire_values) == len(again.wires)
+
+        # Bit-sliced, all at once
+        assert plain.evaluate_batch(batch) == expected
+        assert loaded.evaluate_batch(batch) == expected
+        assert plain.evaluate_batch([]) == loaded.evaluate_batch([]) == []
+        if cc.n_inputs <= 16:
+            tt = cc.truth_table()
+            for k in range(1 << cc.n_inputs):
+                bits = [(k >> i) & 1 for i in range(cc.n_inputs)]
+                assert [(w >> k) & 1 for w in tt] == cc.evaluate_bits(bits)
+    print("Compiled circuit test complete: %s" % filename)
+
+if __name__ == '__main__':
+    import time
+    if len(sys.argv) < 2:
+        print("usage: python compiled.py <circuit.json> ...")
+        sys.exit(1)
+    for filename in sys.argv[1:]:
+        compiled_test(filename)
+        t0 = time.perf_counter()
+        from circuit import BooleanCircuit
+        BooleanCircuit(from_json=json.load(open(filename)))
+        t1 = time.perf_counter()
+        load(filename)
+        t2 = time.perf_counter()
+        load(filename)
+        t3 = time.perf_counter()
+        print('  BooleanCircuit %.2f ms, first load %.2f ms, cached load %.2f ms'
+              % ((t1 - t0) * 1e3, (t2 - t1) * 1e3, (t3 - t2) * 1e3))
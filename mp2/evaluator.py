@@ -12,23 +12,52 @@ import codecs
 decode_hex = codecs.getdecoder("hex_codec")
 
 class GarbledCircuitEvaluator(BooleanCircuit):
-    def __init__(self, from_json=None):
+    def __init__(self, from_json=None, compiled=None):
         # The superclass constructor initializes the gates and topological sorting
-        super(GarbledCircuitEvaluator,self).__init__(from_json=from_json)
+        super(GarbledCircuitEvaluator,self).__init__(from_json=from_json, compiled=compiled)
 
         # What remains is for us to load the garbling tables
         if from_json is not None:
             
             # Load the garbled tables
             gates = from_json["gates"]
+            self.mode = from_json.get("mode", "classic")
+            self.hash = from_json.get("hash", "sha256")
+            self.garble_table = {}
+            for gid in self.gates:
+                # (none in a plain circuit, whose tables are streamed, see stream.py)
+                if "garble_table" in gates[gid]:
+                    self.garble_table[gid] = [bytes.fromhex(row) for row in gates[gid]["garble_table"]]
 
-            # TODO: your code goes here
-
-    def garbled_evaluate(self, inp):
+    def garbled_evaluate(self, inp, layers=None, keep=False):
         # Precondition: initialized, topologically sorted
         #               has garbled tables
         #               inp is a mapping of wire labels for each input wire
-        # Postcondition: self.wire_labels takes on labels resulting from this evaluation
+        #               layers, if given, is a layered schedule (see levelize)
+        # Postcondition: self.wire_labels takes on labels resulting from this evaluation,
+        #   of the output wires only (each other wire is dropped after its
+        #   last use, see liveness) unless keep, and self.peak_live is the
+        #   most labels held at once
+        labels = self.begin(inp)
+
+        # Evaluate the gates a layer at a time
+        if layers is None:
+            layers = self.layers if hasattr(self, 'layers') else self.levelize()
+        dead = None if keep else self.liveness(layers)
+        pos = 0
+        for layer in layers:
+            self.evaluate_gates(layer, [self.garble_table[gid] for gid in layer], labels)
+            if dead is not None:
+                self.drop(labels, dead[pos:pos + len(layer)])
+            pos += len(layer)
+        return self.finish(labels)
+
+    # The evaluation in steps, for tables that arrive a chunk at a time
+    # (see stream.py): begin, then evaluate_gates on each chunk of
+    # independent gates, in order, and drop what they read last, then finish.
+    def begin(self, inp):
+        # inp: the hex label of each input wire => the labels to evaluate
+        # with, bytes in classic mode and ints in the Free-XOR modes
         assert len(inp) == len(self.input_wires)
         self.wire_labels = {}
 
@@ -38,11 +67,97 @@ class GarbledCircuitEvaluator(BooleanCircuit):
             label = inp[wid]
             assert len(label) == 2 * 16  # Labels are keys, 16 bytes in hex
             self.wire_labels[wid] = label
+        self.peak_live = len(self.wire_labels)
+
+        if self.mode in ('freexor', 'halfgates'):
+            self.H = util.garbling_hash(self.hash)
+            if not hasattr(self, 'tweaks'):
+                self.tweaks = dict((gid, util.label_tweak(gid)) for gid in self.gates)
+            return dict((wid, int(L, 16)) for wid, L in self.wire_labels.items())
+        return dict((wid, bytes.fromhex(L)) for wid, L in self.wire_labels.items())
 
-        # TODO: Your code goes here
+    def evaluate_gates(self, gids, tables, labels):
+        # Evaluates gates gids, which are independent, with their tables
+        # (lists of rows of bytes), adding their output labels to labels
+        if self.mode in ('freexor', 'halfgates'):
+            self._evaluate_freexor(gids, tables, labels)
+        else:
+            self._evaluate_classic(gids, tables, labels)
 
+    def drop(self, labels, dead):
+        # Drops the labels of the wires of dead (lists from liveness), after
+        # counting the labels held
+        self.peak_live = max(self.peak_live, len(labels))
+        for wids in dead:
+            for wid in wids:
+                del labels[wid]
+
+    def finish(self, labels):
+        # => the labels of the output wires, in hex
+        self.peak_live = max(self.peak_live, len(labels))
+        if self.mode in ('freexor', 'halfgates'):
+            self.wire_labels = dict((wid, '%032x' % L) for wid, L in labels.items())
+        else:
+            self.wire_labels = dict((wid, L.hex()) for wid, L in labels.items())
         return dict((wid,self.wire_labels[wid]) for wid in self.output_wires)
 
+    def _evaluate_classic(self, gids, tables, labels):
+        # Try each row: only the right one decrypts (twice) with valid
+        # padding. The rows are decrypted in two batches (see
+        # util.specialDecryptions), all of them under the A labels, then
+        # the ones that decrypted under the B labels.
+        outer = [(labels[self.gates[gid]["inp"][0]], row)
+                 for gid, rows in zip(gids, tables) for row in rows]
+        inners = iter(util.specialDecryptions(outer))
+        inner, owner = [], []
+        for gid, rows in zip(gids, tables):
+            kB = labels[self.gates[gid]["inp"][1]]
+            for row in rows:
+                c = next(inners)
+                if c is not None:
+                    inner.append((kB, c))
+                    owner.append(gid)
+        for gid, kOut in zip(owner, util.specialDecryptions(inner)):
+            if kOut is not None:
+                labels[self.gates[gid]["out"][0]] = kOut
+        for gid in gids:
+            if self.gates[gid]["out"][0] not in labels:
+                raise ValueError("no row of gate %s decrypts" % gid)
+
+    def _evaluate_freexor(self, gids, tables, labels):
+        # See generator.py: linear gates XOR their input labels, constant
+        # gates have the label of their value in their one row, the others
+        # decrypt the one row picked by the select bits, or (half-gates)
+        # combine both rows according to the select bits. The hashes of
+        # the gates are computed in one batch.
+        H = self.H
+        nonlinear = []
+        for gid, rows in zip(gids, tables):
+            gate = self.gates[gid]
+            a, b = gate["inp"]
+            A, B = labels[a], labels[b]
+            t = gate["table"]
+            if t[0] == t[1] == t[2] == t[3]:
+                labels[gate["out"][0]] = int.from_bytes(rows[0], 'big')
+            elif not rows:
+                labels[gate["out"][0]] = (A if t[0]^t[2] else 0) ^ (B if t[0]^t[1] else 0)
+            else:
+                nonlinear.append((gid, gate, A, B, rows))
+        if self.mode == 'halfgates':
+            hs = H.hash1([L for _, _, A, B, _ in nonlinear for L in (A, B)],
+                         [T for gid, _, _, _, _ in nonlinear for T in (self.tweaks[gid], self.tweaks[gid] + 1)])
+            for i, (gid, gate, A, B, rows) in enumerate(nonlinear):
+                TG, TE = [int.from_bytes(row, 'big') for row in rows]
+                WG = hs[2*i] ^ (TG if A & 1 else 0)
+                WE = hs[2*i+1] ^ ((TE ^ A) if B & 1 else 0)
+                labels[gate["out"][0]] = WG ^ WE
+        else:
+            hs = H.hash2([A for _, _, A, _, _ in nonlinear], [B for _, _, _, B, _ in nonlinear],
+                         [self.tweaks[gid] for gid, _, _, _, _ in nonlinear])
+            for h, (gid, gate, A, B, rows) in zip(hs, nonlinear):
+                s = 2*(A & 1) + (B & 1)
+                labels[gate["out"][0]] = h if s == 0 else h ^ int.from_bytes(rows[s-1], 'big')
+
         
 if __name__ == '__main__':
     import sys
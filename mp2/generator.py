@@ -5,6 +5,7 @@
 import circuit
 from circuit import BooleanCircuit
 import json
+import util
 from util import specialDecryption, specialEncryption, generate_key
 import os
 import random
@@ -21,32 +22,271 @@ Hint: use knuth-fischer-yates shuffling
 """
 def shuffle(a):
     assert type(a) is list
-    # TODO: sort a in place, and return None
+    # Fisher-Yates: swap each position with a uniformly random one at or
+    # before it (with 8 random bytes, the bias is below 2^-60)
+    for i in range(len(a) - 1, 0, -1):
+        j = int.from_bytes(util.random_bytes(8), 'big') % (i + 1)
+        a[i], a[j] = a[j], a[i]
 
 """
 ## Problem 2: Garbled Circuit Generator (15 points)
 """
 
+def split(gids, chunk=None):
+    # gids in lists of up to chunk gates (one list, if chunk is None)
+    n = chunk or max(1, len(gids))
+    return [gids[i:i+n] for i in range(0, len(gids), n)]
+
+MODES = ('classic', 'freexor', 'halfgates')
+
 class GarbledCircuitGenerator(BooleanCircuit):
-    def __init__(self, from_json=None):
+    def __init__(self, from_json=None, compiled=None):
         # The superclass constructor initializes the gates and topological sorting
-        super(GarbledCircuitGenerator,self).__init__(from_json=from_json)
+        super(GarbledCircuitGenerator,self).__init__(from_json=from_json, compiled=compiled)
+
+    def garble(self, mode='classic', hash='aes', seed=None):
+        # mode is one of MODES: 'classic', the four encrypted rows of the
+        # assignment, 'freexor', Free-XOR with point-and-permute, or
+        # 'halfgates', Free-XOR with two-row half-gates. hash is the hash of
+        # the Free-XOR modes, one of util.HASHES: fixed-key 'aes' or 'sha256'.
+        # With a seed (16 bytes), the labels are derived from it (see
+        # util.LabelSeed), and self.wire_labels keeps those of the input and
+        # output wires only.
+        self.garble_table = {}
+        for gids, tables in self.garble_chunks(mode, hash, seed=seed):
+            for gid, rows in zip(gids, tables):
+                self.garble_table[gid] = [row.hex() for row in rows]
+
+    def garble_chunks(self, mode='classic', hash='aes', chunk=None, seed=None):
+        # Garbles the circuit a layer at a time (see levelize), and each
+        # layer in chunks of up to `chunk` gates (all of it, if None).
+        # => an iterator of (gate ids, their tables, a list of rows of bytes
+        #    per gate), in the order of self.schedule(self.layers); the
+        #    gates of a chunk are independent. Before the first chunk,
+        #    self.wire_labels holds the labels of the input wires, and
+        #    after the last one the labels of all wires (of the input and
+        #    output wires, with a seed).
+        assert mode in MODES, "unknown garbling mode %r" % mode
+        self.mode = mode
+        self.hash = hash if mode != 'classic' else None
+        if not hasattr(self, 'layers'): self.levelize()
+        chunks = (split(layer, chunk) for layer in self.layers)
+        if seed is not None:
+            return self._garble_seeded(chunks, util.LabelSeed(seed))
+        if mode in ('freexor', 'halfgates'):
+            R = int.from_bytes(generate_key(), 'big') | 1
+            labels = {}
+            for wid in self.input_wires:
+                labels[wid] = int.from_bytes(generate_key(), 'big')
+            self.wire_labels = dict((wid, ['%032x' % L, '%032x' % (L ^ R)]) for wid, L in labels.items())
+            if not hasattr(self, 'tweaks'):
+                self.tweaks = dict((gid, util.label_tweak(gid)) for gid in self.gates)
+            return self._garble_freexor(chunks, labels, R)
 
-    def garble(self):
-        
         # Generate new wire labels
-        self.wire_labels = {} # maps wire id to {"0":label0 ,"1": label1}
+        self.wire_labels = {} # maps wire id to [label0, label1], in hex
+        for wid in self.wires:
+            self.wire_labels[wid] = [generate_key().hex(), generate_key().hex()]
+        labels = dict((wid, [bytes.fromhex(L) for L in Ls]) for wid, Ls in self.wire_labels.items())
+        return ((gids, self.garble_gates(gids, labels)) for layer in chunks for gids in layer)
 
-        # TODO: your code goes here
+    def _garble_seeded(self, chunks, seed):
+        # Labels from the seed, on demand, by wire number. In classic mode
+        # every label comes from the seed, for the wires of each chunk. In
+        # the Free-XOR modes the input labels and R do, and the other labels
+        # are kept from the gate that outputs them to the last gate that
+        # reads them (or to the end, for output wires, see liveness).
+        index = self.wire_index()
+        hex_pairs = lambda labels, R: dict((wid, ['%032x' % L, '%032x' % (L ^ R)]) for wid, L in labels.items())
+        inputs = sorted(self.input_wires)
+        self.peak_live = 0
+        if self.mode == 'classic':
+            def pairs(wires):
+                ns = [index[wid] for wid in wires]
+                return dict((wid, [L0.to_bytes(16, 'big'), L1.to_bytes(16, 'big')])
+                            for wid, L0, L1 in zip(wires, seed.labels(ns), seed.labels(ns, 1)))
+            self.wire_labels = dict((wid, [L.hex() for L in Ls]) for wid, Ls in pairs(inputs).items())
+            def garble():
+                for layer in chunks:
+                    for gids in layer:
+                        wires = list(set(w for gid in gids for w in self.gates[gid]["inp"] + self.gates[gid]["out"]))
+                        labels = pairs(wires)
+                        self.peak_live = max(self.peak_live, len(labels))
+                        yield gids, self.garble_gates(gids, labels)
+                outputs = sorted(self.output_wires)
+                self.wire_labels.update((wid, [L.hex() for L in Ls]) for wid, Ls in pairs(outputs).items())
+            return garble()
 
-        # Generate garble tables
-        self.garble_table = {}
+        R = seed.offset()
+        labels = dict(zip(inputs, seed.labels([index[wid] for wid in inputs])))
+        self.wire_labels = hex_pairs(labels, R)
+        if not hasattr(self, 'tweaks'):
+            self.tweaks = dict((gid, util.label_tweak(gid)) for gid in self.gates)
+        dead = self.liveness(self.layers)
+        fresh = lambda wid: seed.labels([index[wid]])[0]
+        def garble():
+            pos = 0
+            for layer in chunks:
+                for gids in layer:
+                    tables = self._garble_freexor_gates(gids, labels, R, fresh)
+                    self.peak_live = max(self.peak_live, len(labels))
+                    for wids in dead[pos:pos + len(gids)]:
+                        for wid in wids:
+                            del labels[wid]
+                    pos += len(gids)
+                    yield gids, tables
+            self.wire_labels.update(hex_pairs(dict((wid, labels[wid]) for wid in self.output_wires), R))
+        return garble()
+
+    def garble_gates(self, gids, labels, R=None):
+        # Garbles gates gids, which are independent, in the mode of the last
+        # garble_chunks. labels: both labels of each wire, as bytes, in
+        # classic mode; in the Free-XOR modes, the 0-label of each wire, an
+        # int, to which the output labels are added, and R is the offset.
+        # => their tables, a list of rows of bytes per gate
+        if self.mode in ('freexor', 'halfgates'):
+            return self._garble_freexor_gates(gids, labels, R)
+
+        # Garble tables: row (va, vb) encrypts the label of the output value
+        # under the labels of va and vb, and the rows are shuffled. The rows
+        # are encrypted in two batches (see util.specialEncryptions), the
+        # inner encryptions under the B labels, then the outer ones.
+        outer, inner = [], []
+        for gid in gids:
+            gate = self.gates[gid]
+            labelsA = labels[gate["inp"][0]]
+            labelsB = labels[gate["inp"][1]]
+            labelsOut = labels[gate["out"][0]]
+            for va in (0,1):
+                for vb in (0,1):
+                    outer.append(labelsA[va])
+                    inner.append((labelsB[vb], labelsOut[gate["table"][2*va + vb]]))
+        rows = util.specialEncryptions(list(zip(outer, util.specialEncryptions(inner))))
+        tables = [rows[4*i:4*i+4] for i in range(len(gids))]
+        for gate_rows in tables:
+            shuffle(gate_rows)
+        return tables
+
+    # Free-XOR and point-and-permute:
+    #
+    # Labels are 128-bit ints. The two labels of every wire differ by one
+    # global offset R, whose last bit is 1, so the last bit of a label (its
+    # select bit) is the value of the wire masked by a random bit.
+    #
+    # - Linear gates (XOR, XNOR, NOT, ...) need no table: the output label is
+    #   the XOR of the input labels it depends on (plus R for an inverted
+    #   output, on the 0-label side, which the evaluator never sees).
+    # - A constant gate depends on neither input, and that XOR would give
+    #   its wire the labels 0 and R, one of which the evaluator would hold.
+    #   Its wire gets a fresh random 0-label instead, and its table is one
+    #   row: the label of its value, in the clear.
+    # - Other gates get rows indexed by the select bits of the inputs, each
+    #   `H(A, B, T) XOR out-label`, so the evaluator decrypts exactly one.
+    #   The output labels are chosen to make the row with select bits (0,0)
+    #   all zeros, so it is left out (row reduction) and 3 rows of 16 bytes
+    #   remain, against 4 of 80 in classic mode.
+    #
+    # Half-gates (Zahur, Rosulek and Evans, 2015) garble an AND gate in two
+    # rows: a generator half-gate, for when the generator knows one input,
+    # and an evaluator half-gate, for when the evaluator does (it knows the
+    # select bit of b), XORed together. Every other nonlinear table is
+    #     f(a, b) = ((a ^ c2) AND (b ^ c1)) ^ (c0 ^ c1 c2)
+    # from its algebraic normal form, an AND with inverted inputs or output,
+    # and inversions are free: they swap the labels of a wire, which only
+    # the generator sees. The evaluator does not need to know the table.
+    #
+    # The gates are garbled a chunk of a layer at a time (see garble_chunks),
+    # so that all the hashes of a chunk are computed in one batch.
+    def _garble_freexor(self, chunks, labels, R):
+        # labels: the 0-labels of the wires, as ints, R: the global offset
+        for layer in chunks:
+            for gids in layer:
+                yield gids, self._garble_freexor_gates(gids, labels, R)
+        self.wire_labels = dict((wid, ['%032x' % L, '%032x' % (L ^ R)]) for wid, L in labels.items())
+
+    def _garble_freexor_gates(self, gids, labels, R, fresh=None):
+        # fresh(wid) => a random 0-label for wire wid, the output of a
+        # constant gate (random bits, if None)
+        H = util.garbling_hash(self.hash)
+        tables = [[] for _ in gids]
+        nonlinear = []
+        for i, gid in enumerate(gids):
+            gate = self.gates[gid]
+            a, b = gate["inp"]
+            A0, B0 = labels[a], labels[b]
+            t = gate["table"]
+            c0, c1, c2, c3 = t[0], t[0]^t[2], t[0]^t[1], t[0]^t[1]^t[2]^t[3]
+            if not (c1 or c2 or c3):
+                out = gate["out"][0]
+                labels[out] = fresh(out) if fresh else int.from_bytes(generate_key(), 'big')
+                tables[i] = [(labels[out] ^ (R if c0 else 0)).to_bytes(16, 'big')]
+            elif not c3:
+                labels[gate["out"][0]] = (R if c0 else 0) ^ (A0 if c1 else 0) ^ (B0 if c2 else 0)
+            else:
+                nonlinear.append((gid, gate, A0, B0, c0, c1, c2))
+                tables[i] = None
+        if self.mode == 'halfgates':
+            rows = self._half_gates(H, nonlinear, labels, R)
+        else:
+            rows = self._grr3(H, nonlinear, labels, R)
+        rows = iter(rows)
+        return [[h.to_bytes(16, 'big') for h in next(rows)] if t is None else t for t in tables]
+
+    def _grr3(self, H, gates, labels, R):
+        # => the rows of each gate, as ints
+        # Rows in select bit order (sa, sb), for the values va = sa ^ pa, vb = sb ^ pb
+        As, Bs, Ts = [], [], []
+        for gid, gate, A0, B0, c0, c1, c2 in gates:
+            pa, pb = A0 & 1, B0 & 1
+            for sa in (0,1):
+                for sb in (0,1):
+                    As.append(A0 ^ (R if sa ^ pa else 0))
+                    Bs.append(B0 ^ (R if sb ^ pb else 0))
+                    Ts.append(self.tweaks[gid])
+        hs = H.hash2(As, Bs, Ts)
+        tables = []
+        for i, (gid, gate, A0, B0, c0, c1, c2) in enumerate(gates):
+            pa, pb = A0 & 1, B0 & 1
+            t = gate["table"]
+            vs = [t[2*(sa ^ pa) + (sb ^ pb)] for sa in (0,1) for sb in (0,1)]
+            # The row (0,0) decrypts to H itself, the label of its value
+            out0 = hs[4*i] ^ (R if vs[0] else 0)
+            labels[gate["out"][0]] = out0
+            tables.append([h ^ out0 ^ (R if v else 0) for h, v in zip(hs[4*i+1:4*i+4], vs[1:])])
+        return tables
 
-        # TODO: your code goes here
+    def _half_gates(self, H, gates, labels, R):
+        # => the rows of each gate, as ints
+        # Per gate: the hashes of both labels of a (tweak T) and of b (T+1)
+        As, Ts = [], []
+        for gid, gate, A0, B0, c0, c1, c2 in gates:
+            if c2: A0 ^= R
+            if c1: B0 ^= R
+            T = self.tweaks[gid]
+            As += [A0, A0 ^ R, B0, B0 ^ R]
+            Ts += [T, T, T + 1, T + 1]
+        hs = H.hash1(As, Ts)
+        tables = []
+        for i, (gid, gate, A0, B0, c0, c1, c2) in enumerate(gates):
+            HA0, HA1, HB0, HB1 = hs[4*i:4*i+4]
+            A0, B0 = As[4*i], As[4*i+2]
+            pa, pb = A0 & 1, B0 & 1
+            # Generator half-gate: a AND pb
+            TG = HA0 ^ HA1 ^ (R if pb else 0)
+            WG0 = HA0 ^ (TG if pa else 0)
+            # Evaluator half-gate: a AND (b XOR pb)
+            TE = HB0 ^ HB1 ^ A0
+            WE0 = HB0 ^ ((TE ^ A0) if pb else 0)
+            labels[gate["out"][0]] = WG0 ^ WE0 ^ (R if c0 ^ (c1 & c2) else 0)
+            tables.append([TG, TE])
+        return tables
 
-    def output(self, outfile, inputs=None, debug=True):
+    def output(self, outfile, inputs=None, debug=True, quiet=False):
         # Save as a JSON file, with wire lables for debugging
         obj = {}
+        if self.mode != 'classic':
+            obj["mode"] = self.mode
+            obj["hash"] = self.hash
         gates = {}
         for gid,gate in self.gates.items():
             gates[gid] = gate.copy() # Copy the gate object directly
@@ -58,7 +298,7 @@ class GarbledCircuitGenerator(BooleanCircuit):
             obj["wire_labels"] = self.wire_labels
 
         if inputs is not None:
-            print('Input available')
+            if not quiet: print('Input available')
             assert len(inputs) == len(self.input_wires)
             input_labels = {}
             for wid,v in inputs.items():
@@ -68,13 +308,15 @@ class GarbledCircuitGenerator(BooleanCircuit):
 
         with open(outfile,"w") as f:
             json.dump(obj, f, indent=4)
-        print('Wrote garbled circuit', outfile)
+        if not quiet: print('Wrote garbled circuit', outfile)
 
 if __name__ == '__main__':
     import sys
     if len(sys.argv) < 3:
-        print("usage: python generator.py <circuit.json> <outfile.json>")
+        print("usage: python generator.py <circuit.json> <outfile.json> [mode] [hash]")
         sys.exit(1)
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'classic'
+    hash = sys.argv[4] if len(sys.argv) > 4 else 'aes'
 
     filename = sys.argv[1]
     obj = json.load(open(filename))
@@ -85,7 +327,7 @@ if __name__ == '__main__':
         % (len(c.gates), len(c.input_wires), len(c.output_wires), len(c.wires)))
     
     # Generate the circuit
-    c.garble()
+    c.garble(mode, hash)
 
     # Load the inputs
     inputs = obj["inputs"]
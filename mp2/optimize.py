@@ -0,0 +1,419 @@
+"""
+# Circuit optimizer: fewer nonlinear gates before garbling
+
+With Free-XOR, XOR gates, and every other linear table (XNOR, inversions,
+copies, constants), cost nothing, and a garbled circuit costs a table per
+nonlinear gate. `optimize()` rebuilds a circuit (a CompiledCircuit, see
+compiled.py) gate by gate as ANDs and XORs of literals, wires or their
+inversions:
+
+- every nonlinear table is an AND of its inputs, either inverted, with its
+  output either inverted: OR(a, b) is NOT AND(NOT a, NOT b). Inversions are
+  carried on the literals rather than in gates, and folded into the tables
+  of the gates that read them when the circuit is built again
+- constant propagation: a gate with a constant input, the same input twice,
+  or a table that ignores an input is a constant or one of its inputs
+- structural hashing: a gate of the same inputs and table (up to
+  inversions) as an earlier one is that gate
+- dead-gate elimination: gates no output depends on are dropped
+- ANDs that cannot both be 1, such as x = a AND b and y = c AND (a XOR b),
+  have x OR y = x XOR y, and x XOR y, the majority of a, b and c (the carry
+  of a full adder), is a XOR ((a XOR b) AND (a XOR c)): one AND instead of
+  two, where x and y are not read elsewhere
+
+Passes repeat while they save gates. The inputs and outputs keep their
+names and order (unused inputs too), so the optimized circuit replaces the
+original, in JSON as in Bristol Fashion. `equivalent()` checks the two on
+all inputs if there are few, and on random ones otherwise, bit-sliced.
+
+    python optimize.py example_circuits/32adder.json 32adder.opt.json
+    python optimize.py <circuit>                 # the report only
+"""
+import random
+from array import array
+from collections import Counter
+
+import compiled
+from compiled import EQW, INV, bits_table, nonlinear
+
+PASSES = 4
+FALSE, TRUE = 0, 1      # the literals of the constants: literal 2*v + i is var v, inverted if i
+AND_OP, XOR_OP = 0, 1
+
+
+def _table(f):
+    # => the 4-bit table of f(a, b)
+    return sum(f(a, b) << (2*a + b) for a in (0, 1) for b in (0, 1))
+
+def _invert_inputs(t, ia, ib):
+    # => the table of t(a ^ ia, b ^ ib)
+    return _table(lambda a, b: (t >> (2*(a ^ ia) + (b ^ ib))) & 1)
+
+def _and_form(t):
+    # Nonlinear table t as AND(a ^ ia, b ^ ib) ^ io => (ia, ib, io): the one
+    # entry unlike the other three is at a = 1 ^ ia, b = 1 ^ ib
+    bits = bits_table(t)
+    io = 1 if sum(bits) == 3 else 0
+    k = bits.index(1 ^ io)
+    return 1 ^ (k >> 1), 1 ^ (k & 1), io
+
+def _unary(f0, f1, lit):
+    # => the literal of f(lit), for f(0) = f0 and f(1) = f1
+    return f0 if f0 == f1 else lit ^ f0
+
+
+class Optimizer(object):
+    # One pass: var 0 is the constant 0, vars 1..n_inputs the inputs, and
+    # var first + j node j, an AND of two literals or an XOR of two vars
+    def __init__(self, n_inputs):
+        self.n_inputs = n_inputs
+        self.first = 1 + n_inputs
+        self.op, self.x, self.y = array('B'), array('I'), array('I')
+        self.fanout = array('I')    # the reads of the wires a node stands for
+        self.rep = []               # the gate that made each node, or None
+        self.hashed = {}            # (op, x, y) => literal
+        self.rewrites = Counter()
+
+    def _node(self, op, x, y):
+        self.op.append(op)
+        self.x.append(x)
+        self.y.append(y)
+        self.fanout.append(0)
+        self.rep.append(None)
+        return 2 * (self.first + len(self.op) - 1)
+
+    def _and_node(self, lit):
+        # => node number of lit, if an AND node, else None
+        j = (lit >> 1) - self.first
+        return j if j >= 0 and self.op[j] == AND_OP else None
+
+    def _find_xor(self, p, q):
+        # => the literal of p XOR q, if it exists, else None
+        key = (XOR_OP,) + tuple(sorted((p & ~1, q & ~1)))
+        lit = self.hashed.get(key)
+        return None if lit is None else lit ^ ((p ^ q) & 1)
+
+    def _exclusive(self, i, j):
+        # Whether AND nodes i and j cannot both be 1: an input of one is the
+        # inversion of an input of the other, or the XOR of its inputs
+        p, q, r, s = self.x[i], self.y[i], self.x[j], self.y[j]
+        if p ^ 1 in (r, s) or q ^ 1 in (r, s): return True
+        return self._find_xor(p, q) in (r, s) or self._find_xor(r, s) in (p, q)
+
+    def make_and(self, a, b):
+        # => the literal of a AND b
+        a, b = min(a, b), max(a, b)
+        if a == FALSE or a ^ 1 == b: return FALSE
+        if a == TRUE or a == b: return b
+        key = (AND_OP, a, b)
+        if key in self.hashed: return self.hashed[key]
+        i, j = self._and_node(a), self._and_node(b)
+        if i is not None and j is not None and self._exclusive(i, j):
+            self.rewrites['exclusive AND'] += 1
+            # Of x = NOT a and y = NOT b, at most one is 1
+            if a & 1 and b & 1: lit = self.make_xor(a, b) ^ 1      # NOT (x OR y)
+            elif a & 1: lit = b
+            elif b & 1: lit = a
+            else: lit = FALSE
+        else:
+            lit = self._node(AND_OP, a, b)
+        self.hashed[key] = lit
+        return lit
+
+    def make_xor(self, a, b):
+        # => the literal of a XOR b
+        inv = (a ^ b) & 1
+        a, b = sorted((a & ~1, b & ~1))
+        if a == FALSE: return b ^ inv
+        if a == b: return inv
+        key = (XOR_OP, a, b)
+        if key not in self.hashed:
+            lit = self._majority(a, b)
+            self.hashed[key] = self._node(XOR_OP, a, b) if lit is None else lit
+        return self.hashed[key] ^ inv
+
+    def _majority(self, a, b):
+        # a XOR b, for AND nodes a = p AND q and b = r AND (p XOR q) read
+        # nowhere else, as p XOR ((p XOR q) AND (p XOR r)) => its literal,
+        # or None
+        i, j = self._and_node(a), self._and_node(b)
+        if i is None or j is None or self.fanout[i] != 1 or self.fanout[j] != 1: return None
+        for i, j in ((i, j), (j, i)):
+            p, q = self.x[i], self.y[i]
+            pq = self._find_xor(p, q)
+            for r, s in ((self.x[j], self.y[j]), (self.y[j], self.x[j])):
+                if pq is not None and s == pq:
+                    self.rewrites['majority'] += 1
+                    return self.make_xor(p, self.make_and(pq, self.make_xor(p, r)))
+        return None
+
+    def gate(self, la, lb, t):
+        # => the literal of t(la, lb)
+        t = _invert_inputs(t, la & 1, lb & 1)
+        va, vb = la >> 1, lb >> 1
+        f = bits_table(t)
+        if va == FALSE: return _unary(f[0], f[1], 2*vb)
+        if vb == FALSE: return _unary(f[0], f[2], 2*va)
+        if va == vb: return _unary(f[0], f[3], 2*va)
+        if f[0] == f[1] and f[2] == f[3]: return _unary(f[0], f[2], 2*va)
+        if f[0] == f[2] and f[1] == f[3]: return _unary(f[0], f[1], 2*vb)
+        if not nonlinear(t): return self.make_xor(2*va, 2*vb) ^ f[0]
+        ia, ib, io = _and_form(t)
+        return self.make_and(2*va ^ ia, 2*vb ^ ib) ^ io
+
+    def run(self, cc):
+        # => cc optimized, a CompiledCircuit
+        n = cc.n_inputs
+        fan = array('I', [0]) * cc.n_wires
+        for a, b in zip(cc.in0, cc.in1):
+            fan[a] += 1
+            if b != a: fan[b] += 1
+        for w in cc.outputs: fan[w] += 1
+
+        lits = array('I', [0]) * cc.n_wires
+        lits[:n] = array('I', range(2, 2*n + 2, 2))
+        for g, (a, b, o, t) in enumerate(zip(cc.in0, cc.in1, cc.out, cc.table)):
+            nodes = len(self.op)
+            lit = lits[o] = self.gate(lits[a], lits[b], t)
+            j = (lit >> 1) - self.first
+            if j >= 0:
+                self.fanout[j] += fan[o]
+                if j >= nodes and not lit & 1: self.rep[j] = g
+        return self.build(cc, [lits[w] for w in cc.outputs])
+
+    def build(self, cc, outputs):
+        # The live nodes as gates, and outputs (literals) => a CompiledCircuit
+        n, first, nodes = cc.n_inputs, self.first, len(self.op)
+        live = bytearray(nodes)
+        reads = array('I', [0]) * nodes
+        used = bytearray(n + 1)
+        for lit in outputs:
+            if lit >> 1 >= first: live[(lit >> 1) - first] = 1
+        for j in reversed(range(nodes)):
+            if not live[j]: continue
+            for lit in (self.x[j], self.y[j]):
+                v = lit >> 1
+                if v >= first:
+                    live[v - first] = 1
+                    reads[v - first] += 1
+                else:
+                    used[v] = 1
+
+        # An output is the wire of a node no gate reads (inverted if need
+        # be), or else a copy of one, of an input, or a constant
+        claim = {}
+        for k, lit in enumerate(outputs):
+            j = (lit >> 1) - first
+            if j >= 0 and not reads[j] and j not in claim:
+                claim[j] = k
+            elif 0 < lit >> 1 < first:
+                used[lit >> 1] = 1
+        # The inputs no gate reads are read by the first gate, as an input it ignores
+        spare = [v - 1 for v in range(1, n + 1) if not used[v]]
+
+        named = cc.has_names()
+        if named:
+            names, gids = cc.wire_names, cc.gate_ids
+            out_names = set(names[w] for w in cc.outputs)
+            taken = [set(names), set(gids)]
+            wire_names, gate_ids = list(names[:n]), []
+            def fresh(k, prefix):
+                i = len(taken[k])
+                while '%s%d' % (prefix, i) in taken[k]: i += 1
+                taken[k].add('%s%d' % (prefix, i))
+                return '%s%d' % (prefix, i)
+        b = compiled.Builder(n, cc.input_sizes)
+        wire = [None] + list(range(n))      # var => wire
+
+        def emit(x, y, t, gid=None, name=None):
+            if spare:
+                chain = list(spare)
+                del spare[:]
+                for u in chain:
+                    x = emit(x, u, EQW)
+            if named:
+                gate_ids.append(gid if gid is not None else fresh(1, 'opt_g'))
+                wire_names.append(name if name is not None else fresh(0, 'opt_w'))
+            return b.add(x, y, t)
+
+        gate_of = lambda w: gids[w - n] if w >= n else None
+        for j in range(nodes):
+            if not live[j]:
+                wire.append(None)
+                continue
+            x, y = self.x[j], self.y[j]
+            flip = outputs[claim[j]] & 1 if j in claim else 0
+            if self.op[j] == AND_OP:
+                t = _table(lambda a, c: ((a ^ (x & 1)) & (c ^ (y & 1))) ^ flip)
+            else:
+                t = _table(lambda a, c: a ^ c ^ flip)
+            gid = name = None
+            if named and j in claim:
+                w = cc.outputs[claim[j]]
+                gid, name = gate_of(w), names[w]
+            elif named and self.rep[j] is not None and names[n + self.rep[j]] not in out_names:
+                gid, name = gids[self.rep[j]], names[n + self.rep[j]]
+            wire.append(emit(wire[x >> 1], wire[y >> 1], t, gid, name))
+
+        outs = []
+        for k, lit in enumerate(outputs):
+            j = (lit >> 1) - first
+            if j >= 0 and claim.get(j) == k:
+                outs.append(wire[first + j])
+                continue
+            w = cc.outputs[k]
+            gid, name = (gate_of(w), names[w]) if named else (None, None)
+            if lit >> 1 == FALSE:
+                outs.append(emit(0, 0, _table(lambda a, c: lit), gid, name))
+            else:
+                # A claimed node's wire already has its output's inversion
+                inv = (lit ^ outputs[claim[j]]) & 1 if j in claim else lit & 1
+                v = wire[lit >> 1]
+                outs.append(emit(v, v, INV if inv else EQW, gid, name))
+        out = b.build(outs, cc.output_sizes)
+        if named:
+            out._names = {"wires": wire_names, "gates": gate_ids}
+        return out
+
+
+def optimize(cc, passes=PASSES):
+    # => (cc optimized, a CompiledCircuit; the rewrites made, a Counter)
+    rewrites = Counter()
+    cost = lambda c: (sum(nonlinear(t) for t in c.table), c.n_gates)
+    original = cc
+    for _ in range(passes):
+        o = Optimizer(cc.n_inputs)
+        out = o.run(cc)
+        if cost(out) >= cost(cc): break
+        cc = out
+        rewrites.update(o.rewrites)
+    assert cc is original or equivalent(original, cc), "the optimized circuit is not equivalent"
+    return cc, rewrites
+
+def equivalent(a, b, rounds=16, width=1024):
+    # Whether circuits a and b (of the same inputs and outputs, in order)
+    # agree: on all inputs if they have at most 16, else on rounds * width
+    # random ones, width at a time, bit-sliced
+    if a.n_inputs != b.n_inputs or len(a.outputs) != len(b.outputs): return False
+    if a.n_inputs <= 16: return a.truth_table() == b.truth_table()
+    mask = (1 << width) - 1
+    for _ in range(rounds):
+        words = [random.getrandbits(width) for _ in range(a.n_inputs)]
+        if a.evaluate_words(words, mask) != b.evaluate_words(words, mask): return False
+    return True
+
+def report(before, after, rewrites=None):
+    # => lines: the gates of each type before and after, and the totals
+    sb, sa = before.stats(), after.stats()
+    kinds = sorted(set(sb['counts']) | set(sa['counts']), key=lambda k: -sb['counts'].get(k, 0))
+    rows = [(k, sb['counts'].get(k, 0), sa['counts'].get(k, 0)) for k in kinds]
+    rows += [('gates', sb['gates'], sa['gates']), ('nonlinear', sb['nonlinear'], sa['nonlinear']),
+             ('depth', sb['depth'], sa['depth'])]
+    lines = ['%-10s %9s %9s %9s' % ('', 'before', 'after', 'change')]
+    for k, x, y in rows:
+        lines.append('%-10s %9d %9d %+9d' % (k, x, y, y - x))
+    if rewrites:
+        lines.append('rewrites: ' + ', '.join('%s %d' % kv for kv in sorted(rewrites.items())))
+    return lines
+
+
+"""
+## Tests
+"""
+def optimize_test(filename):
+    import io
+    from circuit import BooleanCircuit
+    from generator import GarbledCircuitGenerator
+    from evaluator import GarbledCircuitEvaluator
+    import stream
+    cc = compiled.load(filename)
+    opt, _ = optimize(cc)
+    assert equivalent(cc, opt)
+    assert sum(map(nonlinear, opt.table)) <= sum(map(nonlinear, cc.table))
+    assert opt.input_names() == cc.input_names() and opt.output_names() == cc.output_names()
+
+    # The same circuit in JSON, and garbled
+    plain = BooleanCircuit(from_json=opt.to_json())
+    assert plain.input_wires == set(cc.input_names()) and plain.output_wires == set(cc.output_names())
+    batch = [dict((wid, random.randint(0, 1)) for wid in plain.input_wires) for _ in range(20)]
+    assert plain.evaluate_batch(batch) == cc.evaluate_batch(batch)
+    obj = opt.to_json()
+    g = GarbledCircuitGenerator(from_json=obj, compiled=opt)
+    e = GarbledCircuitEvaluator(from_json=obj, compiled=opt)
+    for mode in stream.ROW_BYTES:
+        f = io.BytesIO()
+        stream.write(g, f, batch[0], mode)
+        stream.evaluate(e, io.BytesIO(f.getvalue()))
+        assert e.output_values == cc.evaluate(batch[0])
+
+    # Each rule, on a circuit of 5 inputs, the last unused
+    b = compiled.Builder(5)
+    x, y = b.AND(0, 1), b.AND(1, 0)                 # duplicates
+    nand = b.add(0, 1, 7)                           # NOT x
+    zero = b.XOR(0, 0)
+    one = b.INV(zero)
+    b.AND(2, 1)                                     # dead
+    carry = b.OR(b.AND(1, 2), b.AND(3, b.XOR(1, 2)))    # the majority of 1, 2, 3
+    outs = [b.OR(x, y), nand, b.AND(2, zero), b.OR(2, one), b.XOR(b.INV(0), b.INV(1)), carry, b.AND(0, 0)]
+    cc = b.build(outs)
+    opt, rewrites = optimize(cc)
+    assert equivalent(cc, opt) and opt.n_inputs == 5
+    assert sum(map(nonlinear, opt.table)) == 2, "x, and the carry's AND"
+    assert rewrites['majority'] == 1
+    assert len(BooleanCircuit(from_json=opt.to_json()).input_wires) == 5
+
+    # A pass that saves nothing keeps the circuit
+    assert optimize(opt)[0] is opt
+
+    # Two outputs of the same inverted literal: one claims the node, the
+    # other copies it, without inverting it again
+    b = compiled.Builder(2)
+    opt, _ = optimize(b.build([b.OR(0, 1), b.OR(1, 0)]))
+    assert opt.truth_table() == [14, 14]
+
+    # Random small circuits, with duplicate, inverted, constant and input outputs
+    for _ in range(2000):
+        n = random.randint(1, 4)
+        b = compiled.Builder(n)
+        wires = list(range(n))
+        for _ in range(random.randint(1, 12)):
+            wires.append(b.add(random.choice(wires), random.choice(wires), random.randrange(16)))
+        cc = b.build([random.choice(wires) for _ in range(random.randint(1, 4))])
+        opt, _ = optimize(cc)
+        assert equivalent(cc, opt)
+    print("Optimize test complete: %s" % filename)
+
+def main():
+    import argparse
+    import json
+    import os
+    import sys
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('circuit')
+    parser.add_argument('out', nargs='?', help='the optimized circuit: .json, or else Bristol Fashion')
+    parser.add_argument('--passes', type=int, default=PASSES)
+    parser.add_argument('--rounds', type=int, default=16)
+    parser.add_argument('--test', action='store_true')
+    args = parser.parse_args()
+    if args.test:
+        return optimize_test(args.circuit)
+
+    cc = compiled.load(args.circuit)
+    opt, rewrites = optimize(cc, args.passes)
+    print(args.circuit)
+    for line in report(cc, opt, rewrites):
+        print('  ' + line)
+    if not equivalent(cc, opt, args.rounds):
+        print('the optimized circuit is not equivalent', file=sys.stderr)
+        sys.exit(1)
+    if args.out:
+        if args.out.endswith('.json'):
+            with open(args.out, 'w') as f:
+                json.dump(opt.to_json(), f, indent=4, sort_keys=True)
+        else:
+            import bristol
+            bristol.write(opt, args.out)
+        print('Wrote %s (%d bytes)' % (args.out, os.path.getsize(args.out)))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,192 @@
+"""
+# Layer-parallel garbling and evaluation
+
+The gates of a layer (see levelize) are independent, so each layer can be
+split into chunks that are garbled, or evaluated, at the same time by a
+pool of processes. The wire labels are kept in shared memory, in one slot
+per wire: a worker reads the labels of its gates' inputs from there and
+writes those of their outputs, so that only gate ranges and tables pass
+between processes. The workers are forked with the circuit already loaded
+and levelized. A layer with fewer than `min_chunk` gates per worker is
+done in the calling process, where the pool would cost more than it saves.
+
+The garbled circuits are the same as those of garble() and
+garbled_evaluate(): a circuit garbled in parallel can be evaluated in one
+process, and the other way around.
+
+    with parallel.Pool(generator, workers=4) as pool:
+        pool.garble('halfgates')
+    with parallel.Pool(evaluator, workers=4) as pool:
+        pool.evaluate(inputs)
+"""
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import util
+from generator import GarbledCircuitGenerator, MODES
+
+MIN_CHUNK = 256
+
+_pool = None    # in a worker process, the Pool it works for
+
+
+def _init(pool):
+    global _pool
+    _pool = pool
+
+def _run(*args):
+    return _pool._run(*args)
+
+
+class Pool(object):
+    def __init__(self, circuit, workers=None, min_chunk=MIN_CHUNK):
+        # circuit: a GarbledCircuitGenerator, or a GarbledCircuitEvaluator
+        self.circuit = circuit
+        self.workers = workers or os.cpu_count()
+        self.min_chunk = min_chunk
+        if not hasattr(circuit, 'layers'): circuit.levelize()
+        if not hasattr(circuit, 'tweaks'):
+            circuit.tweaks = dict((gid, util.label_tweak(gid)) for gid in circuit.gates)
+        self.generator = isinstance(circuit, GarbledCircuitGenerator)
+        self.index = dict((wid, i) for i, wid in enumerate(circuit.wires))
+        # A slot per wire: both labels for the generator, one for the evaluator
+        self.slot = 32 if self.generator else 16
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, self.slot * len(self.index)))
+        self.executor = None
+        if self.workers > 1:
+            self.executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('fork'),
+                                                initializer=_init, initargs=(self,))
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # The labels of wires in their slots: the 0-label as an int in the
+    # Free-XOR modes, and bytes in classic mode, both labels for the
+    # generator, the one it has for the evaluator
+    def _read(self, wires):
+        buf, slot, index = self.shm.buf, self.slot, self.index
+        if self.circuit.mode in ('freexor', 'halfgates'):
+            frm = int.from_bytes
+            return dict((wid, frm(buf[index[wid]*slot:index[wid]*slot+16], 'big')) for wid in wires)
+        if self.generator:
+            return dict((wid, [bytes(buf[index[wid]*slot:index[wid]*slot+16]),
+                               bytes(buf[index[wid]*slot+16:index[wid]*slot+32])]) for wid in wires)
+        return dict((wid, bytes(buf[index[wid]*slot:index[wid]*slot+16])) for wid in wires)
+
+    def _write(self, labels, wires):
+        buf, slot, index = self.shm.buf, self.slot, self.index
+        for wid in wires:
+            L = labels[wid]
+            i = index[wid] * slot
+            if type(L) is int:
+                buf[i:i+16] = L.to_bytes(16, 'big')
+            elif type(L) is list:
+                buf[i:i+32] = L[0] + L[1]
+            else:
+                buf[i:i+16] = L
+
+    def _run(self, mode, hash, R, k, start, stop, tables=None):
+        # Garbles or evaluates gates start..stop of layer k, with the labels
+        # in the shared slots => their tables, when garbling
+        c = self.circuit
+        c.mode, c.hash = mode, hash
+        gids = c.layers[k][start:stop]
+        wires = set(w for gid in gids for w in c.gates[gid]["inp"])
+        if self.generator and mode == 'classic':
+            wires.update(c.gates[gid]["out"][0] for gid in gids)
+        labels = self._read(wires)
+        if self.generator:
+            tables = c.garble_gates(gids, labels, R)
+            if mode == 'classic': return tables
+        else:
+            if mode in ('freexor', 'halfgates'): c.H = util.garbling_hash(hash)
+            c.evaluate_gates(gids, tables, labels)
+        self._write(labels, [c.gates[gid]["out"][0] for gid in gids])
+        return tables
+
+    def _layer(self, k, R, tables=None):
+        # Layer k, in chunks, on the pool if it is wide enough
+        # => [(gate ids, their tables)]
+        c = self.circuit
+        layer = c.layers[k]
+        parts = min(self.workers, len(layer) // self.min_chunk)
+        if parts < 2 or self.executor is None:
+            return [(layer, self._run(c.mode, c.hash, R, k, 0, len(layer), tables))]
+        size = -(-len(layer) // parts)
+        futures = [(layer[i:i+size], self.executor.submit(_run, c.mode, c.hash, R, k, i, i + size,
+                                                          tables and tables[i:i+size]))
+                   for i in range(0, len(layer), size)]
+        return [(gids, f.result()) for gids, f in futures]
+
+    def garble(self, mode='classic', hash='aes'):
+        # As GarbledCircuitGenerator.garble
+        c = self.circuit
+        assert self.generator and mode in MODES, "unknown garbling mode %r" % mode
+        c.garble_chunks(mode, hash)     # the input labels, or all of them
+        R = None
+        if mode in ('freexor', 'halfgates'):
+            L0, L1 = c.wire_labels[next(iter(c.input_wires))]
+            R = int(L0, 16) ^ int(L1, 16)
+        self._write(dict((wid, [bytes.fromhex(L0), bytes.fromhex(L1)])
+                         for wid, (L0, L1) in c.wire_labels.items()), c.wire_labels)
+        c.garble_table = {}
+        for k in range(len(c.layers)):
+            for gids, tables in self._layer(k, R):
+                for gid, rows in zip(gids, tables):
+                    c.garble_table[gid] = [row.hex() for row in rows]
+        if R is not None:
+            c.wire_labels = dict((wid, ['%032x' % L, '%032x' % (L ^ R)])
+                                 for wid, L in self._read(c.wires).items())
+
+    def evaluate(self, inp):
+        # As GarbledCircuitEvaluator.garbled_evaluate
+        e = self.circuit
+        assert not self.generator
+        labels = e.begin(inp)
+        self._write(labels, labels)
+        for k, layer in enumerate(e.layers):
+            self._layer(k, None, [e.garble_table[gid] for gid in layer])
+        return e.finish(self._read(e.wires))
+
+
+"""
+## Tests
+"""
+def parallel_test(filename, workers=2):
+    import random
+    from evaluator import GarbledCircuitEvaluator
+    from roundtrip import load, output, check
+    cc, g, _ = load(filename)
+    with Pool(g, workers, min_chunk=1) as gpool:
+        for mode in MODES:
+            for parallel_garble, parallel_evaluate in ((True, False), (False, True), (True, True)):
+                inputs = dict((wid, random.randint(0, 1)) for wid in g.input_wires)
+                if parallel_garble: gpool.garble(mode)
+                else: g.garble(mode)
+                garbled = output(g, inputs)
+                e = GarbledCircuitEvaluator(from_json=garbled, compiled=cc)
+                if parallel_evaluate:
+                    with Pool(e, workers, min_chunk=1) as epool:
+                        out = epool.evaluate(garbled["inputs"])
+                else:
+                    out = e.garbled_evaluate(garbled["inputs"])
+                check(g, out, cc.evaluate(inputs))
+    print("Parallel test complete: %s" % filename)
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 2:
+        print("usage: python parallel.py <circuit> [workers]")
+        sys.exit(1)
+    parallel_test(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 2)
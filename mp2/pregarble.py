@@ -0,0 +1,264 @@
+"""
+# Pre-garbling: garbling offline, ahead of the inputs
+
+Garbling does not depend on the inputs, so it need not wait for them: a
+Pool garbles copies of a circuit in the background, in worker threads or
+processes, and keeps up to `depth` of them ready. When the inputs arrive,
+`get()` hands out a ready copy, and the online work is to pick a label per
+input wire and send the copy, which is already in the stream format of
+stream.py.
+
+A copy is stored as the bytes of its stream (the header, the tables, and
+what decodes the outputs), less the input frame, and with both labels of each
+input wire; a garbled circuit must not be evaluated twice, so a copy can be
+used once. The pool refills as copies are taken, at most `rate` copies a
+second if given (to leave the CPU to the online work), and `get()` waits
+for a copy when none is ready.
+
+    with pregarble.Pool(generator, 'halfgates', depth=8, workers=2) as pool:
+        copy = pool.get()
+        copy.write(sock_file, inputs)     # or copy.input_labels(inputs)
+    stream.evaluate(evaluator, sock_file)
+"""
+import copy as _copy
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import stream
+import util
+
+DEPTH = 4
+
+_circuit = None     # in a worker process, the circuit it garbles
+
+
+class Pregarbled(object):
+    def __init__(self, header, labels, tables, end):
+        # header: the stream's header; labels: both labels of each input
+        # wire, in sorted order, 32 bytes each; tables: the T frames; end:
+        # the O (if any) and E frames
+        self.header, self.labels, self.tables, self.end = header, labels, tables, end
+        self.inputs = None      # the input wires, in sorted order, set by the pool
+        self.used = False
+
+    def __len__(self):
+        # The bytes it is stored in
+        return len(self.header) + len(self.labels) + len(self.tables) + len(self.end)
+
+    def _select(self, inputs):
+        # => the label of each input wire for inputs, in sorted order
+        if self.used: raise ValueError("a pre-garbled circuit can be used once")
+        assert len(inputs) == len(self.inputs)
+        assert all(inputs[wid] in (0, 1) for wid in self.inputs), "an input is a bit"
+        self.used = True
+        L = self.labels
+        return [L[32*i + 16*inputs[wid]:32*i + 16*inputs[wid] + 16] for i, wid in enumerate(self.inputs)]
+
+    def input_labels(self, inputs):
+        # => the label of each input wire for inputs (a bit per input wire), in hex
+        return dict(zip(self.inputs, (L.hex() for L in self._select(inputs))))
+
+    def write(self, f, inputs):
+        # Writes the stream of the garbled circuit into binary file f, with
+        # the labels of inputs => the number of bytes written
+        size = 0
+        for data in (self.header, stream.frame(b'I', b''.join(self._select(inputs))), self.tables, self.end):
+            f.write(data)
+            size += len(data)
+        f.flush()
+        return size
+
+
+def pregarble(c, mode='halfgates', hash='aes', seed=None, chunk=stream.CHUNK, decode=True):
+    # Garbles GarbledCircuitGenerator c (a copy of it, so that threads can
+    # share it) => a Pregarbled
+    assert 1 <= chunk <= stream.CHUNK, "at most %d gates per frame" % stream.CHUNK
+    c = _copy.copy(c)
+    chunks = c.garble_chunks(mode, hash, chunk, seed)
+    labels = b''.join(bytes.fromhex(L) for wid in sorted(c.input_wires) for L in c.wire_labels[wid])
+    tables = b''.join(stream.tables_frame(tables) for gids, tables in chunks)
+    return Pregarbled(stream.header(c), labels, tables, stream.end_frames(c, decode))
+
+def _init(circuit):
+    global _circuit
+    _circuit = circuit
+
+def _pregarble(*args):
+    return pregarble(_circuit, *args)
+
+
+class Pool(object):
+    def __init__(self, circuit, mode='halfgates', hash='aes', depth=DEPTH, rate=None, workers=1,
+                 processes=False, seeded=True, chunk=stream.CHUNK, decode=True):
+        # circuit: a GarbledCircuitGenerator; depth: the copies to keep
+        # ready; rate: the most copies to garble a second (None: as fast as
+        # the workers go); processes: garble in processes rather than
+        # threads; seeded: from labels derived from a seed per copy (see
+        # garble), in memory in proportion to the chunk
+        assert depth >= 1 and workers >= 1
+        self.circuit, self.mode, self.hash = circuit, mode, hash
+        self.depth, self.rate, self.workers = depth, rate, workers
+        self.seeded, self.chunk, self.decode = seeded, chunk, decode
+        # Computed once here, rather than in each thread or process
+        stream.schedule_digest(circuit)
+        circuit.wire_index()
+        if mode != 'classic':
+            circuit.liveness(circuit.layers)
+            if not hasattr(circuit, 'tweaks'):
+                circuit.tweaks = dict((gid, util.label_tweak(gid)) for gid in circuit.gates)
+        self.inputs = sorted(circuit.input_wires)
+
+        self.ready = []         # the ready copies, oldest first
+        self.pending = 0        # the copies being garbled
+        self.garbled = 0        # copies garbled so far
+        self.waits = 0          # calls to get() that found no copy ready
+        self.error = None
+        self.closed = False
+        self.lock = threading.Condition()
+        if processes:
+            self.executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('fork'),
+                                                initializer=_init, initargs=(circuit,))
+            # Forks the workers now, from this thread rather than the refiller
+            self.executor.submit(len, ()).result()
+            self.job = _pregarble
+        else:
+            self.executor = ThreadPoolExecutor(workers)
+            self.job = lambda *args: pregarble(circuit, *args)
+        self.refiller = threading.Thread(target=self._refill, daemon=True)
+        self.refiller.start()
+
+    def _refill(self):
+        # Keeps depth copies ready or being garbled, starting at most rate a
+        # second, until the pool closes or a copy fails (which get() raises)
+        last = None
+        while True:
+            with self.lock:
+                while not self._stopped() and len(self.ready) + self.pending >= self.depth:
+                    self.lock.wait()
+                if self._stopped(): return
+                self.pending += 1
+            if self.rate is not None:
+                if last is not None:
+                    time.sleep(max(0, last + 1 / self.rate - time.monotonic()))
+                last = time.monotonic()
+            seed = util.generate_key() if self.seeded else None
+            try:
+                future = self.executor.submit(self.job, self.mode, self.hash, seed, self.chunk, self.decode)
+            except RuntimeError:    # shut down
+                return
+            future.add_done_callback(self._done)
+
+    def _stopped(self):
+        return self.closed or self.error is not None
+
+    def _done(self, future):
+        with self.lock:
+            self.pending -= 1
+            if future.cancelled():
+                pass
+            elif future.exception() is not None:
+                self.error = future.exception()
+            else:
+                p = future.result()
+                p.inputs = self.inputs
+                self.ready.append(p)
+                self.garbled += 1
+            self.lock.notify_all()
+
+    def get(self, timeout=None):
+        # => a ready Pregarbled, once one is; it is the caller's, and the
+        #    pool garbles another in its place
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            if not self.ready: self.waits += 1
+            while not self.ready:
+                if self.error is not None: raise self.error
+                if self.closed: raise ValueError("the pool is closed")
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0: raise TimeoutError("no pre-garbled circuit is ready")
+                self.lock.wait(left)
+            p = self.ready.pop(0)
+            self.lock.notify_all()
+            return p
+
+    def fill(self, timeout=None):
+        # Waits until depth copies are ready
+        with self.lock:
+            while len(self.ready) < self.depth:
+                if self.error is not None: raise self.error
+                if not self.lock.wait(timeout): raise TimeoutError("the pool did not fill")
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.lock.notify_all()
+        self.refiller.join()
+        self.executor.shutdown(cancel_futures=True)
+        self.ready = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+"""
+## Tests
+"""
+def pregarble_test(filename):
+    import io
+    import random
+    from roundtrip import load, check_stream
+    cc, g, e = load(filename)
+    for mode in stream.ROW_BYTES:
+        for processes, seeded in ((False, True), (False, False), (True, True)):
+            with Pool(g, mode, depth=3, workers=2, processes=processes, seeded=seeded, chunk=7) as pool:
+                pool.fill()
+                seen = set()
+                for _ in range(5):
+                    p = pool.get()
+                    assert p.tables not in seen, "a copy was handed out twice"
+                    seen.add(p.tables)
+                    inputs = dict((wid, random.randint(0, 1)) for wid in g.input_wires)
+                    f = io.BytesIO()
+                    assert p.write(f, inputs) == len(f.getvalue())
+                    check_stream(e, f.getvalue(), inputs, cc)
+                    try:
+                        p.input_labels(inputs)
+                        assert False, "a copy was used twice"
+                    except ValueError:
+                        pass
+                assert pool.garbled >= 5 and len(pool.ready) <= 3
+                try:
+                    pool.get().write(io.BytesIO(), dict((wid, 2) for wid in g.input_wires))
+                    assert False, "an input of 2 was written"
+                except AssertionError as err:
+                    assert str(err) == "an input is a bit"
+
+    # A copy that fails to garble fails get(), and the pool stops refilling
+    with Pool(g, 'halfgates', 'md5', depth=2) as pool:
+        try:
+            pool.get(timeout=10)
+            assert False, "a copy garbled with an unknown hash"
+        except KeyError:
+            pass
+        pool.refiller.join(10)
+        assert not pool.refiller.is_alive() and pool.garbled == 0
+
+    # With a rate, the pool refills no faster than it
+    with Pool(g, 'halfgates', depth=2, rate=20) as pool:
+        t0 = time.monotonic()
+        for _ in range(4): pool.get()
+        assert time.monotonic() - t0 >= 3 / 20
+        assert pool.waits >= 1
+    print("Pregarble test complete: %s" % filename)
+
+if __name__ == '__main__':
+    import sys
+    if len(sys.argv) < 2:
+        print("usage: python pregarble.py <circuit>")
+        sys.exit(1)
+    pregarble_test(sys.argv[1])
@@ -0,0 +1,61 @@
+"""
+# Garbling round trips
+
+A circuit garbled by the generator and evaluated by the evaluator, checked
+against its plain evaluation: the steps the self-tests of test_garbled_circuit.py,
+stream.py, parallel.py and pregarble.py, and the benchmarks, share.
+
+    plain, g, e = roundtrip.load('example_circuits/32adder.json')
+    g.garble('halfgates')
+    roundtrip.evaluate(g, inputs, plain)
+"""
+import io
+import json
+import os
+import tempfile
+
+import compiled
+from evaluator import GarbledCircuitEvaluator
+from generator import GarbledCircuitGenerator
+
+
+def load(filename):
+    # => the plain circuit of filename, compiled, and a generator and an evaluator of it
+    plain = compiled.load(filename)
+    return (plain,) + garblers(plain)
+
+def garblers(plain):
+    # => a generator and an evaluator of compiled circuit plain
+    obj = plain.to_json()
+    return (GarbledCircuitGenerator(from_json=obj, compiled=plain),
+            GarbledCircuitEvaluator(from_json=obj, compiled=plain))
+
+def output(c, inputs, quiet=True):
+    # => the garbled circuit of generator c, with the labels of inputs, as
+    #    output() writes it for the evaluator (without the other labels)
+    with tempfile.NamedTemporaryFile(prefix='garble_', suffix='.json', delete=False) as f:
+        f.close()
+        c.output(f.name, inputs, debug=False, quiet=quiet)
+        garbled = json.load(open(f.name))
+        os.remove(f.name)
+    return garbled
+
+def check(c, out_labels, outs):
+    # The output labels of generator c for the plain outputs outs
+    assert len(out_labels) == len(outs)
+    for wid,v in outs.items():
+        assert out_labels[wid] == c.wire_labels[wid][v], "output wire mismatch"
+
+def evaluate(c, inputs, plain, outs=None, quiet=True):
+    # Evaluates the garbled circuit of generator c on inputs, and checks it
+    # against compiled circuit plain, or its outputs outs => the evaluator
+    garbled = output(c, inputs, quiet)
+    e = GarbledCircuitEvaluator(from_json=garbled, compiled=plain)
+    check(c, e.garbled_evaluate(garbled["inputs"]), plain.evaluate(inputs) if outs is None else outs)
+    return e
+
+def check_stream(e, data, inputs, plain):
+    # Evaluates stream data with evaluator e, and checks it against compiled circuit plain
+    import stream
+    stream.evaluate(e, io.BytesIO(data))
+    assert e.output_values == plain.evaluate(inputs), "output wire mismatch"
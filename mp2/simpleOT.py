@@ -49,7 +49,8 @@ https://eprint.iacr.org/2015/267.pdf
 import secp256k1
 from secp256k1 import Point, q, Fq, order, p, Fp, G, curve, ser, deser, uint256_from_str, uint256_to_str, make_random_point
 import os
-from Crypto.Hash import SHA256
+from cryptocore.oracles import sha2
+from util import xor_bytes
 
 """
 ## The Simplest OT Protocol.
@@ -65,10 +66,6 @@ Sender --> Receiver round 3   sends a pair of encryptions e0,e1
 The receiver finally decrypts using the key it constructs from b and A.
 """
 
-# Random oracle instantiated with SHA2 hash
-def sha2(x):
-    return SHA256.new(x.encode("utf-8")).digest()
-
 def sender_round1(rnd_bytes=os.urandom):
     """
     Inputs:
@@ -142,10 +139,10 @@ one-time encryption scheme. Such a scheme is given as:
 """
 
 def strxor(a,b):
-    # Computes a ^ b, byte by byte
+    # Computes a ^ b (util.xor_bytes, all at once)
     assert type(a) is type(b) is bytes
     assert len(a) == len(b), "a and b must be the same size"
-    return b''.join( bytes([a ^b]) for (a,b) in zip(a,b))
+    return xor_bytes(a, b)
 
 def encrypt(k, m):
     # This is a non-committing and robust one-time encryption scheme.
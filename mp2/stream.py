@@ -0,0 +1,335 @@
+"""
+# Streaming garbled circuits
+
+`GarbledCircuitGenerator.output` writes a garbled circuit as one JSON file,
+which the evaluator loads whole before it starts. Here the generator writes
+the garbled tables into a binary stream (a pipe, a socket) as it garbles
+them, a chunk of a layer at a time (see garble_chunks), and the evaluator
+evaluates each chunk as it arrives. Each side holds one chunk of tables at
+a time, besides the circuit and its wire labels, and a generator that gets
+ahead blocks on the full pipe or socket until the evaluator catches up. So
+with the two sides in two processes, the time end to end approaches the
+slower of garbling and evaluating rather than their sum.
+
+The stream is a header and frames:
+
+    GCS1, header length (2 bytes), header (JSON: mode, hash, gates, schedule)
+    frames: kind (1 byte), payload length (4 bytes), payload
+        I   the label of each input wire, 16 bytes, in sorted order
+        T   a chunk of gates within a layer, at most CHUNK: their number
+            (4 bytes), the number of rows of each (1 byte), then the rows,
+            80 bytes each in classic mode and 16 in the others
+        O   a hash of both labels of each output wire (see decode_hash),
+            16 bytes each, in sorted order, to decode the outputs with
+            (only if the generator sends them)
+        L   instead, both labels of each output wire, for debugging: in the
+            Free-XOR modes their XOR is the offset R, with which the
+            evaluator could flip any wire
+        E   the end
+
+The gates come in the order of `schedule(levelize())`, which both sides
+compute from the circuit; the header has a hash of that order, and the
+evaluator checks it, and rejects a frame longer than its kind can be
+before reading it. The input labels are sent as in `output()`, where an
+implementation of the protocol would send the evaluator's by OT.
+
+    python stream.py garble <circuit> [mode] [hash] [--seeded] | python stream.py evaluate <circuit>
+    python stream.py evaluate <circuit> --listen 5000 &
+    python stream.py garble <circuit> [mode] [hash] --connect localhost:5000
+"""
+import bisect
+import hashlib
+import itertools
+import json
+import struct
+
+import util
+
+from generator import GarbledCircuitGenerator
+from evaluator import GarbledCircuitEvaluator
+
+MAGIC = b'GCS1'
+ROW_BYTES = {'classic': 80, 'freexor': 16, 'halfgates': 16}
+CHUNK = 4096    # gates per frame, at most
+# The largest T frame: CHUNK gates of 4 rows, the largest rows
+MAX_TABLES = 4 + CHUNK * (1 + 4 * max(ROW_BYTES.values()))
+
+
+def schedule_digest(c):
+    # A hash of the order in which the gates of circuit c are streamed
+    if not hasattr(c, 'layers'): c.levelize()
+    return hashlib.sha256('\n'.join(c.schedule(c.layers)).encode()).hexdigest()
+
+def frame(kind, payload):
+    return kind + struct.pack('>I', len(payload)) + payload
+
+def _read(f, n):
+    data = f.read(n)
+    if len(data) != n: raise ValueError("truncated garbled circuit stream")
+    return data
+
+def _read_frame(f, limit):
+    # A frame of at most limit bytes, checked before it is read
+    kind, n = struct.unpack('>cI', _read(f, 5))
+    if n > limit: raise ValueError("a %d byte frame, more than the %d expected" % (n, limit))
+    return kind, _read(f, n)
+
+
+"""
+## Writing
+"""
+def header(c):
+    # The header of the stream of GarbledCircuitGenerator c, once garble_chunks started
+    h = json.dumps(dict(mode=c.mode, hash=c.hash, gates=len(c.gates), schedule=schedule_digest(c))).encode()
+    return MAGIC + struct.pack('>H', len(h)) + h
+
+def input_frame(c, inputs):
+    # The labels of inputs (a bit per input wire) of generator c
+    assert len(inputs) == len(c.input_wires)
+    return frame(b'I', b''.join(bytes.fromhex(c.wire_labels[wid][inputs[wid]]) for wid in sorted(c.input_wires)))
+
+def tables_frame(tables):
+    # A chunk of tables, from garble_chunks
+    return frame(b'T', struct.pack('>I', len(tables)) + bytes(len(rows) for rows in tables)
+                 + b''.join(row for rows in tables for row in rows))
+
+def decode_hash(label):
+    # What the evaluator is sent of an output label to decode it by, from
+    # which neither the label nor R can be found
+    return hashlib.sha256(b'GCS1 decode' + label).digest()[:16]
+
+def end_frames(c, decode=True):
+    # The end of the stream of generator c, once garbled. decode: True, a
+    # hash of both labels of each output; 'labels', both labels, which give
+    # R away in the Free-XOR modes (for debugging only); False, neither
+    out = b''
+    if decode:
+        kind, send = (b'L', bytes) if decode == 'labels' else (b'O', decode_hash)
+        out = frame(kind, b''.join(send(bytes.fromhex(L)) for wid in sorted(c.output_wires)
+                                   for L in c.wire_labels[wid]))
+    return out + frame(b'E', b'')
+
+def write(c, f, inputs, mode='classic', hash='aes', chunk=CHUNK, decode=True, seed=None):
+    # Garbles GarbledCircuitGenerator c into binary file f, with the labels
+    # of inputs (a bit per input wire), and what decodes the outputs (see
+    # end_frames); with a seed, from labels derived from it (see garble).
+    # chunk: gates per frame, at most CHUNK (None: CHUNK)
+    # => the number of bytes written
+    chunk = CHUNK if chunk is None else chunk
+    assert 1 <= chunk <= CHUNK, "at most %d gates per frame" % CHUNK
+    chunks = c.garble_chunks(mode, hash, chunk, seed)
+    size = 0
+    for data in (header(c), input_frame(c, inputs)):
+        f.write(data)
+        size += len(data)
+    for gids, tables in chunks:
+        data = tables_frame(tables)
+        f.write(data)
+        size += len(data)
+    data = end_frames(c, decode)
+    f.write(data)
+    f.flush()
+    return size + len(data)
+
+
+"""
+## Evaluating
+"""
+def evaluate(e, f):
+    # Evaluates the garbled circuit streamed from binary file f with
+    # GarbledCircuitEvaluator e of the same circuit (without tables).
+    # => the labels of the output wires, in hex. If the stream decodes the
+    #    outputs, e.output_values has the value of each.
+    #    Labels are dropped after their last use, and e.peak_live is the
+    #    most held at once.
+    if _read(f, 4) != MAGIC: raise ValueError("not a garbled circuit stream")
+    try:
+        header = json.loads(_read(f, struct.unpack('>H', _read(f, 2))[0]).decode())
+        e.mode, e.hash = header["mode"], header["hash"]
+        gates, schedule = header["gates"], header["schedule"]
+    except (UnicodeDecodeError, KeyError, TypeError) as err:
+        raise ValueError("bad header: %s" % err)
+    if e.mode not in ROW_BYTES: raise ValueError("unknown garbling mode %r" % e.mode)
+    if e.mode != 'classic' and e.hash not in util.HASHES: raise ValueError("unknown hash %r" % e.hash)
+    if gates != len(e.gates) or schedule != schedule_digest(e):
+        raise ValueError("the stream is of another circuit, or of another order of its gates")
+    order = e.schedule(e.layers)
+    dead = e.liveness(e.layers)
+    row = ROW_BYTES[e.mode]
+    # A chunk of gates lies within a layer: the first gate of the next is at ends[k]
+    ends = list(itertools.accumulate(len(layer) for layer in e.layers))
+
+    inputs = sorted(e.input_wires)
+    outputs = sorted(e.output_wires)
+    kind, payload = _read_frame(f, 16 * len(inputs))
+    if kind != b'I' or len(payload) != 16 * len(inputs): raise ValueError("bad input labels")
+    labels = e.begin(dict((wid, payload[16*i:16*i+16].hex()) for i, wid in enumerate(inputs)))
+
+    done = 0
+    e.output_values = None
+    while True:
+        kind, payload = _read_frame(f, max(MAX_TABLES, 32 * len(outputs)))
+        if kind == b'T':
+            if len(payload) < 4: raise ValueError("bad garbled tables")
+            k, = struct.unpack('>I', payload[:4])
+            if done + k > len(order): raise ValueError("more gates than the circuit has")
+            if k and done + k > ends[bisect.bisect_right(ends, done)]:
+                raise ValueError("a chunk of gates spans two layers")
+            tables, pos = [], 4 + k
+            for n in payload[4:4 + k]:
+                tables.append([payload[pos + row*i:pos + row*(i+1)] for i in range(n)])
+                pos += row * n
+            if pos != len(payload): raise ValueError("bad garbled tables")
+            e.evaluate_gates(order[done:done + k], tables, labels)
+            e.drop(labels, dead[done:done + k])
+            done += k
+        elif kind in (b'O', b'L'):
+            if len(payload) != 32 * len(outputs): raise ValueError("bad output decoding")
+            received = decode_hash if kind == b'O' else bytes
+            e.output_values = {}
+            for i, wid in enumerate(outputs):
+                e.output_values[wid] = [payload[32*i:32*i+16], payload[32*i+16:32*i+32]]
+        elif kind == b'E':
+            break
+        else:
+            raise ValueError("unknown frame %r" % kind)
+    if done != len(order): raise ValueError("the stream ended after %d of %d gates" % (done, len(order)))
+
+    out = e.finish(labels)
+    if e.output_values is not None:
+        for wid, pair in e.output_values.items():
+            h = received(bytes.fromhex(out[wid]))
+            if h not in pair: raise ValueError("output %s decodes to neither value" % wid)
+            e.output_values[wid] = pair.index(h)
+    return out
+
+
+"""
+## Tests
+"""
+def stream_test(filename):
+    import io
+    import random
+    import compiled
+    from roundtrip import load, check
+    cc, g, e = load(filename)
+    for mode in ROW_BYTES:
+        for chunk, seed in ((1, None), (7, None), (None, None), (7, util.generate_key())):
+            inputs = dict((wid, random.randint(0, 1)) for wid in g.input_wires)
+            f = io.BytesIO()
+            size = write(g, f, inputs, mode, chunk=chunk, seed=seed)
+            assert size == len(f.getvalue())
+            expected = cc.evaluate(inputs)
+            check(g, evaluate(e, io.BytesIO(f.getvalue())), expected)
+            assert e.output_values == expected
+
+            # A stream cut short, or of another circuit, is an error
+            for bad in (f.getvalue()[:-1], f.getvalue()[:len(f.getvalue()) // 2]):
+                try:
+                    evaluate(e, io.BytesIO(bad))
+                    assert False, "a truncated stream evaluated"
+                except ValueError:
+                    pass
+    other = compiled.Builder(2)
+    other = other.build([other.AND(0, 1)]).to_json()
+    try:
+        evaluate(GarbledCircuitEvaluator(from_json=other), io.BytesIO(f.getvalue()))
+        assert False, "the stream of another circuit evaluated"
+    except ValueError:
+        pass
+
+    # The outputs decode by hashes: no output label, nor R, is sent. Both
+    # labels only when asked, and nothing without decode.
+    inputs = dict((wid, random.randint(0, 1)) for wid in g.input_wires)
+    for decode in (True, 'labels', False):
+        f = io.BytesIO()
+        write(g, f, inputs, 'halfgates', decode=decode)
+        data = f.getvalue()
+        expected = cc.evaluate(inputs)
+        check(g, evaluate(e, io.BytesIO(data)), expected)
+        assert e.output_values == (expected if decode else None)
+        L0, L1 = (bytes.fromhex(L) for L in g.wire_labels[min(g.output_wires)])
+        R = util.xor_bytes(L0, L1)
+        sent = [data[i:i + 16] for i in range(len(data) - 15)]
+        assert (L0 in sent and L1 in sent) == (decode == 'labels')
+        assert R not in sent
+
+    # A stream out of bounds is an error, a ValueError, before it is read
+    inputs = dict((wid, 0) for wid in g.input_wires)
+    f = io.BytesIO()
+    write(g, f, inputs, 'halfgates', chunk=1)
+    data = f.getvalue()
+    n = 6 + struct.unpack('>H', data[4:6])[0]
+    head, frames, pos = json.loads(data[6:n]), [], n
+    while pos < len(data):
+        frames.append(data[pos:pos + 5 + struct.unpack('>I', data[pos + 1:pos + 5])[0]])
+        pos += len(frames[-1])
+    def rewrite(**fields):
+        h = json.dumps(dict(head, **fields)).encode()
+        return MAGIC + struct.pack('>H', len(h)) + h + data[n:]
+    # One frame of the last gate of the first layer and the first of the next
+    last, first = frames[len(e.layers[0])], frames[len(e.layers[0]) + 1]
+    spanning = frame(b'T', struct.pack('>I', 2) + last[9:10] + first[9:10] + last[10:] + first[10:])
+    for bad in (rewrite(hash='md5'), rewrite(mode='cut-and-choose'), rewrite(gates=None),
+                data[:n] + b'I\xff\xff\xff\xff',
+                data[:n] + frames[0] + b'T\x7f\xff\xff\xff',
+                data[:n] + b''.join(frames[:len(e.layers[0])]) + spanning):
+        try:
+            evaluate(e, io.BytesIO(bad))
+            assert False, "a stream out of bounds evaluated"
+        except ValueError:
+            pass
+    print("Stream test complete: %s" % filename)
+
+def main():
+    import argparse
+    import random
+    import socket
+    import sys
+    import compiled
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    parser.add_argument('side', choices=['garble', 'evaluate', 'test'])
+    parser.add_argument('circuit')
+    parser.add_argument('mode', nargs='?', default='classic')
+    parser.add_argument('hash', nargs='?', default='aes')
+    parser.add_argument('--chunk', type=int, default=CHUNK)
+    parser.add_argument('--seeded', action='store_true', help='garble with labels from a random seed')
+    parser.add_argument('--connect', metavar='HOST:PORT', help='garble into a socket')
+    parser.add_argument('--listen', metavar='PORT', type=int, help='evaluate from a socket')
+    args = parser.parse_args()
+    if args.side == 'test':
+        return stream_test(args.circuit)
+
+    cc = compiled.load(args.circuit)
+    obj = cc.to_json()
+    if args.side == 'garble':
+        c = GarbledCircuitGenerator(from_json=obj, compiled=cc)
+        with open(args.circuit) as f:
+            given = json.load(f).get("inputs") if args.circuit.endswith('.json') else None
+        inputs = given or dict((wid, random.randint(0, 1)) for wid in c.input_wires)
+        if args.connect:
+            host, port = args.connect.rsplit(':', 1)
+            sock = socket.create_connection((host, int(port)))
+            out = sock.makefile('wb')
+        else:
+            out = sys.stdout.buffer
+        seed = util.generate_key() if args.seeded else None
+        size = write(c, out, inputs, args.mode, args.hash, args.chunk, seed=seed)
+        if args.connect:
+            out.close()
+            sock.close()
+        print('Streamed garbled circuit: %d gates, %d bytes' % (len(c.gates), size), file=sys.stderr)
+    else:
+        e = GarbledCircuitEvaluator(from_json=obj, compiled=cc)
+        if args.listen:
+            server = socket.create_server(('', args.listen))
+            sock, _ = server.accept()
+            src = sock.makefile('rb')
+        else:
+            src = sys.stdin.buffer
+        out = evaluate(e, src)
+        json.dump(e.output_values if e.output_values is not None else out, sys.stdout, indent=4, sort_keys=True)
+        print('')
+
+if __name__ == '__main__':
+    main()
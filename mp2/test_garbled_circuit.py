@@ -5,58 +5,125 @@ import subprocess
 from circuit import BooleanCircuit
 from evaluator import GarbledCircuitEvaluator
 from generator import GarbledCircuitGenerator
+import compiled
+from roundtrip import load, garblers, output, check, evaluate, check_stream
 
 import sys
 import os
 import random
 import tempfile
 
+def tables_test(mode, hash):
+    # Every one of the 16 truth tables, on both sides of a gate, on all inputs
+    b = compiled.Builder(3)
+    outs = []
+    for t in range(16):
+        w = b.add(0, 1, t)
+        outs += [b.add(w, 2, 15 - t), b.add(2, w, t)]
+    cc = b.build(outs)
+    c, _ = garblers(cc)
+    for k in range(8):
+        inputs = dict((wid, (k >> i) & 1) for i, wid in enumerate(cc.input_names()))
+        c.garble(mode, hash)
+        evaluate(c, inputs, cc)
+
+def constant_test(hash):
+    # Constant gates in the Free-XOR modes, with random labels and with
+    # labels from a seed: the evaluator never holds R, nor the label 0
+    import util
+    b = compiled.Builder(2)
+    zero, one = b.add(0, 1, 0), b.add(0, 1, 15)
+    cc = b.build([b.add(zero, 0, 6), b.add(one, 1, 6), b.add(zero, one, 8)])
+    c, _ = garblers(cc)
+    for mode in ('freexor', 'halfgates'):
+        for k in range(8):
+            inputs = dict((wid, (k >> i) & 1) for i, wid in enumerate(cc.input_names()))
+            c.garble(mode, hash, seed=util.generate_key() if k & 4 else None)
+            garbled = output(c, inputs)
+            e = GarbledCircuitEvaluator(from_json=garbled, compiled=cc)
+            check(c, e.garbled_evaluate(garbled["inputs"], keep=True), cc.evaluate(inputs))
+            L0, L1 = c.wire_labels[min(c.input_wires)]
+            R = '%032x' % (int(L0, 16) ^ int(L1, 16))
+            seen = set(e.wire_labels.values()) | set(row for gate in garbled["gates"].values()
+                                                     for row in gate["garble_table"])
+            assert R not in seen and '0' * 32 not in seen, "the evaluator sees R"
+
+def seeded_test(filename, mode, hash):
+    # Labels from a seed: the same garbled circuit for the same seed (up to
+    # the shuffled rows of classic mode), with the labels of the input and
+    # output wires only
+    import util
+    plain, c, _ = load(filename)
+    seed = util.generate_key()
+    c.garble(mode, hash, seed=seed)
+    tables, labels = c.garble_table, c.wire_labels
+    assert set(labels) == c.input_wires | c.output_wires
+    assert c.peak_live < len(c.wires)
+    c.garble(mode, hash, seed=seed)
+    assert c.wire_labels == labels
+    if mode != 'classic': assert c.garble_table == tables
+    c.garble(mode, hash, seed=util.generate_key())
+    assert c.wire_labels != labels
+    evaluate(c, dict((wid, random.randint(0, 1)) for wid in c.input_wires), plain)
+
+def pregarbled_test(filename, mode, hash):
+    # Copies garbled ahead by a pool, one per assignment of the inputs,
+    # streamed to the evaluator with the labels picked for it
+    import io
+    import pregarble
+    plain, c, e = load(filename)
+    with pregarble.Pool(c, mode, hash, depth=4) as pool:
+        for _ in range(10):
+            inputs = dict((wid, random.randint(0, 1)) for wid in c.input_wires)
+            f = io.BytesIO()
+            pool.get().write(f, inputs)
+            check_stream(e, f.getvalue(), inputs, plain)
+
 def main():
-    if len(sys.argv) != 2:
-        print('usage: test_garbled_circuit.py <circuit.json>')
+    if len(sys.argv) not in (2, 3, 4):
+        print('usage: test_garbled_circuit.py <circuit.json> [mode] [hash]')
         print('Generates random circuit inputs and tests generator & evaluator')
         sys.exit(1)
+    # Compiled circuits are cached in a temporary directory, unless told otherwise
+    if 'CIRCUIT_CACHE' not in os.environ:
+        cache = tempfile.TemporaryDirectory(prefix='circuits_')
+        os.environ['CIRCUIT_CACHE'] = cache.name
+    mode = sys.argv[2] if len(sys.argv) >= 3 else 'classic'
+    hash = sys.argv[3] if len(sys.argv) == 4 else 'aes'
+    tables_test(mode, hash)
+    constant_test(hash)
 
     filename = sys.argv[1]
+    seeded_test(filename, mode, hash)
+    pregarbled_test(filename, mode, hash)
     obj = json.load(open(filename))
 
-    # Load the plain circuit
-    plain = BooleanCircuit(from_json=obj) 
+    # Load the plain circuit, sorted once (and cached)
+    plain = compiled.load(filename)
 
     # Generate the garbled circuit
-    c = GarbledCircuitGenerator(from_json=obj)
+    c = GarbledCircuitGenerator(from_json=obj, compiled=plain)
     print('Circuit loaded: %d gates, %d input wires, %d output_wires, %d total' \
         % (len(c.gates), len(c.input_wires), len(c.output_wires), len(c.wires)))
 
-    for i in range(100):
+    # Random inputs, and the expected outputs, all evaluated at once
+    all_inputs = [dict((wid,random.randint(0,1)) for wid in plain.input_names()) for i in range(100)]
+    all_outs = plain.evaluate_batch(all_inputs)
 
-        inputs = dict((wid,random.randint(0,1)) for wid in plain.input_wires)
+    for inputs,outs in zip(all_inputs,all_outs):
     
         # Generate the garbled circuit
-        c.garble()
+        c.garble(mode, hash)
 
         # Possible improvement: Check for statistical evidence of shuffling!!
-        with tempfile.NamedTemporaryFile(prefix='garble_', suffix='.json', delete=False) as f:
-            f.close()
-
-            # Save the json obj
-            c.output(f.name, inputs)
-
-            # Evaluate the garbled circuit
-            obj = json.load(open(f.name))
-            e = GarbledCircuitEvaluator(from_json=obj)
-
-            garble_inputs = obj["inputs"]
-
-            out_labels = e.garbled_evaluate(garble_inputs)
+        e = evaluate(c, inputs, plain, outs, quiet=False)
 
-            # Check correctness
-            outs = plain.evaluate(inputs)
-            for wid,v in outs.items():
-                assert out_labels[wid] == c.wire_labels[wid][v], "output wire mismatch"
+        # Only the output labels are left, and the plain evaluation
+        # agrees, in both orders, dropping values as it goes
+        assert set(e.wire_labels) == set(outs) and e.peak_live <= len(e.wires)
+        assert c.evaluate(inputs) == c.evaluate(inputs, c.layers) == outs
+        assert set(c.wire_values) == set(outs) and c.peak_live <= len(c.wires)
 
-            os.remove(f.name)
-        
 
 if __name__ == '__main__':
     main()
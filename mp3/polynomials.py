@@ -1,12 +1,10 @@
 """
 ## Programming with Polynomials, Lagrange Interpolation
 """
-import sys
 from functools import reduce
-sys.path += ['elliptic-curves-finite-fields']
-from finitefield.finitefield import FiniteField
-from finitefield.polynomial import polynomialsOver
-from finitefield.euclidean import extendedEuclideanAlgorithm
+from cryptocore.ecff.finitefield.finitefield import FiniteField
+from cryptocore.ecff.finitefield.polynomial import polynomialsOver
+from cryptocore.ecff.finitefield.euclidean import extendedEuclideanAlgorithm
 import random
 import operator
 
@@ -1,14 +1,13 @@
 """
 ## Handout 1: Programming with Polynomials and Lagrange Interpolation
 """
-import sys
 from functools import reduce
-sys.path += ['elliptic-curves-finite-fields']
-from finitefield.finitefield import FiniteField
-from finitefield.polynomial import polynomialsOver
-from finitefield.euclidean import extendedEuclideanAlgorithm
-from elliptic import EllipticCurve, Point, Ideal
-import elliptic
+from cryptocore.ecff.finitefield.finitefield import FiniteField
+from cryptocore.ecff.finitefield.polynomial import polynomialsOver
+from cryptocore.ecff.finitefield.euclidean import extendedEuclideanAlgorithm
+from cryptocore.ecff.elliptic import EllipticCurve, Point, Ideal
+from cryptocore.ecff import elliptic
+from cryptocore.backends import field
 import os
 import random
 from polynomials import polynomialsOver, eval_poly, interpolate
@@ -16,7 +15,8 @@ from prime_mod_sqrt import prime_mod_sqrt
 
 # Parameters for MPC
 # We make use of a field Fp() that is a large prime number
-Fp = FiniteField(0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141,1)
+# (from the active field backend, see cryptocore/backends.py)
+Fp = field(0xFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFEBAAEDCE6AF48A03BBFD25E8CD0364141)
 Poly = polynomialsOver(Fp)
 
 # For convenience, upgrade the polynomial class with static methods.